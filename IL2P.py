@@ -1,5 +1,7 @@
 import numpy as np
 import io
+import struct
+import functools
 import time
 import threading
 import queue
@@ -14,6 +16,22 @@ from kivy.logger import Logger as log
 IL2P_HDR_LEN = 32
 IL2P_HDR_LEN_ENC = 64
 
+#the 32 byte header: the destination, link source and source callsigns, the flag and routing bytes, then the payload size, sequence number and 4 data words most significant byte first
+HEADER_STRUCT = struct.Struct('>6s6s6sBBHH4H')
+
+HEADER_CACHE_SIZE = 32 #the number of recently received raw headers whose decoding is remembered, retransmissions and double acks repeat the same header bytes
+
+##@brief Reed Solomon decode and descramble a raw frame header, the results for recently received raw headers are remembered so each is only decoded once
+##  while the receiver picks a symbol timing, while the frame is being received, and when the frame is decoded
+##@param raw_header a bytes object holding the 64 raw header bytes
+##@return a tuple, the first element is a bytes object holding the 32 descrambled header bytes (None if the header could not be corrected), the second is the number of bytes the Reed Solomon decoder corrected (-1 if it could not)
+@functools.lru_cache(maxsize=HEADER_CACHE_SIZE)
+def decode_raw_header(raw_header):
+    (header_decoded, corrections) = FrameHeaderCodec().decode_batch(np.frombuffer(raw_header, dtype=np.uint8)[None,:])[0]
+    if (header_decoded is None):
+        return (None, -1)
+    return (Deinterleaver().descramble_bits(header_decoded).tobytes(), corrections)
+
 ##A class used to prepare IL2P data for transmission and decode received IL2P frames
 class IL2P_Frame_Engine:
 
@@ -27,49 +45,92 @@ class IL2P_Frame_Engine:
         self.deinterleaver = Deinterleaver()
         self.f = lambda i, n, k : (i*k)%n #byte scrambling function
      
-    ##@brief prepares frame for modulation by packing header information into 32 bytes and interleaving the bits
-    ##@param header_bytes 1d numpy array of length 32 holding the IL2P header information
-    ##@param frame_payload_bytes, the payload bytes to be interleaved right after the frame header
-    ##@return a tuple of 1d numpy arrays, the first contains the interleaved header, the second the interleaved frame_payload_bytes
-    def __apply_interleaving(self,header_bytes,frame_payload_bytes):
-
-        frame_bytes = np.concatenate( (header_bytes,frame_payload_bytes) )
-        self.interleaver.reset()
-        interleaved_frame_bytes = self.interleaver.scramble_bits(frame_bytes)
-        return (interleaved_frame_bytes[0:32], interleaved_frame_bytes[32:,])
+    ##@brief the length of the frame encode_frame makes from a payload
+    ##@param payload_len the length (in bytes) of the frame payload
+    ##@return the length (in bytes) of the encoded frame
+    def encoded_length(self,payload_len):
+        return IL2P_HDR_LEN_ENC + payload_encoded_length(payload_len)
     
-    ##@brief method used to prepare frames for modulation
+    ##@brief method used to prepare frames for modulation, the header and payload are scrambled together in a single buffer and Reed Solomon encoded straight into the frame
     ##@param header a IL2P_Frame_Header object containing the header information
-    ##@param payload_bytes a 1d numpy array of bytes holding the frame payload information
-    ##@return returns a 1d numpy array of bytes holding the data ready to be modulated over the radio interface
-    def encode_frame(self,header,payload_bytes):
-        (interleaved_header, interleaved_payload) = self.__apply_interleaving(header.pack_header(), payload_bytes)
-        fec_encoded_header = self.header_codec.encode(interleaved_header)
-        fec_encoded_payload = self.payload_encoder.encode(interleaved_payload)
+    ##@param payload_bytes a 1d numpy array of bytes, or any other bytes-like object, holding the frame payload information
+    ##@param out a writable bytes-like object of encoded_length(len(payload_bytes)) bytes to write the frame to, None allocates a new array
+    ##@return returns a 1d numpy array of bytes holding the data ready to be modulated over the radio interface, a view of out when it is given
+    def encode_frame(self,header,payload_bytes,out=None):
+        frame_bytes = bytearray(header.pack_bytes())
+        frame_bytes += byte_view(payload_bytes)
+        self.interleaver.reset()
+        self.interleaver.scramble_bits(frame_bytes, out=frame_bytes) #scrambled in place
+        
+        frame = output_array(self.encoded_length(len(frame_bytes) - IL2P_HDR_LEN), out)
+        interleaved = memoryview(frame_bytes)
+        self.header_codec.encode(interleaved[0:IL2P_HDR_LEN], out=frame[0:IL2P_HDR_LEN_ENC])
+        self.payload_encoder.encode(interleaved[IL2P_HDR_LEN:], out=frame[IL2P_HDR_LEN_ENC:])
+        return frame
+    
+    ##@brief prepare many frames for modulation at once, the headers are packed, the frames scrambled and all their Reed Solomon blocks encoded together
+    ##@param headers a list of IL2P_Frame_Header objects
+    ##@param payloads a list of 1d numpy arrays of bytes holding the payload of each frame
+    ##@return a list of 1d numpy arrays of bytes, each the same as encode_frame would return for the frame
+    def encode_frames(self, headers, payloads):
+        if (len(headers) == 0):
+            return []
+        header_bytes = IL2P_Frame_Header.pack_headers(headers)
+        interleaved_frames = scramble_frames([np.concatenate( (header_bytes[f], payload_bytes) ) for (f, payload_bytes) in enumerate(payloads)])
+        fec_encoded_headers = self.header_codec.encode_batch(np.stack([frame[0:32] for frame in interleaved_frames]))
+        fec_encoded_payloads = self.payload_encoder.encode_batch([frame[32:] for frame in interleaved_frames])
+        return [np.concatenate( (fec_encoded_header, fec_encoded_payload) ) for (fec_encoded_header, fec_encoded_payload) in zip(fec_encoded_headers, fec_encoded_payloads)]
+    
+    ##@brief extract the header and payload information from many received frames at once, all their Reed Solomon blocks are decoded together and nothing is logged
+    ##@param raw_frames a list of 1d numpy arrays of bytes holding the raw bytes of each frame
+    ##@return a list with an element for each frame, None when the frame is too short or its header could not be decoded, otherwise a tuple like the one decode_frame returns
+    def decode_frames(self, raw_frames):
+        toReturn = [None]*len(raw_frames)
+        candidates = [f for (f, raw_frame) in enumerate(raw_frames) if (len(raw_frame) >= 64)]
+        if (len(candidates) == 0):
+            return toReturn
+        
+        headers_decoded = self.header_codec.decode_batch(np.stack([np.asarray(raw_frames[f][0:64], dtype=np.uint8) for f in candidates]))
+        decoded = [(f, header_decoded) for (f, (header_decoded, corrections)) in zip(candidates, headers_decoded) if (header_decoded is not None)]
+        if (len(decoded) == 0):
+            return toReturn
         
-        return np.concatenate( (fec_encoded_header,fec_encoded_payload) )
+        (header_bytes, states) = descramble_frames([header_decoded for (f, header_decoded) in decoded])
+        headers = [IL2P_Frame_Header.unpack_header(header) for header in header_bytes]
+        
+        payloads_decoded = self.payload_decoder.decode_batch([raw_frames[f][64:] for (f, header_decoded) in decoded], [int(header.getPayloadSize()) for header in headers])
+        (payload_bytes, states) = descramble_frames([payload_decoded for (payload_decode_success, payload_decoded) in payloads_decoded], states) #each payload continues from the descrambler state its header left
+        
+        for ((f, header_decoded), header, (payload_decode_success, payload_decoded), payload) in zip(decoded, headers, payloads_decoded, payload_bytes):
+            toReturn[f] = (header, payload_decode_success, payload)
+        return toReturn
     
     ##@brief extract the header and payload information from a newly received frame
     ##@param raw_frame the raw frame bytes that were received
+    ##@param alternates a list of other demodulations of the raw frame bytes, used to decode payload blocks that cannot be decoded from raw_frame
+    ##@param partial a PartialPayload holding the payload blocks already decoded while the frame was being received
+    ##@param header the IL2P_Frame_Header decoded from the frame while it was being received, None decodes it from raw_frame
+    ##@param out a writable bytes-like object of header.getPayloadSize() bytes to write the payload to, None allocates a new array
     ##@throws IL2PHeaderDecodeError thrown when the Solomon Reed decoder could not correct all the errors in the frame header
-    ##@return returns a tuple. The first element is an IL2P_Frame_Header object, the second is a boolean that is true if the full payload could be corrected, the third is the frame payload information as a numpy 1d array of bytes
-    def decode_frame(self, raw_frame):
+    ##@return returns a tuple. The first element is an IL2P_Frame_Header object, the second is a boolean that is true if the full payload could be corrected, the third is the frame payload information as a numpy 1d array of bytes, a view of out when it is given
+    def decode_frame(self, raw_frame, alternates=(), partial=None, header=None, out=None):
+        if not isinstance(raw_frame, np.ndarray):
+            raw_frame = np.frombuffer(raw_frame, dtype=np.uint8)
         if (len(raw_frame) < 64):
             raise ValueError('raw_frame is to short to be an IL2P frame')
 
-        (decode_success,header_decoded) = self.header_codec.decode(raw_frame[0:64])
-        
-        if (decode_success == False): #if the header could not be decoded
-            raise exceptions.IL2PHeaderDecodeError('Error: could not decode the IL2P frame header')
-            return
+        if (header is None):
+            (header_bytes, corrections) = self.__decode_header_bytes(raw_frame[0:64], verbose=True)
+            header = IL2P_Frame_Header.unpack_header(header_bytes)
+        else:
+            header_bytes = header.pack_bytes()
         
         self.deinterleaver.reset() #reset the deinterleaver LFSR
-        header_bytes = self.deinterleaver.descramble_bits(header_decoded)
-        header = IL2P_Frame_Header.unpack_header(header_bytes)
+        self.deinterleaver.advance(np.frombuffer(header_bytes, dtype=np.uint8)) #the payload is descrambled from where the header left the LFSR
 
-        (payload_decode_success, payload_decoded) = self.payload_decoder.decode(raw_frame[64:,], header.getPayloadSize())
+        (payload_decode_success, payload_decoded) = self.payload_decoder.decode(raw_frame[64:,], int(header.getPayloadSize()), alternates=[alternate[64:,] for alternate in alternates], partial=partial, out=out)
 
-        payload_bytes = self.deinterleaver.descramble_bits(payload_decoded)
+        payload_bytes = self.deinterleaver.descramble_bits(payload_decoded, out=payload_decoded) #descrambled in place
 
         return (header, payload_decode_success, payload_bytes)
         
@@ -77,37 +138,53 @@ class IL2P_Frame_Engine:
     ##@param raw_header the raw frame bytes that were received, including the preamble byte
     ##@throws IL2PHeaderDecodeError thrown when the Solomon Reed decoder could not correct all errors in the frame header
     ##@throws valueError, thrown when the arguments passed in are not correct
-    ##@return returns an IL2P_Frame_Header object
-    def decode_header(self, raw_header, verbose=True):
+    ##@param return_corrections when True the number of bytes the Reed Solomon decoder corrected is returned as well
+    ##@return returns an IL2P_Frame_Header object, or a tuple of the IL2P_Frame_Header object and the number of corrected bytes when return_corrections is True
+    def decode_header(self, raw_header, verbose=True, return_corrections=False):
         if (len(raw_header) < 64):
             print(len(raw_header))
             raise ValueError('raw_header is to short to be an IL2P header')
-        (decode_success,header_decoded) = self.header_codec.decode(raw_header[0:64],verbose)
-         
-        if (decode_success == False): #if the header could not be decoded
-            raise exceptions.IL2PHeaderDecodeError('Error: could not decode the IL2P frame header')
-            return
-        
-        self.deinterleaver.reset() #reset the deinterleaver LFSR
-        header_bytes = self.deinterleaver.descramble_bits(header_decoded)
+        (header_bytes, corrections) = self.__decode_header_bytes(raw_header[0:64], verbose)
         header = IL2P_Frame_Header.unpack_header(header_bytes)
 
+        if (return_corrections):
+            return (header, corrections)
         return header
+    
+    ##@brief Reed Solomon decode and descramble a raw frame header through the cache of recently decoded headers
+    ##@param raw_header the 64 raw header bytes
+    ##@throws IL2PHeaderDecodeError thrown when the Solomon Reed decoder could not correct all errors in the frame header
+    ##@return a tuple, the first element is a bytes object holding the 32 descrambled header bytes, the second is the number of bytes corrected
+    def __decode_header_bytes(self, raw_header, verbose):
+        (header_bytes, corrections) = decode_raw_header(np.asarray(raw_header, dtype=np.uint8).tobytes())
+        
+        if (header_bytes is None): #if the header could not be decoded
+            if (verbose):
+                log.warning('\tWarning: Header decoding failed!')
+            raise exceptions.IL2PHeaderDecodeError('Error: could not decode the IL2P frame header')
+        
+        if (verbose):
+            log.info('\thdr, %d err', corrections)
+        return (header_bytes, corrections)
         
 ##A class representing an IL2P frame header and all its attributes
 class IL2P_Frame_Header:
 
+    __slots__ = ('src_callsign', 'link_src_callsign', 'dst_callsign', 'hops', 'hops_remaining', 'is_text_msg', 'is_beacon', 'is_waypoint', \
+                 'acks', 'request_ack', 'request_double_ack', 'payload_size', 'my_seq', 'data', 'high_rate')
+
     ##@brief constructor for the IL2P_Frame class. Params for constructor include all the info needed to form a 13 byte header
     ##@param src_callsign the source callsign for this frame, a 6 character string
     ##@param link_src_callsign the source of the frame for multihop transmissions
     ##@param my_seq when request ack is true contains my ack's sequence number, when false contains most recent acknowledgement
     ##@param dst_callsign the destination callsign for this frame, a 6 character string
+    ##@param high_rate when true the frame payload is sent using the multi-carrier QAM high rate data mode
     def __init__(self, src_callsign='GAYWAX', link_src_callsign=None, dst_callsign='BAYWAX', \
                hops_remaining=1, hops=1, is_text_msg=True, is_beacon=False, is_waypoint=False,\
                my_seq = np.uint16(0), \
                acks=[False,False,False,False], \
                request_ack=True, request_double_ack=False, \
-               payload_size=0, data=np.zeros((4),dtype=np.uint16)):
+               payload_size=0, data=np.zeros((4),dtype=np.uint16), high_rate=False):
         self.src_callsign = src_callsign.ljust(6,' ')[0:6]
         self.link_src_callsign = self.src_callsign if (link_src_callsign is None) else link_src_callsign.ljust(6,' ')[0:6]
         self.dst_callsign = dst_callsign.ljust(6,' ')[0:6]
@@ -122,6 +199,17 @@ class IL2P_Frame_Header:
         self.payload_size = np.uint16(payload_size)
         self.my_seq = np.uint16(my_seq)
         self.data = data
+        self.high_rate = high_rate
+    
+    ##@brief restore a pickled header, headers pickled before __slots__ was added (for example in messages.pickle) have their fields in a dict
+    ##  and fields added since they were pickled, such as high_rate, are given their default values
+    ##@param state the fields of the header, either a dict or a tuple of a dict and the dict of slot values
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            state = dict(state[0] or {}, **(state[1] or {}))
+        defaults = IL2P_Frame_Header()
+        for name in self.__slots__:
+            setattr(self, name, state[name] if (name in state) else getattr(defaults, name))
     
     def getPayloadSize(self):
         return self.payload_size
@@ -142,92 +230,44 @@ class IL2P_Frame_Header:
         ecc_sym_cnt = floor(small_block_len/5) + 10 #the number of error correction symbols that will be appended to each block
         return ((small_block_cnt*(small_block_len+ecc_sym_cnt)) + (large_block_cnt*(large_block_len+ecc_sym_cnt)))
     
+    ##@brief packs the header information into the 32 bytes sent over the air
+    ##@return returns a bytes object of length 32
+    def pack_bytes(self):
+        flags = (bool(self.request_double_ack)<<7) | (bool(self.request_ack)<<6) | (bool(self.acks[3])<<5) | (bool(self.acks[2])<<4) | \
+                (bool(self.acks[1])<<3) | (bool(self.acks[0])<<2) | (bool(self.is_waypoint)<<1)
+        routing = (bool(self.high_rate)<<6) | ((self.hops >= 2)<<5) | (((self.hops >= 1) and (self.hops != 2))<<4) | (bool(self.is_beacon)<<3) | \
+                  (bool(self.is_text_msg)<<2) | ((self.hops_remaining >= 2)<<1) | ((self.hops_remaining >= 1) and (self.hops_remaining != 2))
+        return HEADER_STRUCT.pack(self.dst_callsign.encode(), self.link_src_callsign.encode(), self.src_callsign.encode(), flags, routing, \
+                                  int(self.payload_size) & 0xFFFF, int(self.my_seq) & 0xFFFF, *[int(word) & 0xFFFF for word in self.data[0:4]])
+    
     ##@brief packs the header information into 32 bytes.
     ##@return returns a 1d numpy array of 32 bytes
     def pack_header(self):
-        toReturn = np.zeros((32),dtype=np.uint8)
-        i=0
+        return np.frombuffer(bytearray(self.pack_bytes()), dtype=np.uint8)
         
-        dst = self.dst_callsign.encode()
-        toReturn[i]   = np.uint8(dst[0])
-        toReturn[i+1] = np.uint8(dst[1])
-        toReturn[i+2] = np.uint8(dst[2])
-        toReturn[i+3] = np.uint8(dst[3])
-        toReturn[i+4] = np.uint8(dst[4])
-        toReturn[i+5] = np.uint8(dst[5])
-        i=i+6
+    ##@brief packs the information of many headers into 32 bytes each, building each field for every header at once
+    ##@param headers a list of IL2P_Frame_Header objects
+    ##@return returns a 2d numpy array of bytes holding the same 32 bytes as pack_header in each row
+    def pack_headers(headers):
+        toReturn = np.zeros((len(headers), 32), dtype=np.uint8)
+        field = lambda name: np.array([getattr(header, name) for header in headers])
         
-        lnk = self.link_src_callsign.encode()
-        toReturn[i]   = np.uint8(lnk[0])
-        toReturn[i+1] = np.uint8(lnk[1])
-        toReturn[i+2] = np.uint8(lnk[2])
-        toReturn[i+3] = np.uint8(lnk[3])
-        toReturn[i+4] = np.uint8(lnk[4])
-        toReturn[i+5] = np.uint8(lnk[5])
-        i=i+6
-        
-        src = self.src_callsign.encode()
-        toReturn[i]   = np.uint8(src[0])
-        toReturn[i+1] = np.uint8(src[1])
-        toReturn[i+2] = np.uint8(src[2])
-        toReturn[i+3] = np.uint8(src[3])
-        toReturn[i+4] = np.uint8(src[4])
-        toReturn[i+5] = np.uint8(src[5])
-        i=i+6
+        toReturn[:,0:6]   = np.frombuffer(b''.join(header.dst_callsign.encode()[0:6] for header in headers), dtype=np.uint8).reshape(-1,6)
+        toReturn[:,6:12]  = np.frombuffer(b''.join(header.link_src_callsign.encode()[0:6] for header in headers), dtype=np.uint8).reshape(-1,6)
+        toReturn[:,12:18] = np.frombuffer(b''.join(header.src_callsign.encode()[0:6] for header in headers), dtype=np.uint8).reshape(-1,6)
         
         #set the flag bits
-        toReturn[i] |= np.uint8(0x80) if (self.request_double_ack) else np.uint8(0x00)
-        toReturn[i] |= np.uint8(0x40) if (self.request_ack) else np.uint8(0x00)
-        toReturn[i] |= np.uint8(0x20) if (self.acks[3]) else np.uint8(0x00)
-        toReturn[i] |= np.uint8(0x10) if (self.acks[2]) else np.uint8(0x00)
-        toReturn[i] |= np.uint8(0x08) if (self.acks[1]) else np.uint8(0x00)
-        toReturn[i] |= np.uint8(0x04) if (self.acks[0]) else np.uint8(0x00)
-        toReturn[i] |= np.uint8(0x02) if (self.is_waypoint) else np.uint8(0x00)
-        i=i+1
-        
-        toReturn[i] |= np.uint8(0x20) if (self.hops >= 2) else np.uint8(0x00)
-        toReturn[i] |= np.uint8(0x10) if ((self.hops >= 1) and (self.hops != 2)) else np.uint8(0x00)
-        toReturn[i] |= np.uint8(0x08) if (self.is_beacon) else np.uint8(0x00)
-        toReturn[i] |= np.uint8(0x04) if (self.is_text_msg) else np.uint8(0x00)
-        toReturn[i] |= np.uint8(0x02) if (self.hops_remaining >= 2) else np.uint8(0x00)
-        toReturn[i] |= np.uint8(0x01) if ((self.hops_remaining >= 1) and (self.hops_remaining != 2)) else np.uint8(0x00)
-        i=i+1
+        acks = np.array([[bool(ack) for ack in header.acks[0:4]] for header in headers], dtype=np.uint8).reshape(-1,4)
+        toReturn[:,18] = (field('request_double_ack').astype(bool)<<7) | (field('request_ack').astype(bool)<<6) | (acks[:,3]<<5) | (acks[:,2]<<4) | \
+                         (acks[:,1]<<3) | (acks[:,0]<<2) | (field('is_waypoint').astype(bool)<<1)
+        hops = field('hops')
+        hops_remaining = field('hops_remaining')
+        toReturn[:,19] = (field('high_rate').astype(bool)<<6) | ((hops >= 2)<<5) | (((hops >= 1) & (hops != 2))<<4) | (field('is_beacon').astype(bool)<<3) | \
+                         (field('is_text_msg').astype(bool)<<2) | ((hops_remaining >= 2)<<1) | ((hops_remaining >= 1) & (hops_remaining != 2))
         
-        ph = np.uint8(np.uint16(self.payload_size) >> 8)
-        pl = np.uint8(self.payload_size & np.uint8(0xFF) )
-        toReturn[i]   = ph
-        toReturn[i+1] = pl
-        i=i+2
-        
-        mh = np.uint8(np.uint16(self.my_seq) >> 8)
-        ml = np.uint8(self.my_seq & np.uint8(0xFF) )
-        toReturn[i]   = mh
-        toReturn[i+1] = ml
-        i=i+2
-        
-        d0h = np.uint8(np.uint16(self.data[0]) >> 8)
-        d0l = np.uint8(np.uint16(self.data[0]) & np.uint8(0xFF))
-        toReturn[i]   = d0h
-        toReturn[i+1] = d0l
-        i=i+2
-        
-        d1h = np.uint8(np.uint16(self.data[1]) >> 8)
-        d1l = np.uint8(np.uint16(self.data[1]) & np.uint8(0xFF))
-        toReturn[i]   = d1h
-        toReturn[i+1] = d1l
-        i=i+2
-        
-        d2h = np.uint8(np.uint16(self.data[2]) >> 8)
-        d2l = np.uint8(np.uint16(self.data[2]) & np.uint8(0xFF))
-        toReturn[i]   = d2h
-        toReturn[i+1] = d2l
-        i=i+2
-        
-        d3h = np.uint8(np.uint16(self.data[3]) >> 8)
-        d3l = np.uint8(np.uint16(self.data[3]) & np.uint8(0xFF))
-        toReturn[i] = d3h
-        toReturn[i+1] = d3l
-        i=i+2
+        #the 16 bit fields are stored most significant byte first
+        words = np.concatenate( (field('payload_size')[:,None], field('my_seq')[:,None], np.array([header.data[0:4] for header in headers]).reshape(-1,4)), axis=1 )
+        toReturn[:,20:32] = words.astype(np.uint16).astype('>u2').view(np.uint8)
         
         return toReturn
         
@@ -236,6 +276,7 @@ class IL2P_Frame_Header:
         log.info("is text %s is beacon %s is waypoint %s" % (str(self.is_text_msg), str(self.is_beacon), str(self.is_waypoint)))
         log.info("acks bool %s acks data %s" % (str(self.acks), str(self.data)))
         log.info("requests ack %s requests double ack %s" % (str(self.request_ack), str(self.request_double_ack)))
+        log.info("high rate %s" % (str(self.high_rate),))
         log.info("payload size %d" % (self.payload_size))
         print('-------------------')
     
@@ -249,6 +290,8 @@ class IL2P_Frame_Header:
             return False
         if not ((header.hops == self.hops) and (header.is_text_msg == self.is_text_msg) and (header.is_beacon == self.is_beacon) and (header.is_waypoint == self.is_waypoint) ):
             return False
+        if not (header.high_rate == self.high_rate):
+            return False
         if not (header.acks == self.acks):
             return False
         if not ((header.request_ack == self.request_ack) and (header.request_double_ack == self.request_double_ack)):
@@ -273,46 +316,17 @@ class IL2P_Frame_Header:
         return self.my_seq
     
     ##@brief unpacks header information that was stored in a 32 bytes array and returns a new IL2P_Frame_Header object
-    ##@param header_bytes numpy 1d array of bytes of length 32 holding the IL2P header information
+    ##@param header_bytes numpy 1d array of bytes of length 32 holding the IL2P header information, or any other bytes-like object
     ##@return returns an IL2P_Frame_Header object
     def unpack_header(header_bytes):
-        src_cs = np.zeros((6), dtype=np.uint8)
-        lnk_cs = np.zeros((6), dtype=np.uint8)
-        dst_cs = np.zeros((6), dtype=np.uint8)
-        
-        for i in range(0,6):
-            dst_cs[i] = (header_bytes[i])
-            lnk_cs[i] = (header_bytes[i+6])
-            src_cs[i] = (header_bytes[i+12])
-        ack = [False,False,False,False]
-        request_double_ack = True if (header_bytes[18] & np.uint(0x80)) != 0 else False
-        request_ack        = True if (header_bytes[18] & np.uint(0x40)) != 0 else False
-        ack[3]             = True if (header_bytes[18] & np.uint(0x20)) != 0 else False
-        ack[2]             = True if (header_bytes[18] & np.uint(0x10)) != 0 else False
-        ack[1]             = True if (header_bytes[18] & np.uint(0x08)) != 0 else False
-        ack[0]             = True if (header_bytes[18] & np.uint(0x04)) != 0 else False
-        is_waypoint        = True if (header_bytes[18] & np.uint(0x02)) != 0 else False
-        
-        hops               = (header_bytes[19] >>4) & np.uint8(0x03)
-        is_beacon          = True if (header_bytes[19] & np.uint(0x08)) != 0 else False
-        is_text_msg        = True if (header_bytes[19] & np.uint(0x04)) != 0 else False                                                
-        hops_remaining     = header_bytes[19] & np.uint8(0x03)
-        
-        payload_size = np.uint16( (np.uint16(header_bytes[20])<<8) | np.uint16(header_bytes[21]) )
-        my_seq       = np.uint16( (np.uint16(header_bytes[22])<<8) | np.uint16(header_bytes[23]) )
-        data = np.zeros((4),dtype=np.uint16)
-        data[0] = np.uint16( (np.uint16(header_bytes[24])<<8) | np.uint16(header_bytes[25]) )
-        data[1] = np.uint16( (np.uint16(header_bytes[26])<<8) | np.uint16(header_bytes[26]) )
-        data[2] = np.uint16( (np.uint16(header_bytes[28])<<8) | np.uint16(header_bytes[29]) )
-        data[3] = np.uint16( (np.uint16(header_bytes[30])<<8) | np.uint16(header_bytes[31]) )
-        
-        return IL2P_Frame_Header(src_callsign = src_cs.tobytes().decode(), \
-                                 link_src_callsign = lnk_cs.tobytes().decode(), \
-                                 dst_callsign = dst_cs.tobytes().decode(), \
-                                 hops_remaining=hops_remaining, hops=hops, \
-                                 is_text_msg=is_text_msg, is_beacon=is_beacon, is_waypoint=is_waypoint, \
-                                 acks=ack, my_seq = my_seq, \
-                                 request_ack=request_ack, request_double_ack=request_double_ack, \
-                                 payload_size=payload_size, data=data)
+        (dst_cs, lnk_cs, src_cs, flags, routing, payload_size, my_seq, d0, d1, d2, d3) = HEADER_STRUCT.unpack_from(header_bytes)
+        return IL2P_Frame_Header(src_callsign = src_cs.decode(), \
+                                 link_src_callsign = lnk_cs.decode(), \
+                                 dst_callsign = dst_cs.decode(), \
+                                 hops_remaining=routing & 0x03, hops=(routing>>4) & 0x03, \
+                                 is_text_msg=(routing & 0x04) != 0, is_beacon=(routing & 0x08) != 0, is_waypoint=(flags & 0x02) != 0, \
+                                 acks=[(flags & 0x04) != 0, (flags & 0x08) != 0, (flags & 0x10) != 0, (flags & 0x20) != 0], my_seq = my_seq, \
+                                 request_ack=(flags & 0x40) != 0, request_double_ack=(flags & 0x80) != 0, \
+                                 payload_size=payload_size, data=np.array((d0, d1, d2, d3), dtype=np.uint16), high_rate=(routing & 0x40) != 0)
 
 
@@ -1,5 +1,6 @@
 import numpy as np
 import io
+import copy
 import time
 #import threading
 #import queue
@@ -83,10 +84,11 @@ class IL2P_API:
         self.forward_acks = AckSequenceList()
         self.enable_forwarding = True
         
-        self.reader = IL2P_API.IL2P_Frame_Reader(verbose=verbose, frame_engine=self.engine)
+        self.reader = IL2P_API.IL2P_Frame_Reader(verbose=verbose, frame_engine=IL2P_Frame_Engine()) #frames may be decoded on another thread, so the reader gets an engine of its own
         self.writer = IL2P_API.IL2P_Frame_Writer(verbose=verbose, frame_engine=self.engine)
         
         self.include_gps_in_ack = False
+        self.high_rate_min_payload = config.high_rate_min_payload #payloads at least this long are sent in the high rate data mode, 0 disables the mode
         
         #pending acknowledgments are stored in a dictionary where the key is a tuple containing the following elements in order:
         #   -the callsign of the station requesting an ack
@@ -105,6 +107,19 @@ class IL2P_API:
         else:
             return self.processFrame(header, payload)
     
+    ##@brief decode a raw frame taken from the phy layer earlier with IL2P_Frame_Reader.readRawFrame and process it
+    ##@param raw_frame numpy 1d array of the raw frame bytes
+    ##@param alternates a list of other demodulations of the raw frame bytes
+    ##@param partial a PartialPayload holding the payload blocks decoded while the frame was being received
+    ##@param header the IL2P_Frame_Header decoded while the frame was being received, None decodes it from raw_frame
+    ##@return returns True when the frame was decoded and processed, False otherwise
+    def decodeFrame(self, raw_frame, alternates=(), partial=None, header=None):
+        (header, payload) = self.reader.decodeFrame(raw_frame, alternates, partial, header)
+        if (header == None): #if the reader failed to decode the frame
+            return False
+        else:
+            return self.processFrame(header, payload)
+    
     def is_me(self, callsign):
         return (callsign == self.my_callsign)
     
@@ -121,9 +136,10 @@ class IL2P_API:
         
         #handle any forwarded acks contained in this message
         for seq in header.getForwardAckSequenceList():
-            if (seq in self.pending_acks): #this is an acknowledgment for me
+            with self.pending_acks_lock:
+                is_my_ack = (self.pending_acks.pop(seq, None) is not None) #remove the ack from the pending acks dictionary
+            if (is_my_ack): #this is an acknowledgment for me
                 #log.info('received a forwarded ack')
-                self.pending_acks.pop(seq) #remove the ack from the pending acks dictionary
                 forward_msg = False
                 self.service_controller.send_ack_message(header.src_callsign, seq) #send the ack to the UI  
             else: #forward all received acknowledgements
@@ -208,14 +224,22 @@ class IL2P_API:
                 log.warning(ex)
                 return False 
     
+    ## @brief decide whether a message is sent in the high rate data mode, it is decided each time the message is sent so retries follow the current setting
+    ## @param msg - The MessageObject
+    ## @return - Returns true when the message's payload is long enough to be sent in the high rate data mode
+    def isHighRate(self, msg):
+        return (self.high_rate_min_payload > 0) and (msg.header.payload_size >= self.high_rate_min_payload)
+    
     ## @brief convert a MessageObject to a Frame and return the raw frame to be transmitted
     ## @param msg - The MessageObject
-    def msgToFrame(self, msg):
+    ## @param high_rate - True when the frame is sent in the high rate data mode
+    def msgToFrame(self, msg, high_rate=False):
         if (msg.forwarded == False):
             if (msg.header.request_double_ack or msg.header.request_ack):
                 if (msg.get_ack_seq() is not None):
-                    self.pending_acks[msg.get_ack_seq()] = AckRetryObject(msg,DEFAULT_RETRY_CNT) #create a new entry in the dictionary 
-        return self.writer.getFrameFromMessage(msg)
+                    with self.pending_acks_lock:
+                        self.pending_acks[msg.get_ack_seq()] = AckRetryObject(msg,DEFAULT_RETRY_CNT) #create a new entry in the dictionary 
+        return self.writer.getFrameFromMessage(msg, high_rate)
     
     ##@brief check to see if there is a frame to transmit right now
     ##@return - Returns true when there is a frame to send, returns false otherwise
@@ -227,40 +251,46 @@ class IL2P_API:
             return False
         else:
             toReturn = False
-            for key, retry in self.pending_acks.items():
-                if (retry.ready() == True):
-                    toReturn = True
-                    break
+            with self.pending_acks_lock: #acks are removed by the thread decoding received frames
+                for key, retry in self.pending_acks.items():
+                    if (retry.ready() == True):
+                        toReturn = True
+                        break
             return toReturn
             
     ##@brief return the next Frame to be transmitted
-    ##@return - Returns a tuple containing the next frame to be transmitted and the carrier length to use
+    ##@return - Returns a tuple containing the next frame to be transmitted, the carrier length to use and whether the payload is sent in the high rate data mode
     ## New Frames are prioritized, then re-transmissions
-    ## If there is nothing to transmit, returns (None,0)
+    ## If there is nothing to transmit, returns (None,0,False)
     def getNextFrameToTransmit(self):
         if (self.msg_send_queue.empty() == False):
             msg = self.msg_send_queue.get()#[1]
             carrier_len = msg.carrier_len
-            return (self.msgToFrame(msg),carrier_len)
+            high_rate = self.isHighRate(msg)
+            frame = self.msgToFrame(msg, high_rate)
+            return (frame,carrier_len,high_rate)
         elif (len(self.pending_acks) == 0):
-            return (None,0)
+            return (None,0,False)
         else:
             toPop = None
             toReturn = None
             carrier_len = 0
-            for key, retry in self.pending_acks.items():
-                if (retry.ready() == True):
-                    #log.info("key " + str(key))
-                    if (retry.decrement() == 0): #if the remaining number of tries is zero, do not re-transmit 
-                        self.service_controller.send_retry_message(key, -1)
-                        continue
-                    self.service_controller.send_retry_message(key, retry.retry_cnt-1)
-                    toReturn = self.writer.getFrameFromMessage(retry.msg)
-                    carrier_len = retry.msg.carrier_len
-                    #log.info(carrier_len)
-            if (toPop != None):
-                self.pending_acks.pop(toPop)
-            return (toReturn,carrier_len)
+            high_rate = False
+            with self.pending_acks_lock: #acks are removed by the thread decoding received frames
+                for key, retry in self.pending_acks.items():
+                    if (retry.ready() == True):
+                        #log.info("key " + str(key))
+                        if (retry.decrement() == 0): #if the remaining number of tries is zero, do not re-transmit 
+                            self.service_controller.send_retry_message(key, -1)
+                            continue
+                        self.service_controller.send_retry_message(key, retry.retry_cnt-1)
+                        high_rate = self.isHighRate(retry.msg)
+                        toReturn = self.writer.getFrameFromMessage(retry.msg, high_rate)
+                        carrier_len = retry.msg.carrier_len
+                        #log.info(carrier_len)
+                if (toPop != None):
+                    self.pending_acks.pop(toPop)
+            return (toReturn,carrier_len,high_rate)
 
     ##class used to read bytes from the phy layer and detect when a valid Frame is being received
     class IL2P_Frame_Reader:
@@ -279,38 +309,39 @@ class IL2P_API:
         ##@brief function to be called when the phy layer has a full frame ready for the link layer
         ##@return returns a tuple containing the message header and payload bytes when the message is received, returns None otherwise
         def readFrame(self):
-            ind = 0
-            raw_frame = np.zeros(RAW_FRAME_MAXLEN,dtype=np.uint8)
-
-            while(True):
-                if (self.src.recv_queue.empty() == False) and (ind < RAW_FRAME_MAXLEN): #if the queue isn't empty
-                    ele = self.src.recv_queue.get() #get the next element from the queue
-                    if (type(ele) is not int): #unknown type detected in queue
-                        log.error('ERROR: Unknown type in receive queue')
-                        continue 
-                    else:
-                        raw_frame[ind] = ele
-                        ind+=1  
-                else: #decode the frame
-                    log.debug('raw frame received: 0x%s', raw_frame[0:ind].tobytes().hex())
-                    try:
-                        (header, payload_decode_success, payload_bytes) = self.frame_engine.decode_frame(raw_frame)
-                        #log.info(header.getInfoString())
-                        #log.info(payload_bytes.tobytes()) #need to be doing something with bytes received    
-                        
-                        if (payload_decode_success == False):
-                            log.warning('WARNING: the payload was not completely decoded successfully, the header was decoded though')
-                            
-                        return (header, payload_bytes)
-                        
-                    except exceptions.IL2PHeaderDecodeError:
-                        log.warning('Failed to decode a frame header, the rest of the frame will be discarded')
-                        return (None,'')
-                    except BaseException:
-                        log.warning('Failed to decode frame')
-                        return (None,'')
-                    break
-            return (None,'')
+            (raw_frame, alternates, partial, header) = self.readRawFrame()
+            return self.decodeFrame(raw_frame, alternates, partial, header)
+        
+        ##@brief take the bytes of a full frame out of the phy layer without decoding them, so they can be decoded later on another thread
+        ##@return returns a tuple, the first element is a numpy 1d array holding the raw frame bytes, the second is a list of alternate demodulations of the frame, the third is the PartialPayload decoded while the frame was received (None if there is not one), the fourth the IL2P_Frame_Header decoded while the frame was received (None if there is not one)
+        def readRawFrame(self):
+            raw_frame = self.src.raw_frame[0:self.src.frame_len].copy() #the source reuses its buffer for the next frame
+            log.debug('raw frame received: 0x%s', raw_frame.tobytes().hex())
+            return (raw_frame, self.src.alternates, self.src.partial, self.src.frame_header)
+        
+        ##@brief decode a raw frame
+        ##@param raw_frame numpy 1d array of the raw frame bytes
+        ##@param alternates a list of other demodulations of the raw frame bytes
+        ##@param partial a PartialPayload holding the payload blocks decoded while the frame was being received
+        ##@param header the IL2P_Frame_Header decoded while the frame was being received, None decodes it from raw_frame
+        ##@return returns a tuple containing the message header and payload bytes when the frame is decoded, returns (None,'') otherwise
+        def decodeFrame(self, raw_frame, alternates=(), partial=None, header=None):
+            try:
+                (header, payload_decode_success, payload_bytes) = self.frame_engine.decode_frame(raw_frame, alternates=alternates, partial=partial, header=header)
+                #log.info(header.getInfoString())
+                #log.info(payload_bytes.tobytes()) #need to be doing something with bytes received    
+                
+                if (payload_decode_success == False):
+                    log.warning('WARNING: the payload was not completely decoded successfully, the header was decoded though')
+                    
+                return (header, payload_bytes)
+                
+            except exceptions.IL2PHeaderDecodeError:
+                log.warning('Failed to decode a frame header, the rest of the frame will be discarded')
+                return (None,'')
+            except BaseException:
+                log.warning('Failed to decode frame')
+                return (None,'')
 
     class IL2P_Frame_Writer:
         def __init__(self, verbose=False, frame_engine=frame_engine_default):
@@ -319,11 +350,13 @@ class IL2P_API:
         
         ##@brief convert a Message Object to a frame ready to be sent
         ##@param msg a MessageObject to be converted into a frame
-        def getFrameFromMessage(self, msg):
-            #frame = self.frame_engine.encode_frame(msg.header, np.frombuffer(msg.payload_str.encode(), dtype=np.uint8))
-             #frame_engine.encode_frame(header,     np.frombuffer( msg_str.encode(),dtype=np.uint8))
-            frame = self.frame_engine.encode_frame(msg.header, np.frombuffer(msg.payload_str.encode(),dtype=np.uint8))
-            toReturn = frame.tobytes()
+        ##@param high_rate True when the frame is sent in the high rate data mode, it is set in the frame's copy of the header so msg is left as it was queued
+        def getFrameFromMessage(self, msg, high_rate=False):
+            header = copy.copy(msg.header)
+            header.high_rate = high_rate
+            payload = msg.payload_str.encode()
+            toReturn = bytearray(self.frame_engine.encoded_length(len(payload)))
+            self.frame_engine.encode_frame(header, payload, out=toReturn) #encoded straight into the bytes that are sent
             log.debug('raw frame to be sent: 0x%s',toReturn.hex())
             return toReturn                   
 
@@ -3,7 +3,8 @@ import pickle
 import IL2P
 from IL2P import IL2P_Frame_Header, IL2P_Frame_Engine
 import exceptions
-from fec.fec import inject_symbol_errors
+from fec.fec import inject_symbol_errors, PartialPayload
+from messages import MessageObject
 
 frame_engine = IL2P_Frame_Engine()
 
@@ -23,6 +24,29 @@ else:
     header_obj.print_header()
     header_obj2.print_header()
 
+#messages.pickle holds headers pickled before __slots__ and high_rate were added to IL2P_Frame_Header, they must still load
+class LegacyHeader: #pickles the same way the header class did then, its fields in a dict
+    pass
+LegacyHeader.__module__ = 'IL2P'
+LegacyHeader.__qualname__ = 'IL2P_Frame_Header'
+legacy_header = LegacyHeader()
+legacy_header.__dict__.update(src_callsign='BAYWAX', link_src_callsign='BAYWAX', dst_callsign='WAYWAX', hops=2, hops_remaining=1, is_text_msg=False, \
+                              is_beacon=True, is_waypoint=False, acks=[True,True,True,True], request_ack=True, request_double_ack=False, \
+                              payload_size=np.uint16(1000), my_seq=np.uint16(0), data=np.array([10,11,12,13],dtype=np.uint16))
+IL2P.IL2P_Frame_Header = LegacyHeader
+try:
+    legacy_pickle = pickle.dumps(MessageObject(header=legacy_header, payload_str='sent before the upgrade'))
+finally:
+    IL2P.IL2P_Frame_Header = IL2P_Frame_Header
+legacy_msg = pickle.loads(legacy_pickle)
+if not (isinstance(legacy_msg.header, IL2P_Frame_Header) and legacy_msg.header.equals(header_obj) and (legacy_msg.header.high_rate == False) and \
+        (legacy_msg.header.pack_bytes() == header_obj.pack_bytes())):
+    print('FAILURE: a header pickled by an older version does not match after unpickling')
+elif not IL2P_Frame_Header.unpack_header(header_bytes).equals(pickle.loads(pickle.dumps(header_obj))):
+    print('FAILURE: a header does not match after pickling/unpickling')
+else:
+    print('The headers match after unpickling')
+
 
 ########### full IL2P unit test #########################
 
@@ -85,3 +109,67 @@ if not(header.equals(header_received)):
     print('FAILURE: headers do not match')
 print(payload_received)
 
+########### incremental payload decoding unit test #########################
+
+#decode the payload blocks one byte at a time as they would arrive from the receiver
+raw_payload = corrupted_frame[IL2P.IL2P_HDR_LEN_ENC:]
+partial = PartialPayload(msg.size)
+for received in range(1, raw_payload.size+1):
+    partial.update(frame_engine.payload_decoder, raw_payload, received)
+    frame_engine.payload_decoder.block_layout(50) #the decoder is used for a payload with fewer error correction symbols in between
+if (None in partial.errors):
+    print('FAILURE: not every payload block was decoded as it arrived')
+
+(header_received, decode_success, payload_received) = frame_engine.decode_frame(corrupted_frame, partial=partial)
+if not(decode_success and np.array_equal(payload_received, msg)):
+    print('FAILURE: payload decoded as it arrived does not match')
+else:
+    print('The payload decoded as it arrived matches')
+
+#the header decoded while the frame was being received is passed on instead of being decoded again
+(header_received, decode_success, payload_received) = frame_engine.decode_frame(corrupted_frame, header=frame_engine.decode_header(corrupted_frame, verbose=False))
+if not(decode_success and header.equals(header_received) and np.array_equal(payload_received, msg)):
+    print('FAILURE: frame decoded with the header decoded beforehand does not match')
+if (IL2P.decode_raw_header.cache_info().hits == 0):
+    print('FAILURE: the header was decoded again')
+
+########### batch encoding/decoding unit test #########################
+
+headers = [IL2P_Frame_Header(src_callsign='BAY%d' % (i,), dst_callsign='WAY', hops=i%3, hops_remaining=i%4, is_beacon=(i%2 == 0), \
+                             acks=[i%2 == 1, False, True, i%3 == 0], my_seq=i*1000, payload_size=i*50, data=np.array([i,2*i,3*i,4*i],dtype=np.uint16)) for i in range(0,12)]
+payloads = [np.random.randint(0, 256, size=header.getPayloadSize()).astype(np.uint8) for header in headers]
+
+if not np.array_equal(IL2P_Frame_Header.pack_headers(headers), np.stack([header.pack_header() for header in headers])):
+    print('FAILURE: headers packed together do not match the headers packed one at a time')
+
+frames = frame_engine.encode_frames(headers, payloads)
+if not all(np.array_equal(frame, frame_engine.encode_frame(header, payload)) for (frame, header, payload) in zip(frames, headers, payloads)):
+    print('FAILURE: frames encoded together do not match the frames encoded one at a time')
+
+corrupted_frames = [inject_symbol_errors(frame.copy(), 0.99) for frame in frames]
+corrupted_frames[1][0:40] = 0 #too many errors to decode the header
+results = frame_engine.decode_frames(corrupted_frames + [frames[0][0:30]])
+if (results[1] is not None) or (results[-1] is not None):
+    print('FAILURE: frames whose header cannot be decoded were not skipped')
+elif not all(result[1] and np.array_equal(result[2], payload) for (result, payload) in list(zip(results, payloads))[2:]):
+    print('FAILURE: frames decoded together do not match')
+elif not all(np.array_equal(result[0].pack_header(), frame_engine.decode_frame(frame)[0].pack_header()) for (result, frame) in list(zip(results, corrupted_frames))[2:]):
+    print('FAILURE: headers decoded together do not match the headers decoded one at a time')
+else:
+    print('The frames decoded together match')
+
+########### encoding/decoding into caller buffers unit test #########################
+
+#frames are encoded straight into a buffer the caller owns and decoded from any bytes-like object into another
+payload = b'encoded in place '*10
+header.setPayloadSize(len(payload))
+buffer = bytearray(frame_engine.encoded_length(len(payload)) + 2)
+frame = frame_engine.encode_frame(header, payload, out=memoryview(buffer)[1:-1])
+payload_buffer = bytearray(len(payload))
+(header_received, decode_success, payload_received) = frame_engine.decode_frame(bytes(buffer[1:-1]), out=payload_buffer)
+if not np.array_equal(frame, frame_engine.encode_frame(header, np.frombuffer(payload, dtype=np.uint8))) or (buffer[0] != 0) or (buffer[-1] != 0):
+    print('FAILURE: frame encoded into a buffer does not match')
+elif not(decode_success and header.equals(header_received) and (bytes(payload_buffer) == payload) and np.shares_memory(payload_received, np.frombuffer(payload_buffer, dtype=np.uint8))):
+    print('FAILURE: payload decoded into a buffer does not match')
+else:
+    print('The frames encoded and decoded in place match')
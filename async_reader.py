@@ -2,6 +2,8 @@
 
 #import logging
 import threading
+import multiprocessing
+from multiprocessing import shared_memory
 import queue
 import time
 import numpy as np
@@ -10,51 +12,195 @@ import math
 
 from kivy.logger import Logger as log
 
+process_context = multiprocessing.get_context('spawn') #processes reading a SharedByteRing start from a fresh interpreter, nothing of the capturing process's threads or audio interface is inherited
+
+##@brief a fixed capacity ring buffer of bytes, when it is full the oldest bytes are overwritten
+class ByteRing:
+    def __init__(self, capacity):
+        self.buf = bytearray(capacity)
+        self.capacity = capacity
+        self.read_ind = 0 #index of the oldest unread byte
+        self.count = 0 #the number of unread bytes
+        self.closed = False #set once nothing more will be written
+
+    def __len__(self):
+        return self.count
+
+    ##@brief copy data into the ring, dropping the oldest unread bytes if there is not enough room
+    ##@param data a bytes-like object
+    ##@return the number of unread bytes that were dropped to make room for data
+    def write(self, data):
+        data = memoryview(data).cast('B')
+        n = len(data)
+        dropped = 0
+        if (n > self.capacity): #only the newest bytes of data fit
+            dropped = n - self.capacity
+            data = data[dropped:]
+            n = self.capacity
+
+        overrun = self.count + n - self.capacity
+        if (overrun > 0): #drop the oldest bytes
+            self.read_ind = (self.read_ind + overrun) % self.capacity
+            self.count -= overrun
+            dropped += overrun
+
+        write_ind = (self.read_ind + self.count) % self.capacity
+        first = min(n, self.capacity - write_ind)
+        self.buf[write_ind:write_ind+first] = data[0:first]
+        self.buf[0:n-first] = data[first:n]
+        self.count += n
+        return dropped
+
+    ##@brief copy as many unread bytes as will fit into b
+    ##@param b a writable bytes-like object
+    ##@return the number of bytes copied
+    def readinto(self, b):
+        b = memoryview(b).cast('B')
+        n = min(len(b), self.count)
+        first = min(n, self.capacity - self.read_ind)
+        b[0:first] = self.buf[self.read_ind:self.read_ind+first]
+        b[first:n] = self.buf[0:n-first]
+        self.read_ind = (self.read_ind + n) % self.capacity
+        self.count -= n
+        return n
+
+##@brief a ByteRing kept in shared memory so another process can read the bytes this one writes, every access must hold a lock shared by both processes
+class SharedByteRing(ByteRing):
+    
+    ##@param capacity the number of bytes the ring holds
+    ##@param name the name of the shared memory block of an existing ring to attach to, None creates a new ring
+    def __init__(self, capacity, name=None):
+        self.shm = shared_memory.SharedMemory(name=name, create=(name is None), size=capacity+24)
+        self.state = np.ndarray(3, dtype=np.int64, buffer=self.shm.buf) #read_ind, count and closed, shared with the other process
+        self.buf = self.shm.buf[24:24+capacity]
+        self.capacity = capacity
+        if (name is None):
+            self.state[:] = 0
+
+    read_ind = property(lambda self: int(self.state[0]), lambda self, value: self.state.__setitem__(0, value))
+    count = property(lambda self: int(self.state[1]), lambda self, value: self.state.__setitem__(1, value))
+    closed = property(lambda self: bool(self.state[2]), lambda self, value: self.state.__setitem__(2, value))
+
+    ##@brief detach from the shared memory, the process that created the ring also frees it
+    def close(self, unlink=False):
+        self.buf.release()
+        del self.state
+        self.shm.close()
+        if (unlink):
+            self.shm.unlink()
+
+##@brief block until b is filled with bytes from a ring
+##@param ring the ByteRing to read from
+##@param cond the Condition guarding ring, it is notified whenever bytes are written
+##@param b a writable bytes-like object
+##@param timeout the maximum number of seconds to wait, None waits forever
+##@return the number of bytes read, always len(b)
+def wait_readinto(ring, cond, b, timeout=None):
+    view = memoryview(b).cast('B')
+    received = 0
+    with cond:
+        while received < len(view):
+            #wait until the rest of b can be filled at once so nothing is consumed if the wait times out
+            ready = lambda: ring.closed or (len(ring) >= min(len(view) - received, ring.capacity))
+            if not cond.wait_for(ready, timeout):
+                raise IOError('timeout')
+            if (len(ring) == 0):
+                raise IOError('cannot read from stream')
+            received += ring.readinto(view[received:])
+    return received
+
+##@brief reads the audio an AsyncReader captures into shared memory from another process, it is passed to the process as an argument
+class SharedRingReader:
+    def __init__(self, name, capacity, cond):
+        self.name = name
+        self.capacity = capacity
+        self.cond = cond
+        self.ring = None #attached to the shared memory on the first read, in the process doing the reading
+
+    def readinto(self, b, timeout=None):
+        if (self.ring is None):
+            self.ring = SharedByteRing(self.capacity, self.name)
+        return wait_readinto(self.ring, self.cond, b, timeout)
+
+    def read(self, size):
+        result = bytearray(size)
+        self.readinto(result)
+        return bytes(result)
+
+    def close(self):
+        if (self.ring is not None):
+            self.ring.close()
+            self.ring = None
+
 class AsyncReader:
-    def __init__(self, stream, mean_abs_callback):
+
+    capacity_blocks = 20 #the capacity of the capture buffer in stream blocks, 2 seconds of audio with the default latency
+
+    ##@param stream the audio stream to capture from
+    ##@param mean_abs_callback called with the mean absolute value of each captured block
+    ##@param shared when True the audio is captured into shared memory so another process can read it through remote()
+    def __init__(self, stream, mean_abs_callback, shared=False):
         self.stream = stream
-        self.queue = queue.Queue()
+        if (shared):
+            self.ring = SharedByteRing(self.capacity_blocks * stream.bufsize)
+            self.cond = process_context.Condition()
+        else:
+            self.ring = ByteRing(self.capacity_blocks * stream.bufsize)
+            self.cond = threading.Condition()
+        self.dropped_blocks = 0 #the number of blocks that overwrote audio the consumer had not read yet
+        self.late_blocks = 0 #the number of blocks that arrived while the consumer was more than half the buffer behind
         self.stop = threading.Event()
-        args = (stream, stream.bufsize, self.queue, self.stop, mean_abs_callback)
-        self.thread = threading.Thread(target=AsyncReader._thread, args=args, name='AsyncReader')
+        args = (stream, stream.bufsize, mean_abs_callback)
+        self.thread = threading.Thread(target=self._thread, args=args, name='AsyncReader')
         self.thread.start()
-        self.buf = b''
 
-    @staticmethod
-    def _thread(src, bufsize, queue, stop, mean_abs_callback):
+    def _thread(self, src, bufsize, mean_abs_callback):
         try:
             log.debug('AsyncReader thread started')
-            while not stop.isSet():
+            while not self.stop.isSet():
                 buf = src.read(bufsize)
                 #if (mean is not None):
                 #    log.info('Mean %d' % (mean,) )
-                
+
                 #compute the mean of the absolute value of the samples taken and pass them to a callback method
                 arr = np.frombuffer(buf, dtype='int16')
                 mean_abs_callback(np.mean(np.abs(arr)))
-                
-                if (queue.full()):
-                    time.sleep(0.01)
-                    log.info('queue is full')
-                    queue.get()
-                    
-                queue.put(buf)
-                
+
+                with self.cond:
+                    if (len(self.ring) > self.ring.capacity // 2):
+                        self.late_blocks += 1
+                    if (self.ring.write(buf) > 0):
+                        self.dropped_blocks += 1
+                        log.info('capture buffer overrun, %d blocks dropped so far' % (self.dropped_blocks,))
+                    self.cond.notify_all()
+
             log.debug('AsyncReader thread stopped')
         except BaseException:  # pylint: disable=broad-except
             log.exception('AsyncReader thread failed')
-            queue.put(None)
+        finally:
+            with self.cond:
+                self.ring.closed = True
+                self.cond.notify_all()
 
-    def read(self, size):
-        while len(self.buf) < size:
-            buf = self.queue.get()
-            if buf is None:
-                raise IOError('cannot read from stream')
-            self.buf += buf
+    @property
+    def failed(self):
+        return self.ring.closed
 
-        result = self.buf[:size]
-        self.buf = self.buf[size:]
-        return result
+    ##@brief block until b is filled with captured audio
+    ##@param b a writable bytes-like object
+    ##@param timeout the maximum number of seconds to wait for the audio to be captured, None waits forever
+    ##@return the number of bytes read, always len(b)
+    def readinto(self, b, timeout=None):
+        return wait_readinto(self.ring, self.cond, b, timeout)
+
+    ##@brief a reader for the captured audio that can be passed to another process, only when the AsyncReader was created with shared=True
+    def remote(self):
+        return SharedRingReader(self.ring.shm.name, self.ring.capacity, self.cond)
+
+    def read(self, size):
+        result = bytearray(size)
+        self.readinto(result)
+        return bytes(result)
 
     def close(self):
         if self.stream is not None:
@@ -62,3 +208,5 @@ class AsyncReader:
             self.thread.join()
             self.stream.close()
             self.stream = None
+            if isinstance(self.ring, SharedByteRing):
+                self.ring.close(unlink=True)
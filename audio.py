@@ -1,7 +1,9 @@
 """Audio capabilities for amodem."""
 
 import ctypes
+import io
 import time
+import wave
 
 from kivy.logger import Logger as log
 
@@ -50,7 +52,7 @@ class Interface:
         return self
 
     def __exit__(self, *args):
-        for s in self.streams:
+        for s in list(self.streams):
             s.close()
         self.call('Terminate')
 
@@ -117,6 +119,7 @@ class Stream:
             self.interface.call('StopStream', self.stream)
             self.interface.call('CloseStream', self.stream)
             self.stream = None
+            self.interface.streams.remove(self)
 
     def read(self, size):
         assert size % self.bytes_per_sample == 0
@@ -137,3 +140,79 @@ class Stream:
         buf = ctypes.c_char_p(data)
         frames = ctypes.c_ulong(len(data) // self.bytes_per_sample)
         self.interface.call('WriteStream', self.stream, buf, frames)
+
+
+##@brief base class for the destinations a modulated frame is written to by transceiver.send(), each sink has a write(data) method taking a bytes-like object of int16 pcm audio
+class Sink:
+
+    ##@brief play the audio written to the sink so far, blocks until the audio has been played
+    def play(self):
+        pass
+
+    def close(self):
+        pass
+
+##@brief sink that streams pcm audio straight to a portaudio output stream
+class StreamSink(Sink):
+
+    ##@param interface an Interface object that has already been initialized
+    def __init__(self, interface):
+        self.interface = interface
+        self.stream = None
+
+    def write(self, data):
+        if self.stream is None: #the output stream is only opened while there is a frame to send
+            self.stream = self.interface.player()
+        self.stream.write(data)
+
+    def play(self):
+        self.close() #stopping the stream blocks until everything written to it has been played
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+##@brief sink that collects pcm audio in memory and hands it to a player as a wav file
+class WavSink(Sink):
+
+    ##@param config Configuration object
+    ##@param player a function that plays the bytes of a wav file, may be None if the audio is only to be read back with getvalue()
+    def __init__(self, config, player=None):
+        self.config = config
+        self.player = player
+        self.pcm = bytearray()
+
+    def write(self, data):
+        self.pcm.extend(data)
+
+    ##@brief return the audio written to the sink as the bytes of a wav file
+    def getvalue(self):
+        buf = io.BytesIO()
+        with wave.open(buf, 'wb') as wavfile:
+            wavfile.setparams((1, self.config.sample_size, int(self.config.Fs), 0, 'NONE', 'NONE'))
+            wavfile.writeframes(self.pcm)
+        return buf.getvalue()
+
+    def play(self):
+        if self.player is not None:
+            self.player(self.getvalue())
+        self.pcm = bytearray()
+
+    def close(self):
+        self.pcm = bytearray()
+
+##@brief sink that writes raw pcm audio to a file, used for testing
+class FileSink(Sink):
+
+    ##@param filename the name of the file to be written, example 'temp.pcm'
+    def __init__(self, filename):
+        self.filename = filename
+        self.fd = open(filename, 'wb')
+
+    def write(self, data):
+        self.fd.write(data)
+
+    def close(self):
+        if not self.fd.closed:
+            self.fd.close()
@@ -137,7 +137,7 @@ def loads(data):
 def dumps(sym):
     """ Dump signal to memory buffer. """
     sym = sym.real * scaling
-    return sym.astype('int16').tostring()
+    return sym.astype('int16').tobytes()
 
 
 def iterate(data, size, func=None, truncate=True, index=False):
@@ -186,6 +186,105 @@ def takeOne(iterable):
     return (np.array(list(itertools.islice(iterable, 1)))[0])
 
 
+##@brief a buffer of samples that is filled in chunks by the capture path and read with numpy views
+## rather than wrapping around, the unread samples are moved to the front of a new buffer when a new chunk does not fit,
+## so every read is a single contiguous view. The old buffer is left as it was, so a view stays valid after later reads.
+class SampleRing:
+
+    ##@param source an iterable of 1d numpy arrays of samples, for example a stream.Reader
+    ##@param capacity the initial number of samples the buffer can hold, the buffer grows if a read needs more
+    ##@param dtype the type of the samples, complex for the baseband signal from dsp.front_end
+    def __init__(self, source, capacity=(1 << 14), dtype=float):
+        self.source = iter(source)
+        self.buf = np.zeros(capacity, dtype=dtype)
+        self.start = 0 #index of the first unread sample
+        self.end = 0 #index one past the last unread sample
+        self.offset = 0 #the total number of samples read out of the buffer
+
+    def __len__(self):
+        return self.end - self.start
+
+    ##@brief add a chunk of samples to the end of the buffer
+    ##@param chunk 1d numpy array of samples
+    def push(self, chunk):
+        chunk_len = len(chunk)
+        if (self.end + chunk_len > len(self.buf)):
+            pending = self.end - self.start
+            if (pending + chunk_len > len(self.buf)): #grow the buffer
+                buf = np.zeros(max(2*len(self.buf), pending + chunk_len), dtype=self.buf.dtype)
+            else: #a view taken before this push may still be in use, so the unread samples are not moved in place
+                buf = np.zeros(len(self.buf), dtype=self.buf.dtype)
+            buf[0:pending] = self.buf[self.start:self.end] #move the unread samples to the front
+            self.buf = buf
+            self.start = 0
+            self.end = pending
+        self.buf[self.end:self.end+chunk_len] = chunk
+        self.end += chunk_len
+
+    ##@brief read chunks from the source until at least n samples are buffered or the source runs out
+    def _fill(self, n):
+        while (self.end - self.start < n):
+            try:
+                chunk = next(self.source)
+            except StopIteration:
+                return
+            self.push(chunk)
+
+    ##@brief return a view of the next n samples without consuming them, fewer are returned if the source runs out
+    def peek(self, n):
+        self._fill(n)
+        return self.buf[self.start:min(self.start+n, self.end)]
+
+    ##@brief return a view of the next n samples and consume them, fewer are returned if the source runs out
+    def take(self, n):
+        buf = self.peek(n)
+        self.start += len(buf)
+        self.offset += len(buf)
+        return buf
+
+    ##@brief consume the next n samples
+    def skip(self, n):
+        self.take(n)
+
+##@brief a SampleRing of the complex baseband signal from the receiver front end that also keeps the audio the baseband was made from,
+## the high rate data mode demodulates its payload from the unfiltered audio at the full sampling rate
+class BasebandRing(SampleRing):
+
+    ##@param source an iterable of 1d numpy arrays of audio samples, for example a stream.Reader
+    ##@param front_end the dsp.Downconverter that turns the audio into complex baseband
+    ##@param capacity the initial number of baseband samples the buffer can hold
+    def __init__(self, source, front_end, capacity=(1 << 14)):
+        self.front_end = front_end
+        self.audio = SampleRing((), capacity=capacity*front_end.decimation) #filled alongside the baseband, the audio behind the baseband already read is dropped
+        SampleRing.__init__(self, map(self._convert, source), capacity, dtype=complex)
+
+    def _convert(self, chunk):
+        self.audio.push(chunk)
+        return self.front_end(chunk)
+
+    ##@brief the index of the audio sample the next baseband sample was made from, the baseband lags the audio by the delay of the front end filter
+    def audio_index(self):
+        return self.offset*self.front_end.decimation - self.front_end.delay
+
+    def take(self, n):
+        buf = SampleRing.take(self, n)
+        self.audio.skip(max(0, self.audio_index() - self.audio.offset)) #the audio is only read from where the baseband has got to
+        return buf
+
+    ##@brief take the next n audio samples from where the baseband signal has got to, the baseband made from them is consumed as well
+    ##@return a view of the next n audio samples, fewer are returned if the source runs out
+    def take_audio(self, n):
+        self.audio.skip(max(0, self.audio_index() - self.audio.offset))
+        while (len(self.audio) < n):
+            pending = len(self)
+            self.peek(pending + 1) #convert another chunk of audio
+            if (len(self) == pending): #the source has run out
+                break
+        buf = self.audio.take(n)
+        SampleRing.take(self, len(buf) // self.front_end.decimation)
+        return buf
+
+
 def izip(iterables):
     """ "Python 3" zip re-implementation for Python 2. """
     iterables = [iter(iterable) for iterable in iterables]
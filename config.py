@@ -36,8 +36,25 @@ class Configuration:
     #carrier_length = 750 ##carrier length in milliseconds
     silence_start = 0.1
     silence_stop = 0.1
+    tx_stream_output = False # stream frames straight to the portaudio output instead of playing them from a wav file with android.media.MediaPlayer, not yet verified on a device
+
+    # high rate data mode config
+    data_frequencies = [1000, 3000] # the first and last carriers used for frame payloads sent in the high rate data mode
+    data_Npoints = 4 # the size of the QAM constellation used on each carrier in the high rate data mode
+    data_training_length = 8 # the number of known symbols sent ahead of a high rate payload so the receiver can find the symbol timing and estimate each carrier's gain and phase
+    high_rate_min_payload = 0 # frames with payloads of at least this many bytes are sent in the high rate data mode, 0 disables the mode so stations without it can decode every frame
 
     # receiver config
+    rx_filter_band = [500, 3500] # band (in Hz) around the carrier kept by the receiver front end, covers both data modes, None keeps everything the decimated rate can hold
+    rx_filter_taps = 31
+    rx_decimation = 2 # the receiver front end keeps one complex baseband sample out of this many audio samples, high rate payloads are demodulated from the unfiltered audio instead
+    carrier_search_span = 300 # the carrier is searched for this many Hz either side of its nominal frequency to tolerate drift in the audio path, 0 searches the nominal frequency only
+    carrier_search_step = 100 # the spacing (in Hz) of the frequencies tested while searching for the carrier
+    rx_idle_block = 0.1 # seconds of audio handed to the detector at a time while listening for a carrier
+    rx_active_block = 0.016 # seconds of audio handed to the receiver at a time while demodulating a frame
+    rx_multiprocess = False # run the carrier detector and demodulator in a separate process reading the captured audio from shared memory, uses a second core
+    rx_decode_queue = 8 # the number of received frames that can wait to be decoded while the receiver listens for the next one
+    rx_timing_offsets = [-1, 0, 1] # baseband sample offsets from the detected symbol timing that a frame is demodulated at, the header that needs the fewest corrections picks the timing, [0] turns this off
     skip_start = 0.1
     timeout = 2.0 #timeout when looking for prefix symbols
     
@@ -107,3 +124,18 @@ class Configuration:
         symbols = np.array(symbols)
         symbols = symbols - symbols[-1]/2
         self.symbols = symbols / np.max(np.abs(symbols))
+
+    ##@brief the sampling frequency of the complex baseband signal the receiver works on, derived so configurations pickled before it existed still load
+    @property
+    def Fs_bb(self):
+        return self.Fs / self.rx_decimation
+
+    ##@brief the number of complex baseband samples in one symbol
+    @property
+    def Nsym_bb(self):
+        return self.Nsym // self.rx_decimation
+
+    ##@brief build the configuration of the multi-carrier QAM modem used by the high rate data mode
+    ##@return returns a Configuration object whose frequencies, carriers and symbols describe the high rate data mode
+    def data_mode(self):
+        return Configuration(Fs=self.Fs, Tsym=self.Tsym, frequencies=self.data_frequencies, Npoints=self.data_Npoints)
@@ -12,111 +12,195 @@ import dsp
 #import equalizer
 import common
 import exceptions
+from send import BARKER_BITS
 
 from kivy.logger import Logger as log
 
-class MooreMachine:
-    
-    def __init__(self):
-        self.state_transition_array = [True, True, True, True, True, False, False, True, True, False, True, False, True] 
-        self.current_state = 0
-        self.MAX_MISTAKES = 2
-        self.mistakes = 0
-    
-    ##@brief feed a boolean input into the Moore Machine
-    ##@param bool_in the boolean input into the Moore Machine
-    ##@return returns the output of the Moore Machine
-    def feed(self, bool_in):
-        if (bool_in == self.state_transition_array[self.current_state]): #transition to the next state if the input was correct
-            self.current_state += 1
-        else: #reset the machine if the input was not correct
-            if (self.mistakes == self.MAX_MISTAKES):
-                self.mistakes = 0
-                self.current_state = 0
-            else:
-                self.mistakes += 1
-            
-        
-        #compute the output of the Moore Machine
-        if (self.current_state == len(self.state_transition_array)):
-            self.current_state = 0
-            return True
-        else:
-            return False
-        
 class Detector:
 
     COHERENCE_THRESHOLD = 0.75
+    BARKER_THRESHOLD = 0.6 #the correlation score needed to detect the barker code, a score of 1 is a perfect match and 2 wrong symbols score about 0.69
     CARRIER_THRESHOLD = 10 #number of milliseconds the carrier needs to be coherently detected
+    ENERGY_OPEN_RATIO = 1.3 #the gate opens when a block has this much more power than the noise floor, low enough to pass the weakest carrier that can pass the coherence threshold
+    ENERGY_CLOSE_RATIO = 1.15 #the gate starts to close when the block power falls below this ratio of the noise floor
+    ENERGY_HOLD_BLOCKS = 4 #the number of quiet blocks the gate stays open for
+    NOISE_FLOOR_ALPHA = 0.05 #the weight of each new block in the noise floor's moving average
+    MIN_NOISE_FLOOR = 1e-9
     #CARRIER_THRESHOLD = int(0.03 * equalizer.carrier_length)
 
     def __init__(self, config):
         self.freq = config.Fc
-        self.samp_freq = config.Fs
+        self.samp_freq = config.Fs_bb #the detector works on the complex baseband signal from dsp.front_end
         #log.info(config.Fs)
-        self.omega = 2 * np.pi * self.freq / self.samp_freq
-        self.Nsym = config.Nsym
+        self.Nsym = config.Nsym_bb
         self.Tsym = config.Tsym
         self.maxlen = config.baud  # 1 second of symbols
         self.max_offset = config.timeout * self.samp_freq
         self.avg_timeout = 0.5
         #self.equalizer = equalizer.Equalizer(config)
-        self.barker_detector = MooreMachine()
+        self.barker_chips = 1 - 2*np.array(BARKER_BITS) #the expected sign of the product of each barker symbol and the symbol before it, a phase change is negative
+        self.barker_score = 0.0 #the correlation score of the most recently detected barker code, a quality metric for the frame
+        self.symbols_per_block = 32 #the number of symbols tested for coherence at once while waiting for a carrier
+        self.noise_floor = None #the average power of the blocks that held no carrier, measured on the first block
+        self.gate_hold = 0 #the number of quiet blocks left before the energy gate closes
+
+        #the carrier is searched for in a bank of frequencies around Fc
+        span = config.carrier_search_span
+        self.search_offsets = np.arange(-span, span+1, config.carrier_search_step) if (span > 0) else np.array([0])
+        self.search_omegas = 2 * np.pi * self.search_offsets / self.samp_freq #the carrier sits at 0 Hz in the baseband signal
+        self.carrier_bin = 0 #the offset (in Hz) of the search frequency the most recent carrier was strongest in
+        self.freq_offset = 0.0 #the carrier frequency offset (in Hz) measured on the most recent carrier
+        self.snr = 0.0 #the signal to noise ratio (in dB) of the most recent carrier
+
+    ##@brief energy gate in front of the coherence detector, tracks the noise floor with hysteresis
+    ##@param power the mean power of a block of samples
+    ##@return True if the block should be tested for coherence, False if it holds only noise
+    def _gate(self, power):
+        if (self.noise_floor is None): #the first block seeds the noise floor and is always tested
+            self.noise_floor = max(power, self.MIN_NOISE_FLOOR)
+            return True
+        if (power > self.ENERGY_OPEN_RATIO*self.noise_floor):
+            self.gate_hold = self.ENERGY_HOLD_BLOCKS
+        elif (power < self.ENERGY_CLOSE_RATIO*self.noise_floor) and (self.gate_hold > 0):
+            self.gate_hold -= 1
+        return (self.gate_hold > 0)
+
+    ##@brief fold the power of a block that held no carrier into the noise floor
+    def _update_noise_floor(self, power):
+        self.noise_floor += self.NOISE_FLOOR_ALPHA*(power - self.noise_floor)
+        self.noise_floor = max(self.noise_floor, self.MIN_NOISE_FLOOR)
 
     def _wait(self, samples):
         timeout_sec = self.avg_timeout + 0.5*random.uniform(-self.avg_timeout,self.avg_timeout)
         bufs = collections.deque([], maxlen=self.CARRIER_THRESHOLD)
-        for offset, buf in common.iterate(samples, self.Nsym, index=True):
-            #look for a signal that is coherent with the carrier wave
-            if (abs(dsp.coherence(buf, self.omega)) > self.COHERENCE_THRESHOLD):
-                bufs.append(buf)
-                #log.info(len(bufs))
-                if (len(bufs) == self.CARRIER_THRESHOLD):
-                    log.info('coherence threshhold reached')
-                    return np.concatenate(bufs)
-            else: #reset the buffer if the sample is not coherent
+        bins = collections.deque([], maxlen=self.CARRIER_THRESHOLD) #the strongest search frequency of each symbol in bufs
+        block_len = self.Nsym * self.symbols_per_block
+        offset = 0
+        while True:
+            buf = samples.peek(block_len)
+            symbol_cnt = len(buf) // self.Nsym
+            if (symbol_cnt == 0):
+                raise exceptions.NoCarrierDetectedError
+            symbols = buf[0:symbol_cnt*self.Nsym].reshape(-1, self.Nsym)
+
+            #skip the coherence test on blocks that hold nothing but the noise floor
+            power = np.vdot(buf, buf).real / len(buf)
+            if not self._gate(power):
+                self._update_noise_floor(power)
                 bufs.clear()
-                if (offset > 0.5*self.samp_freq):#(self.max_offset)):
-                    raise exceptions.NoCarrierDetectedError  
-        raise exceptions.NoCarrierDetectedError
-
+                bins.clear()
+                samples.skip(symbol_cnt*self.Nsym)
+                offset += symbol_cnt*self.Nsym
+                if (offset > 0.5*self.samp_freq):
+                    raise exceptions.NoCarrierDetectedError
+                continue
+
+            #look for a signal that is coherent with the carrier wave at any of the search frequencies, every symbol in the block is tested at once
+            coherence = dsp.coherence_bank(symbols, self.search_omegas)
+            strongest = np.argmax(coherence, axis=1)
+            coherent = coherence[np.arange(symbol_cnt), strongest] > self.COHERENCE_THRESHOLD
+            longest = len(bufs) #the longest run of coherent symbols in the block, noise makes short runs
+            for i in range(symbol_cnt):
+                if (coherent[i]):
+                    bufs.append(symbols[i].copy()) #copy so the run does not keep the whole buffer alive
+                    bins.append(strongest[i])
+                    longest = max(longest, len(bufs))
+                    #log.info(len(bufs))
+                    if (len(bufs) == self.CARRIER_THRESHOLD):
+                        log.info('coherence threshhold reached')
+                        self.carrier_bin = self.search_offsets[np.argmax(np.bincount(bins))]
+                        samples.skip((i+1)*self.Nsym)
+                        return np.concatenate(bufs)
+                else: #reset the buffer if the sample is not coherent
+                    bufs.clear()
+                    bins.clear()
+                    if (offset + i*self.Nsym > 0.5*self.samp_freq):#(self.max_offset)):
+                        samples.skip((i+1)*self.Nsym)
+                        raise exceptions.NoCarrierDetectedError
+            if (longest < self.CARRIER_THRESHOLD // 2): #the gate is open but there is no carrier, so the noise floor may have risen
+                self._update_noise_floor(power)
+            samples.skip(symbol_cnt*self.Nsym)
+            offset += symbol_cnt*self.Nsym
+
+    ##@brief correlate a block of samples against the barker code at every sample offset
+    ##@param buf 1d numpy array of complex baseband samples
+    ##@param derotate the phase correction for the carrier frequency offset, applied to every symbol product
+    ##@return a tuple, the first element holds the correlation score (between -1 and 1) of a barker code whose reference symbol starts at each sample,
+    ## the second holds the correlation before it is normalized, the third holds the product of the symbol starting at each sample and the symbol before it
+    def _correlate(self, buf, derotate):
+        N = self.Nsym
+        chips = len(self.barker_chips)
+        z = np.convolve(buf, np.ones(N), mode='valid') #z[n] is the symbol starting at sample n
+        d = z[N:] * np.conj(z[:-N]) * derotate #d[n] compares the symbol starting at n+N with the symbol starting at n
+
+        #matched filter, every barker symbol is compared to the symbol before it at once for all sample offsets
+        P = len(d) - (chips-1)*N
+        correlation = np.zeros(P)
+        energy = np.zeros(P)
+        for j in range(chips):
+            correlation += self.barker_chips[j] * d[j*N:j*N+P].real
+            energy += np.abs(d[j*N:j*N+P])
+        return (np.divide(correlation, energy, out=np.zeros(P), where=(energy > 0)), correlation, d)
+
+    ##@brief look for the barker code that follows the carrier
+    ##@param samples a common.SampleRing positioned in the carrier, left at the separator symbol after the barker code if it is found
+    ##@return True if the barker code was found, False otherwise
     def _prefix(self, samples, gain=1.0):
-        t = np.arange(self.Nsym)
-
-        #take one symbol worth of samples and run it through a bandpass filter set to the carrier frequency
-        p_prev = common.take(samples, self.Nsym)*np.cos(2*np.pi*t*self.omega) 
-
-        for offset, buf in common.iterate(samples, self.Nsym, index=True):
-            #take one symbol worth of samples and run it through a bandpass filter set to the carrier frequency
-            p = buf*np.cos(2*np.pi*t*self.omega)
-            z = np.sum(p * p_prev) #numerically integrate the product of the current symbol and the previous symbol
-            phase_changed = (z < 0) #if the result is negative, the phase changed between these two symbols
-            if (self.barker_detector.feed(phase_changed)==True):
-                log.info('barker code detected')
-                return True
-            elif (offset > self.max_offset):
+        N = self.Nsym
+        chips = len(self.barker_chips)
+        block_len = N * self.symbols_per_block
+        lookahead = (chips + 2) * N #the reference symbol and the barker code, plus a symbol to find the peak in
+        derotate = np.exp(-2j*np.pi*self.freq_offset*self.Tsym) #the phase a symbol advances by because of the carrier frequency offset
+
+        residual = 0j #sums the phase advance left over after derotating, the carrier ahead of the barker code refines the frequency offset
+        offset = 0
+        while (offset <= self.max_offset):
+            buf = samples.peek(block_len + lookahead)
+            if (len(buf) < lookahead + N): #the signal has run out
                 return False
-            p_prev = p
+            (scores, correlation, d) = self._correlate(buf, derotate)
+            count = min(block_len, len(scores) - N)
+
+            found = np.nonzero(scores[0:count] > self.BARKER_THRESHOLD)[0]
+            if (len(found) == 0):
+                residual += np.sum(d[0:count] * np.sign(d[0:count].real)) #strip the phase changes so every product measures the residual offset
+                samples.skip(count)
+                offset += count
+                continue
+
+            #the score is flat near the barker code, but symbols that straddle a phase change shrink the correlation so it peaks where the code is aligned to the sample
+            peak = found[0] + np.argmax(correlation[found[0]:found[0]+N])
+            residual += np.sum(d[0:peak] * np.sign(d[0:peak].real))
+            self.freq_offset += np.angle(residual) / (2*np.pi*self.Tsym)
+            self.barker_score = scores[peak]
+            log.info('barker code detected, score %.2f' % (self.barker_score,))
+            samples.skip(peak + (chips + 1)*N) #skip the reference symbol and the barker code
+            return True
+        return False
 
     ##@brief detects the carrier sine wave that is sent first
+    ##@param samples a common.SampleRing holding the received signal
     ##@return if a carrier is detected, returns a gain factor to use, returns -1 otherwise
     def run(self, samples, stat_update):
         buf = self._wait(samples)
+        stat_update.update_status(common.CARRIER_DETECTED)
 
-        amplitude = self.estimate(buf)
+        amplitude, self.freq_offset = self.estimate(buf)
         gain = 1.0 / amplitude
         
-        #log.debug('Carrier symbols amplitude- %0.3f | Frequency Error- %0.3f ppm' % (amplitude, freq_err*1e6))
+        log.debug('Carrier symbols amplitude- %0.3f | Frequency offset- %0.1f Hz (strongest bin %+d Hz) | SNR- %0.1f dB' % (amplitude, self.freq_offset, self.carrier_bin, self.snr))
         if (self._prefix(samples,gain)):
             return gain
         else:
             return -1
 
+    ##@brief estimate the amplitude, frequency offset and signal to noise ratio of the carrier, the ratio is kept in self.snr
+    ##@param buf 1d numpy array holding whole symbols of the carrier at baseband
+    ##@param skip the number of symbols ignored at both ends of buf
+    ##@return a tuple, the amplitude of the carrier and its frequency offset from Fc in Hz
     def estimate(self, buf, skip=3):
-        filt = dsp.exp_iwt(-self.omega, self.Nsym) / (0.5 * self.Nsym)
-        frames = common.iterate(buf, self.Nsym)
-        symbols = [np.dot(filt, frame) for frame in frames]
-        symbols = np.array(symbols[skip:-skip])
+        frames = buf[0:len(buf) - (len(buf) % self.Nsym)].reshape(-1, self.Nsym)
+        symbols = np.sum(frames, axis=1)[skip:-skip] * (2.0 / self.Nsym) #the baseband holds half the amplitude of the real carrier
 
         amplitude = np.mean(np.abs(symbols))
 
@@ -124,6 +208,12 @@ class Detector:
         indices = np.arange(len(phase))
         a, b = dsp.linear_regression(indices, phase)
 
-        #freq_err = a / (self.Tsym * self.freq)
+        #the phase advances by a cycles per symbol, the carrier itself sits at 0 Hz
+        cycles = (a + 0.5) % 1.0 - 0.5
+        freq_offset = cycles / self.Tsym
+
+        #whatever is left after removing the fitted carrier is noise
+        noise = symbols - amplitude*np.exp(2j*np.pi*(a*indices + b))
+        self.snr = 10*np.log10(amplitude**2 / max(np.mean(np.abs(noise)**2), 1e-12))
 
-        return amplitude#, freq_err
+        return amplitude, freq_offset
@@ -1,5 +1,6 @@
 """Digital Signal Processing capabilities for amodem."""
 import functools
+import itertools
 
 import numpy as np
 
@@ -8,18 +9,67 @@ import exceptions
 from kivy.logger import Logger as log
 
 
+##@brief a stateful FIR filter that processes numpy chunks of samples
+## the last len(h)-1 samples of each chunk are kept so consecutive chunks are filtered as one continuous signal
 class FIR:
     def __init__(self, h):
         self.h = np.array(h)
-        self.x_state = [0] * len(self.h)
+        self.x_state = np.zeros(len(self.h) - 1)
 
+    ##@brief filter a chunk of samples
+    ##@param x 1d numpy array of samples
+    ##@return 1d numpy array of filtered samples, the same length as x
     def __call__(self, x):
-        x_ = self.x_state
-        h = self.h
-        for v in x:
-            x_ = [v] + x_[:-1]
-            yield np.dot(x_, h)
-        self.x_state = x_
+        x_ = np.concatenate( (self.x_state, x) )
+        self.x_state = x_[len(x_)-len(self.x_state):]
+        return np.convolve(x_, self.h, mode='valid')
+
+##@brief design a windowed-sinc lowpass filter
+##@param f_cutoff the edge of the passband in Hz
+##@param Fs the sampling frequency
+##@param numtaps the number of filter taps, should be odd
+##@return a 1d numpy array of filter taps with unity gain at 0 Hz
+def lowpass(f_cutoff, Fs, numtaps=31):
+    n = np.arange(numtaps) - (numtaps-1)/2.0
+    h = (2.0*f_cutoff/Fs)*np.sinc(2.0*f_cutoff*n/Fs) * np.hamming(numtaps)
+    return h / np.sum(h)
+
+##@brief the receiver front end, mixes real audio down to complex baseband around the carrier, band-limits it and decimates it
+## the mixer phase and the decimation phase carry over from one chunk to the next so consecutive chunks form one continuous signal
+class Downconverter:
+    ##@param Fs the sampling frequency of the audio
+    ##@param Fc the carrier frequency, it ends up at 0 Hz
+    ##@param bandwidth the width (in Hz) of the band kept around Fc
+    ##@param decimation one output sample is kept for this many audio samples
+    ##@param numtaps the number of filter taps
+    def __init__(self, Fs, Fc, bandwidth, decimation=1, numtaps=31):
+        self.omega = 2 * np.pi * Fc / Fs
+        self.decimation = decimation
+        self.delay = numtaps // 2 #the number of audio samples the baseband lags the audio by
+        self.filter = FIR(lowpass(0.5*bandwidth, Fs, numtaps) * exp_iwt(self.omega, numtaps)) #a complex bandpass that keeps only the positive frequencies around Fc
+        self.mixer = exp_iwt(-self.omega, int(Fs) // np.gcd(int(Fs), int(Fc))) #the mixer repeats after this many samples, 4 when Fc is Fs/4
+        self.n = 0 #the index of the next audio sample
+
+    ##@brief downconvert a chunk of audio
+    ##@param x 1d numpy array of real audio samples
+    ##@return 1d numpy array of complex baseband samples, one for every decimation audio samples
+    def __call__(self, x):
+        y = self.filter(x)
+        indices = np.arange((-self.n) % self.decimation, len(y), self.decimation) #only the kept samples are mixed down
+        baseband = y[indices] * self.mixer[(self.n + indices) % len(self.mixer)]
+        self.n = (self.n + len(x)) % (len(self.mixer) * self.decimation)
+        return baseband
+
+##@brief build the front end that turns received audio into the complex baseband signal used for carrier detection and demodulation
+##@param config Configuration object
+##@return a Downconverter object
+def front_end(config):
+    assert (config.Nsym % config.rx_decimation == 0), 'rx_decimation must divide the number of samples in a symbol'
+    bandwidth = min(config.Fs_bb, 2*config.Fc, config.Fs - 2*config.Fc) #keep the image at -Fc out
+    if (config.rx_filter_band is not None):
+        f_low, f_high = config.rx_filter_band
+        bandwidth = min(bandwidth, 2*max(config.Fc - f_low, f_high - config.Fc))
+    return Downconverter(config.Fs, config.Fc, bandwidth, config.rx_decimation, config.rx_filter_taps)
 
 class Demux:
     def __init__(self, sampler, omegas, Nsym):
@@ -61,6 +111,17 @@ def coherence(x, omega):
         return 0.0
     return np.dot(Hc, x) / norm_x
 
+##@brief compute the coherence of every row of a 2d array of complex baseband symbols with a bank of frequencies at once
+##@param x 2d numpy array, one symbol per row
+##@param omegas 1d numpy array of the angular frequencies to test for coherence with
+##@return 2d numpy array holding the magnitude of the coherence of each row (first index) with each frequency (second index)
+def coherence_bank(x, omegas):
+    n = x.shape[1]
+    Hc = np.exp(-1j * np.outer(np.arange(n), omegas)) / np.sqrt(n)
+    norm_x = np.sqrt(np.sum(np.abs(x)**2, axis=1))[:,None]
+    result = np.abs(np.dot(x, Hc))
+    return np.divide(result, norm_x, out=np.zeros_like(result), where=(norm_x != 0))
+
 def linear_regression(x, y):
     """ Find (a,b) such that y = a*x + b. """
     x = np.array(x)
@@ -101,6 +162,10 @@ class MODEM:
         self.decode_list = [(s, bits_map[s]) for s in self.symbols]
         #print(self.symbols)
         #print(self.decode_list)
+
+        #index tables used by the array methods, symbol i represents the bits of i starting from the least significant bit
+        self.bit_weights = 1 << np.arange(bits_per_symbol)
+        self.bits_table = np.array([bits for s, bits in self.decode_list], dtype=np.uint8)
                 
     def encode(self, bits):
         for bits_tuple in common.iterate(bits, self.bits_per_symbol, tuple):
@@ -119,24 +184,53 @@ class MODEM:
                 error_handler(received=received, decoded=decoded)
             yield bits
 
+    ##@brief map a whole array of bits to symbols
+    ##@param bits an array of 0 and 1's, bits left over after the last whole symbol are ignored
+    ##@return a 1d numpy array of complex symbols
+    def encode_array(self, bits):
+        bits = np.asarray(bits, dtype=int)
+        bits = bits[0:len(bits) - (len(bits) % self.bits_per_symbol)].reshape(-1, self.bits_per_symbol)
+        return self.symbols[np.dot(bits, self.bit_weights)]
+
+    ##@brief decode a whole array of received symbols into bits using nearest-neighbour decoding
+    ##@param symbols an array of received complex symbols
+    ##@param return_error when true, the distance between each received symbol and its decoded symbol is returned as well
+    ##@return a 1d numpy array of bits, or a tuple of the bits and the per-symbol error magnitudes if return_error is true
+    def decode_array(self, symbols, return_error=False):
+        symbols = np.asarray(symbols).flatten()
+        distance = np.abs(symbols[:, None] - self.symbols[None, :]) #one row per received symbol, one column per constellation point
+        indices = np.argmin(distance, axis=1)
+        bits = self.bits_table[indices].flatten()
+        if (return_error):
+            return (bits, distance[np.arange(len(symbols)), indices])
+        return bits
+
+##@brief differentially encode an array of bits, a 1 toggles the encoded bit and a 0 leaves it unchanged
+##@param bits an array of 0 and 1's
+##@param prev_bit the last differentially encoded bit from the previous call if the method is being called multiple times
+##@return a numpy array of the differentially encoded bits
+def differential_encode(bits, prev_bit=0):
+    return ((np.cumsum(bits) + int(prev_bit)) % 2).astype(int)
+
+##@brief differentially detect complex DBPSK symbols
+##@param z numpy array of complex symbols, one per baud along the last axis, each row is decoded separately
+##@param z_prev the complex symbol received right before z[...,0], one per row of z
+##@param rotation the phase (in radians) a symbol advances by relative to the one before it when the phase did not change, this corrects for a carrier frequency offset
+##@return a numpy array of bits, a 1 where the phase changed between two symbols
+def differential_decode(z, z_prev, rotation=0.0):
+    d = z * np.conj(np.concatenate((np.expand_dims(z_prev, -1), z[...,:-1]), axis=-1)) * np.exp(-1j*rotation)
+    return (d.real < 0).astype(np.uint8)
+
 ##@brief convert an array of bits to a differentially encoded BPSK signal
 ##@param bits an array of 0 and 1's
 ##@param L the upsampling factor to be applied to the signal
 ##@param prev_bit the last differentially encoded bit from the previous call if the method is being called multiple times
 def bits2baseband(bits,L,prev_bit=0):
-    dif_encoded_bits = np.zeros(len(bits))
-    for i in range(0,len(bits)):
-        dif_encoded_bits[i] = (bits[i] + prev_bit)%2 
-        prev_bit = dif_encoded_bits[i]
-
-
-    toReturn = np.zeros(len(dif_encoded_bits)*L)
-    for i in range(0,len(dif_encoded_bits)):
-        #upsample the signal and apply NRZ encoding
-        if (dif_encoded_bits[i] == 0):
-            toReturn[i*L : (i*L)+L] = -1
-        else:
-            toReturn[i*L : (i*L)+L] = 1
+    dif_encoded_bits = differential_encode(bits, prev_bit)
+    if (len(dif_encoded_bits) > 0):
+        prev_bit = dif_encoded_bits[-1]
+
+    toReturn = np.repeat(2.0*dif_encoded_bits - 1, L) #upsample the signal and apply NRZ encoding
     t = np.arange(start=0, stop=len(dif_encoded_bits)*L)
     return (toReturn,t,prev_bit)
 
@@ -153,3 +247,12 @@ def prbs(reg, poly, bits):
         reg = reg << 1
         if reg >> size:
             reg = reg ^ poly
+
+##@brief generate the known pseudo-random symbols sent ahead of a high rate payload
+##@param symbols the constellation to draw the training symbols from
+##@param shape the shape of the returned array, (number of training symbols, number of carriers)
+##@return a numpy array of complex constellation points
+def training_symbols(symbols, shape):
+    bits_per_symbol = int(np.round(np.log2(len(symbols))))
+    indices = list(itertools.islice(prbs(reg=1, poly=0x1100b, bits=bits_per_symbol), int(np.prod(shape))))
+    return np.array(symbols)[indices].reshape(shape)
@@ -1,43 +1,180 @@
 import numpy as np
+import itertools
+import functools
+import threading
 from math import floor,ceil
 
 from fec.reedsolo import *
+from fec.rs_numpy import rs_decode_blocks, rs_encode_into, rs_generator_rows
 
 from kivy.logger import Logger as log
 
+RS_CODEC_CACHE_SIZE = 64 #the number of Reed Solomon codecs kept by get_codec, IL2P uses 43 different numbers of error correction symbols
+
+##class used to Reed Solomon encode and decode blocks with a fixed number of error correction symbols, get one with get_codec()
+##unlike RSCodec, creating one does not rebuild the Galois field tables that every codec shares
+class BlockCodec:
+    
+    ##@param nsym the number of error correction symbols appended to each block
+    def __init__(self, nsym):
+        self.nsym = nsym
+        self.gen = rs_generator_poly(nsym) #the generator polynomial, computed once
+        self.rows = rs_generator_rows(self.gen) #the generator polynomial multiplied by every byte value
+    
+    ##@brief append the error correction symbols to a block of at most 255-nsym bytes
+    ##@param msg a bytes-like object holding the block
+    ##@param out a writable bytes-like object of len(msg)+nsym bytes to write the block and its error correction symbols to, the block may already be in place at its start, None allocates a new bytearray
+    ##@return out, or a new bytearray holding the block followed by its error correction symbols
+    def encode(self, msg, out=None):
+        if (out is None):
+            out = bytearray(len(msg) + self.nsym)
+        return rs_encode_into(msg, self.rows, self.nsym, out)
+    
+    ##@brief encode a batch of blocks of the same length, each straight into its row of the result
+    ##@param msgs 2d numpy array of bytes, one block per row
+    ##@return 2d numpy array of bytes, one block followed by its error correction symbols per row, the same as fec.rs_numpy.rs_encode_blocks
+    def encode_blocks(self, msgs):
+        msgs = np.ascontiguousarray(msgs, dtype=np.uint8)
+        toReturn = np.zeros((msgs.shape[0], msgs.shape[1] + self.nsym), dtype=np.uint8)
+        for (msg, row) in zip(msgs, toReturn):
+            rs_encode_into(msg, self.rows, self.nsym, row)
+        return toReturn
+    
+    ##@brief decode a batch of blocks of the same length, see fec.rs_numpy.rs_decode_blocks
+    def decode_blocks(self, blocks):
+        return rs_decode_blocks(blocks, self.nsym)
+
+_codec_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=RS_CODEC_CACHE_SIZE)
+def _make_codec(nsym):
+    return BlockCodec(nsym)
+
+##@brief get the process wide BlockCodec for a number of error correction symbols, it is created the first time it is asked for
+##@param nsym the number of error correction symbols
+##@return a BlockCodec shared by every caller asking for the same nsym
+def get_codec(nsym):
+    with _codec_lock: #only one thread builds a codec that is not cached yet
+        return _make_codec(nsym)
+
+## @brief work out where each Reed Solomon block of a frame payload lies
+## @param len_exp the length (in bytes) of the payload before it is encoded
+## @return a tuple, the first element is the number of error correction symbols appended to each block, the second a list with a tuple for each block holding its name in the decode report, the index of its first byte in the encoded payload, its length including error correction symbols, the index of its first byte in the payload and its length
+def payload_block_layout(len_exp):
+    if (len_exp == 0):
+        return (0, [])
+    block_cnt = ceil(len_exp/205) #the number of blocks (up to 255 bytes each) to in msg
+    small_block_len = floor(len_exp/block_cnt) #the length (in bytes) of a small block
+    large_block_len = small_block_len + 1 #the length (in bytes) of a large block
+    large_block_cnt = len_exp - (block_cnt*small_block_len) #the number of large blocks used
+    small_block_cnt = block_cnt - large_block_cnt #the number of small blocks used
+    
+    ecc_sym_cnt = floor(small_block_len/5) + 10 #the number of error correction symbols appended to each block
+    
+    blocks = []
+    msg_ind = 0 #the index of msg the next block starts at
+    toReturn_ind = 0 #the index of the decoded payload the next block is stored at
+    
+    #the large blocks come first in msg
+    for i in range(0, large_block_cnt):
+        blocks.append(('L'+str(i), msg_ind, large_block_len+ecc_sym_cnt, toReturn_ind, large_block_len))
+        msg_ind += large_block_len+ecc_sym_cnt
+        toReturn_ind += large_block_len
+        
+    #followed by the small blocks
+    for i in range(0, small_block_cnt):
+        blocks.append(('S'+str(i), msg_ind, small_block_len+ecc_sym_cnt, toReturn_ind, small_block_len))
+        msg_ind += small_block_len + ecc_sym_cnt
+        toReturn_ind += small_block_len
+    
+    return (ecc_sym_cnt, blocks)
+
+## @brief the length of a frame payload after it is Reed Solomon encoded
+## @param len_exp the length (in bytes) of the payload before it is encoded
+## @return the length (in bytes) of the encoded payload
+def payload_encoded_length(len_exp):
+    return sum(block[2] for block in payload_block_layout(len_exp)[1])
+
+## @brief view a bytes-like object as a 1d numpy array of bytes without copying it
+## @param data a bytes-like object or a numpy array, numpy arrays holding another type are converted to bytes
+## @return a 1d numpy array of bytes
+def as_byte_array(data):
+    if isinstance(data, np.ndarray):
+        return np.ascontiguousarray(data, dtype=np.uint8).reshape(-1)
+    return np.frombuffer(data, dtype=np.uint8)
+
+## @brief make the numpy array an encoder or decoder writes its result to
+## @param n the number of bytes of the result
+## @param out a writable bytes-like object of at least n bytes, None allocates a new buffer
+## @return a 1d numpy array of n bytes viewing out
+def output_array(n, out):
+    return np.frombuffer(bytearray(n) if (out is None) else out, dtype=np.uint8, count=n)
+
+## @brief group the payload blocks of many frames by their length and number of error correction symbols, so each group can be encoded or decoded as a batch
+## @param len_exps the length (in bytes) of each payload before it is encoded
+## @return a tuple, the first element is a list holding the block layout of each payload, the second a dictionary mapping (encoded block length, number of error correction symbols) to a list of (payload index, block index) tuples
+def group_payload_blocks(len_exps):
+    layouts = [payload_block_layout(len_exp)[1] for len_exp in len_exps]
+    groups = {}
+    for (f, blocks) in enumerate(layouts):
+        for (i, (name, msg_ind, msg_len, toReturn_ind, block_len)) in enumerate(blocks):
+            groups.setdefault((msg_len, msg_len-block_len), []).append((f, i))
+    return (layouts, groups)
+
 ##class used to handle Reed Solomon encoding/decoding of IL2P frame headers
 class FrameHeaderCodec:
     
     def __init__(self):
-        self.rsc = RSCodec(32) #the Reed Solomon encoder/decoder object
+        self.rsc = get_codec(32) #the Reed Solomon encoder/decoder object
 
     ##@brief Perform Reed Solomon encoding to form a 64 byte IL2P header
-    ##@param A numpy 1d array of bytes holding the header_msg the 32 byte header data message after interleaving, but before RS encoding
-    ##@return A numpy 1d array of bytes holding the 64 byte IL2P header with ecc symbols appended
-    def encode(self,header_msg):
-        assert (header_msg.size == 32)
+    ##@param A numpy 1d array of bytes, or any other bytes-like object, holding the header_msg the 32 byte header data message after interleaving, but before RS encoding
+    ##@param out a writable bytes-like object of 64 bytes to write the encoded header to, None allocates a new array
+    ##@return A numpy 1d array of bytes holding the 64 byte IL2P header with ecc symbols appended, a view of out when it is given
+    def encode(self,header_msg,out=None):
+        assert (len(header_msg) == 32)
     
-        toReturn = np.frombuffer(self.rsc.encode(header_msg), dtype=np.uint8)
+        toReturn = output_array(64, out)
+        self.rsc.encode(as_byte_array(header_msg), toReturn)
         return toReturn
     
+    ##@brief Reed Solomon encode the headers of many frames at once
+    ##@param header_msgs A numpy 2d array of bytes holding a 32 byte header data message after interleaving in each row
+    ##@return A numpy 2d array of bytes holding a 64 byte IL2P header with ecc symbols appended in each row
+    def encode_batch(self,header_msgs):
+        assert (header_msgs.shape[1] == 32)
+        return self.rsc.encode_blocks(header_msgs)
+    
+    ##@brief Reed Solomon decode the headers of many frames at once, nothing is logged
+    ##@param headers A numpy 2d array of bytes holding a 64 byte received header in each row
+    ##@return A list with a tuple for each header, the first element is a numpy 1d array of bytes holding the 32 byte IL2P header (None when decoding failed), the second the number of bytes corrected (-1 when decoding failed)
+    def decode_batch(self,headers):
+        assert (headers.shape[1] == 64)
+        return self.rsc.decode_blocks(headers)
+    
     ##@brief Perform Reed Solomon decoding to extract a 32 byte IL2P header
     ##@param header A numpy 1d array of bytes holding the 64 byte received header
+    ##@param return_corrections when True the number of bytes the decoder corrected is returned as a third element, -1 when decoding failed
     ##@return A tuple. The first element is true when decoding was successful. The second element is a numpy 1d array of bytes holding the 32 byte IL2P header
-    def decode(self,header,verbose=True):
+    def decode(self,header,verbose=True,return_corrections=False):
         assert (header.size == 64)
         
         toReturn = np.zeros((32), dtype=np.uint8)
         decodeSuccess = True
+        corrections = -1
         
-        try:
-            decoded, _ , error_ind = self.rsc.decode(header)
-            toReturn = np.frombuffer(decoded, dtype=np.uint8)
+        (decoded, corrections) = self.rsc.decode_blocks(header[None,:])[0]
+        if (decoded is not None):
+            toReturn = decoded
+            if (verbose):
+                log.info('\thdr, %d err', corrections)
+        else:
             if (verbose):
-                log.info('\thdr, %d err', len(error_ind))
-        except ReedSolomonError:
-            log.warning('\tWarning: Header decoding failed!')
+                log.warning('\tWarning: Header decoding failed!')
             decodeSuccess = False
-            
+        
+        if (return_corrections):
+            return (decodeSuccess, toReturn, corrections)
         return (decodeSuccess, toReturn)
 
 ##class used to handle Reed Solmon encoding of IL2P frame payloads
@@ -45,119 +182,175 @@ class FramePayloadEncoder:
 
     def __init__(self):
         self.ecc_sym_cnt = 50
-        self.rsc = RSCodec(self.ecc_sym_cnt)  # the Reed Solomon encoder/decoder object
+        self.rsc = get_codec(self.ecc_sym_cnt)  # the Reed Solomon encoder/decoder object
     
     ##append RS characters to a numpy byte array, msg
     ##return a matrix of bytes, where each row is chunk with its RS characters appended
     
     ##@brief Perform Solomon Reed encoding to form an IL2P frame payload
-    ##@param msg A numpy 1-dimensional array of bytes to be encoded
-    ##@return A numpy 1-dimensional array of bytes with error correction symbols appended
-    def encode(self,msg):
-        if (len(msg) == 0):
-            return np.empty((0,0), dtype=np.uint8).flatten('C')
-        
-        block_cnt = ceil(len(msg)/205) #the number of blocks (up to 255 bytes each) to break msg into
-        small_block_len = floor(len(msg)/block_cnt) #the length (in bytes) of a small block
-        large_block_len = small_block_len + 1 #the length (in bytes) of a large block
-        large_block_cnt = len(msg) - (block_cnt*small_block_len) #the number of large blocks that will be used
-        small_block_cnt = block_cnt - large_block_cnt #the number of small blocks that will be used
-        
-        ecc_sym_cnt = floor(small_block_len/5) + 10 #the number of error correction symbols that will be appended to each block
+    ##@param msg A numpy 1-dimensional array of bytes, or any other bytes-like object, to be encoded
+    ##@param out a writable bytes-like object of payload_encoded_length(len(msg)) bytes to write the encoded payload to, None allocates a new array
+    ##@return A numpy 1-dimensional array of bytes with error correction symbols appended, a view of out when it is given
+    def encode(self,msg,out=None):
+        msg = as_byte_array(msg)
+        (ecc_sym_cnt, blocks) = payload_block_layout(len(msg))
         
-        if (ecc_sym_cnt != self.ecc_sym_cnt):
+        if (len(blocks) > 0) and (ecc_sym_cnt != self.ecc_sym_cnt):
             self.ecc_sym_cnt = ecc_sym_cnt
-            self.rsc = RSCodec(ecc_sym_cnt)
-        
-        large_blocks = np.zeros((large_block_cnt, large_block_len+ecc_sym_cnt), dtype=np.uint8) #matrix of bytes where each row is large block of data
-        small_blocks = np.zeros((small_block_cnt, small_block_len+ecc_sym_cnt), dtype=np.uint8) #matrix of bytes where each row is a small block of data
-        
-        msg_ind = 0 #the current indice of msg we are encoding
-        
-        #encode the large blocks from msg
-        for i in range(0,large_block_cnt):
-            large_blocks[i,:] = np.frombuffer(self.rsc.encode(msg[msg_ind:msg_ind+large_block_len]), dtype=np.uint8)
-            msg_ind += large_block_len
+            self.rsc = get_codec(ecc_sym_cnt)
         
-        #encode the small blocks from msg
-        for i in range(0,small_block_cnt):
-            sub_arr = msg[msg_ind:msg_ind+small_block_len].tobytes()
-            small_blocks[i,:] = np.frombuffer(self.rsc.encode(sub_arr), dtype=np.uint8)
-            msg_ind += small_block_len
+        toReturn = output_array(sum(block[2] for block in blocks), out)
         
-        toReturn = np.concatenate( (large_blocks.flatten('C'), small_blocks.flatten('C')) )
+        #the large blocks come first, each block is encoded straight into its place in toReturn
+        for (name, toReturn_ind, block_len_enc, msg_ind, block_len) in blocks:
+            self.rsc.encode(msg[msg_ind:msg_ind+block_len], toReturn[toReturn_ind:toReturn_ind+block_len_enc])
+        return toReturn
+    
+    ##@brief Perform Solomon Reed encoding on the payloads of many frames at once, the blocks of every payload with the same length are encoded together
+    ##@param msgs A list of numpy 1-dimensional arrays of bytes to be encoded
+    ##@return A list holding a numpy 1-dimensional array of bytes with error correction symbols appended for each message
+    def encode_batch(self,msgs):
+        (layouts, groups) = group_payload_blocks([len(msg) for msg in msgs])
+        toReturn = [np.zeros((sum(block[2] for block in blocks)), dtype=np.uint8) for blocks in layouts]
+        for ((msg_len, ecc_sym_cnt), members) in groups.items():
+            batch = np.stack([msgs[f][layouts[f][i][3]:layouts[f][i][3]+msg_len-ecc_sym_cnt] for (f, i) in members])
+            for ((f, i), encoded) in zip(members, get_codec(ecc_sym_cnt).encode_blocks(batch)):
+                toReturn[f][layouts[f][i][1]:layouts[f][i][1]+msg_len] = encoded
         return toReturn
         
 ##class used to handle Reed Solomon encoding of IL2P frame payloads 
 class FramePayloadDecoder:
 
     def __init__(self):
-        self.ecc_sym_cnt = 50 #the number of error correction symbols to be appended to each block
-        self.rsc = RSCodec(self.ecc_sym_cnt)  # the Reed Solomon encoder/decoder object
+        self.ecc_sym_cnt = 50 #the number of error correction symbols appended to each block
+        self.rsc = get_codec(self.ecc_sym_cnt) #the Reed Solomon decoder object
+    
     
+    ## @brief work out where each Reed Solomon block of a frame payload lies and set the decoder up for their number of error correction symbols
+    ## @param len_exp The length (in bytes) that the frame is expected to have after it has been decoded. This information is included in the IL2P header
+    ## @return a list with a tuple for each block holding its name in the decode report, the index of its first byte in the received payload, its length including error correction symbols, the index of its first decoded byte and its decoded length
+    def block_layout(self,len_exp):
+        (ecc_sym_cnt, blocks) = payload_block_layout(len_exp)
+        if (len(blocks) > 0) and (ecc_sym_cnt != self.ecc_sym_cnt):
+            self.ecc_sym_cnt = ecc_sym_cnt
+            self.rsc = get_codec(ecc_sym_cnt)
+        return blocks
     
     ## @brief perform Solomon Reed decoding on an IL2P frame payload
     ## @param msg A numpy 1-dimensional array of bytes holding the frame to be decoded
     ## @param len_exp The length (in bytes) that the frame is expected to have after it has been decoded. This information is included in the IL2P header
+    ## @param alternates a list of other demodulations of the same frame payload (for example sampled at other symbol timings), a block that cannot be decoded from msg is decoded from the first alternate that can be
+    ## @param partial a PartialPayload holding the blocks already decoded while the frame was being received, they are not decoded again
+    ## @param out a writable bytes-like object of len_exp bytes to write the decoded payload to, None allocates a new array
     ## @return Returns a tuple, the first element is a boolean indicating if decoding was completely successful, the second element contains a numpy 
-    ## 1-dimensional array of bytes holding the decoding frame data if errors can be corrected
+    ## 1-dimensional array of bytes holding the decoding frame data if errors can be corrected, a view of out when it is given
     ## returns an error if Solomon Reed decoding is not successful
-    def decode(self,msg,len_exp,verbose=True):
+    def decode(self,msg,len_exp,verbose=True,alternates=(),partial=None,out=None):
+        toReturn = output_array(len_exp, out)
         if (len_exp == 0):
-            return (True,np.array([],dtype=np.uint8))
-        block_cnt = ceil(len_exp/205) #the number of blocks (up to 255 bytes each) to in msg
-        small_block_len = floor(len_exp/block_cnt) #the length (in bytes) of a small block
-        large_block_len = small_block_len + 1 #the length (in bytes) of a large block
-        large_block_cnt = len_exp - (block_cnt*small_block_len) #the number of large blocks used
-        small_block_cnt = block_cnt - large_block_cnt #the number of small blocks used
-        
-        ecc_sym_cnt = floor(small_block_len/5) + 10 #the number of error correction symbols appended to each block
-        
-        if (ecc_sym_cnt != self.ecc_sym_cnt):
-            self.ecc_sym_cnt = ecc_sym_cnt
-            self.rsc = RSCodec(ecc_sym_cnt)
-            
-        toReturn = np.zeros((len_exp),dtype=np.uint8)
+            return (True,toReturn)
+        if (out is not None):
+            toReturn.fill(0) #blocks that cannot be decoded are left as zeros
         decodeSuccess = True
-        msg_ind = 0 #the current index of msg that is being decoded
-        toReturn_ind = 0 #the current index of toReturn that has data being stored to it
         
-        error_logging_tuples = [] #make an array of tuples that stores the number of errors corrected for each block that is decoded, -1 errors indicates the frame could not be decoded
+        blocks = self.block_layout(len_exp)
+        error_cnts = [None]*len(blocks) #the number of errors corrected in each block, -1 errors indicates the block could not be decoded
         
-        #decode the large blocks in msg
-        for i in range(0, large_block_cnt):
-            try:
-                decoded, _ , error_ind = self.rsc.decode(msg[msg_ind:msg_ind+large_block_len+ecc_sym_cnt])
-                temp = np.frombuffer(decoded, dtype=np.uint8) #decode the large block
-                toReturn[toReturn_ind:toReturn_ind+large_block_len] = temp
-                error_logging_tuples.append(('L'+str(i), len(error_ind)))
-            except ReedSolomonError:
-                error_logging_tuples.append('L'+str(i), -1)
-                decodeSuccess = False
-                
-            msg_ind += large_block_len+ecc_sym_cnt
-            toReturn_ind += large_block_len
-            
-        #decode the small blocks in msg
-        for i in range(0, small_block_cnt):
-            try:
-                decoded, _ , error_ind = self.rsc.decode(msg[msg_ind:msg_ind+small_block_len+ecc_sym_cnt])
-                temp = np.frombuffer(decoded, dtype=np.uint8) #decode the large block
-                toReturn[toReturn_ind:toReturn_ind+small_block_len] = temp
-                error_logging_tuples.append(('S'+str(i), len(error_ind)))
-            except ReedSolomonError:
-                error_logging_tuples.append(('S'+str(i), -1))
-                
-                decodeSuccess = False
-
-            msg_ind += small_block_len + ecc_sym_cnt
-            toReturn_ind += small_block_len
+        #the blocks that were corrected while the frame was being received are not decoded again
+        if (partial is not None):
+            for (i, (name, msg_ind, msg_len, toReturn_ind, block_len)) in enumerate(blocks):
+                if (partial.errors[i] is not None) and (partial.errors[i] >= 0):
+                    toReturn[toReturn_ind:toReturn_ind+block_len] = partial.decoded[toReturn_ind:toReturn_ind+block_len]
+                    error_cnts[i] = partial.errors[i]
+        
+        #decode the remaining blocks of each length as a batch, the syndromes of the whole batch are computed at once
+        for msg_len in set(block[2] for block in blocks):
+            pending = [i for (i, block) in enumerate(blocks) if (block[2] == msg_len) and (error_cnts[i] is None)]
+            if (len(pending) == 0):
+                continue
+            batch = np.stack([msg[blocks[i][1]:blocks[i][1]+msg_len] for i in pending])
+            for (i, (decoded, error_cnt)) in zip(pending, self.rsc.decode_blocks(batch)):
+                if (decoded is None) and (len(alternates) > 0): #fall back on the other demodulations of the block
+                    try:
+                        (decoded, error_cnt) = self.decode_block(msg, alternates, blocks[i][1], msg_len, skip_msg=True)
+                    except ReedSolomonError:
+                        pass
+                if (decoded is not None):
+                    toReturn[blocks[i][3]:blocks[i][3]+blocks[i][4]] = decoded
+                else:
+                    decodeSuccess = False
+                error_cnts[i] = error_cnt
         
+        error_logging_tuples = [(block[0], error_cnt) for (block, error_cnt) in zip(blocks, error_cnts)] #make an array of tuples that stores the number of errors corrected for each block that is decoded, -1 errors indicates the frame could not be decoded
         #if (verbose):
         log.info('\tdecode report: %s',error_logging_tuples)
             
         return (decodeSuccess, toReturn)
+    
+    ## @brief perform Solomon Reed decoding on the payloads of many frames at once, the blocks of every payload with the same length are decoded together and nothing is logged
+    ## @param msgs A list of numpy 1-dimensional arrays of bytes holding the received frame payloads, bytes missing from the end of a payload count as errors
+    ## @param len_exps The length (in bytes) each payload is expected to have after it has been decoded
+    ## @return A list with a tuple for each payload, the first element is a boolean indicating if decoding was completely successful, the second a numpy 1-dimensional array of bytes holding the decoded payload
+    def decode_batch(self,msgs,len_exps):
+        (layouts, groups) = group_payload_blocks(len_exps)
+        toReturn = [[True, np.zeros((len_exp), dtype=np.uint8)] for len_exp in len_exps]
+        for ((msg_len, ecc_sym_cnt), members) in groups.items():
+            batch = np.zeros((len(members), msg_len), dtype=np.uint8)
+            for (row, (f, i)) in enumerate(members):
+                block = msgs[f][layouts[f][i][1]:layouts[f][i][1]+msg_len]
+                batch[row,0:len(block)] = block
+            for ((f, i), (decoded, error_cnt)) in zip(members, get_codec(ecc_sym_cnt).decode_blocks(batch)):
+                if (decoded is not None):
+                    toReturn[f][1][layouts[f][i][3]:layouts[f][i][3]+msg_len-ecc_sym_cnt] = decoded
+                else:
+                    toReturn[f][0] = False
+        return [tuple(result) for result in toReturn]
+    
+    ## @brief decode one Reed Solomon block, trying each alternate demodulation of the block in turn if msg cannot be decoded
+    ## @param msg the numpy 1d array of bytes holding the frame payload
+    ## @param alternates a list of numpy 1d arrays holding other demodulations of msg
+    ## @param start the index of the first byte of the block
+    ## @param length the length of the block including its error correction symbols
+    ## @param skip_msg when True only the alternates are tried, because msg is already known to fail
+    ## @param codec the BlockCodec for the number of error correction symbols in the block, None uses the codec of the payload block_layout was last called for
+    ## @throws ReedSolomonError when none of the candidates can be decoded
+    ## @return a tuple, the first element is a numpy 1d array holding the decoded block, the second is the number of bytes corrected
+    def decode_block(self, msg, alternates, start, length, skip_msg=False, codec=None):
+        codec = self.rsc if (codec is None) else codec
+        candidates = [candidate[start:start+length] for candidate in (alternates if skip_msg else itertools.chain([msg], alternates))]
+        candidates = [candidate for candidate in candidates if (len(candidate) == length)]
+        if (len(candidates) > 0):
+            for (decoded, error_cnt) in codec.decode_blocks(np.stack(candidates)):
+                if (decoded is not None):
+                    return (decoded, error_cnt)
+        raise ReedSolomonError('Could not correct message')
+            
             
+##class holding the blocks of a frame payload that were Reed Solomon decoded while the rest of the frame was still being received
+class PartialPayload:
+    
+    ## @param len_exp The length (in bytes) that the frame is expected to have after it has been decoded
+    def __init__(self, len_exp):
+        (ecc_sym_cnt, self.blocks) = payload_block_layout(len_exp)
+        self.codec = get_codec(ecc_sym_cnt) if (len(self.blocks) > 0) else None #kept so decoding other payloads in between cannot change it
+        self.decoded = np.zeros((len_exp), dtype=np.uint8)
+        self.errors = [None]*len(self.blocks) #the number of bytes corrected in each block, -1 if it could not be decoded, None if it has not been received yet
+        self.next_block = 0 #the index of the first block that has not been received yet
+    
+    ## @brief decode every block whose last byte has been received since the last call
+    ## @param decoder the FramePayloadDecoder used to decode the blocks
+    ## @param msg A numpy 1-dimensional array holding the payload bytes received so far
+    ## @param received the number of payload bytes received so far
+    def update(self, decoder, msg, received):
+        while (self.next_block < len(self.blocks)):
+            (name, msg_ind, msg_len, decoded_ind, block_len) = self.blocks[self.next_block]
+            if (msg_ind + msg_len > received): #the block has not been completely received
+                return
+            try:
+                (self.decoded[decoded_ind:decoded_ind+block_len], self.errors[self.next_block]) = decoder.decode_block(msg, (), msg_ind, msg_len, codec=self.codec)
+            except ReedSolomonError: #left to be retried against the alternate demodulations once the frame ends
+                self.errors[self.next_block] = -1
+            self.next_block += 1
             
 def inject_symbol_errors(msg,error_threshhold):
     for i in range(0, msg.size):
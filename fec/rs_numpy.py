@@ -0,0 +1,117 @@
+import numpy as np
+
+from fec.reedsolo import init_tables, rs_find_error_locator, rs_correct_errata, ReedSolomonError
+
+#numpy copies of the GF(2^8) log/anti-log tables used by fec.reedsolo, with the same primitive polynomial and generator as RSCodec's defaults
+(_gf_log, _gf_exp, _field_charac) = init_tables(prim=0x11d, generator=2, c_exp=8)
+GF_LOG = np.array(_gf_log, dtype=np.int32)
+GF_EXP = np.array(_gf_exp, dtype=np.uint8)
+
+##@brief multiply two arrays of GF(2^8) elements elementwise using table lookups
+##@param a numpy array of uint8
+##@param b numpy array of uint8, broadcast against a
+##@return numpy array of uint8 holding the products
+def gf_mul_arrays(a, b):
+    return np.where((a != 0) & (b != 0), GF_EXP[GF_LOG[a] + GF_LOG[b]], 0).astype(np.uint8)
+
+##@brief precompute the product of every GF(2^8) element with a generator polynomial, for rs_encode_into
+##@param gen the generator polynomial, as returned by fec.reedsolo.rs_generator_poly
+##@return a list indexed by the element, each entry holds the products with every coefficient of gen but the first packed into an integer, the first in the most significant byte
+def rs_generator_rows(gen):
+    rows = gf_mul_arrays(np.arange(256, dtype=np.uint8)[:,None], np.array(gen[1:], dtype=np.uint8)[None,:])
+    return [int.from_bytes(row.tobytes(), 'big') for row in rows]
+
+##@brief Reed Solomon encode one message straight into a caller's buffer, giving the same codeword as fec.reedsolo.rs_encode_msg
+##  the remainder of the polynomial division is kept in a single integer, each message byte shifts it and adds a row of rs_generator_rows
+##@param msg a bytes-like object holding the message
+##@param rows the rows returned by rs_generator_rows for the generator polynomial
+##@param nsym the number of error correction symbols
+##@param out a writable bytes-like object of len(msg)+nsym bytes the codeword is written to, the message may already be in place at its start
+##@return out
+def rs_encode_into(msg, rows, nsym, out):
+    msg = memoryview(msg).cast('B')
+    if (len(msg) + nsym > _field_charac):
+        raise ValueError("Message is too long (%i when max is %i)" % (len(msg) + nsym, _field_charac))
+    top = 8*(nsym-1) #the shift bringing the next remainder byte down to the lowest byte
+    mask = (1 << 8*nsym) - 1
+    remainder = 0
+    for b in msg:
+        remainder = ((remainder << 8) & mask) ^ rows[b ^ (remainder >> top)]
+    codeword = memoryview(out).cast('B')
+    codeword[0:len(msg)] = msg
+    codeword[len(msg):len(msg)+nsym] = remainder.to_bytes(nsym, 'big')
+    return out
+
+##@brief evaluate a batch of polynomials over GF(2^8) at powers of the generator using table lookups
+##@param polys 2d numpy array of uint8, one polynomial per row with the coefficient of the highest degree first
+##@param powers 1d numpy array of the exponents of the generator to evaluate the polynomials at
+##@return 2d numpy array of uint8 holding the value of each polynomial (rows) at each power (columns)
+def gf_poly_eval_powers(polys, powers):
+    degrees = np.arange(polys.shape[1]-1, -1, -1) #the degree of each coefficient
+    exponents = (GF_LOG[polys][:,None,:] + np.outer(powers, degrees)[None,:,:]) % _field_charac
+    terms = np.where(polys[:,None,:] != 0, GF_EXP[exponents], 0).astype(np.uint8)
+    return np.bitwise_xor.reduce(terms, axis=2)
+
+##@brief compute the syndromes of a batch of Reed Solomon codewords of the same length at once
+##@param blocks 2d numpy array of uint8, one codeword per row
+##@param nsym the number of error correction symbols in each codeword
+##@return 2d numpy array of uint8 holding the nsym syndromes of each codeword, a row of zeros means the codeword has no errors
+def rs_calc_syndromes(blocks, nsym):
+    return gf_poly_eval_powers(blocks, np.arange(nsym))
+
+##@brief Reed Solomon encode a batch of messages of the same length at once, giving the same results as fec.reedsolo.rs_encode_msg
+##  the polynomial division is done for every message at once, one message byte at a time
+##@param msgs 2d numpy array of uint8, one message per row
+##@param gen the generator polynomial, as returned by fec.reedsolo.rs_generator_poly
+##@return 2d numpy array of uint8, one codeword per row holding the message followed by its error correction symbols
+def rs_encode_blocks(msgs, gen):
+    msgs = np.asarray(msgs, dtype=np.uint8)
+    nsym = len(gen) - 1
+    if (msgs.shape[1] + nsym > _field_charac):
+        raise ValueError("Message is too long (%i when max is %i)" % (msgs.shape[1] + nsym, _field_charac))
+    gen = np.array(gen[1:], dtype=np.uint8)
+    remainder = np.zeros((msgs.shape[0], nsym+1), dtype=np.uint8) #the last column stays zero, it is shifted into the remainder
+    for i in range(0, msgs.shape[1]):
+        coef = msgs[:,i] ^ remainder[:,0]
+        remainder[:,0:nsym] = remainder[:,1:] ^ gf_mul_arrays(coef[:,None], gen[None,:])
+    return np.concatenate( (msgs, remainder[:,0:nsym]), axis=1 )
+
+##@brief find the positions of the errors in a codeword from its error locator polynomial, evaluating the polynomial at every position at once (Chien search)
+##@param err_loc the reversed error locator polynomial, as passed to fec.reedsolo.rs_find_errors
+##@param nmess the length of the codeword
+##@throws ReedSolomonError when the number of roots found does not match the degree of the polynomial
+##@return a list of the indices of the errors in the codeword
+def rs_find_errors(err_loc, nmess):
+    values = gf_poly_eval_powers(np.array([err_loc], dtype=np.uint8), np.arange(nmess))[0]
+    err_pos = (nmess - 1 - np.flatnonzero(values == 0)).tolist()
+    if (len(err_pos) != len(err_loc) - 1):
+        raise ReedSolomonError("Too many (or few) errors found by Chien Search for the errata locator polynomial!")
+    return err_pos
+
+##@brief Reed Solomon decode a batch of codewords of the same length, giving the same results as fec.reedsolo.RSCodec.decode
+##  the syndromes of every codeword are computed at once and codewords without errors are passed through without being decoded
+##@param blocks 2d numpy array of uint8, one codeword per row
+##@param nsym the number of error correction symbols in each codeword
+##@return a list with a tuple per codeword, the first element is a numpy array holding the decoded message (None if it could not be corrected), the second is the number of bytes corrected (-1 if it could not be corrected)
+def rs_decode_blocks(blocks, nsym):
+    blocks = np.asarray(blocks, dtype=np.uint8)
+    nmess = blocks.shape[1]
+    if (nmess > _field_charac):
+        raise ValueError("Message is too long (%i when max is %i)" % (nmess, _field_charac))
+    synds = rs_calc_syndromes(blocks, nsym)
+    results = []
+    for (block, synd) in zip(blocks, synds):
+        if not synd.any(): #no errors
+            results.append((block[:-nsym].copy(), 0))
+            continue
+        try:
+            synd = [0] + synd.tolist()
+            err_loc = rs_find_error_locator(synd[1:], nsym)
+            err_pos = rs_find_errors(err_loc[::-1], nmess)
+            corrected = np.frombuffer(rs_correct_errata(block.tobytes(), synd, err_pos), dtype=np.uint8)
+            if rs_calc_syndromes(corrected[None,:], nsym).any():
+                raise ReedSolomonError("Could not correct message")
+            results.append((corrected[:-nsym], len(err_pos)))
+        except ReedSolomonError:
+            results.append((None, -1))
+    return results
@@ -0,0 +1,72 @@
+import time
+import numpy as np
+
+from IL2P import IL2P_Frame_Header
+
+##@brief the field by field header packing IL2P_Frame_Header.pack_header used before the struct layout, kept here as the baseline
+def pack_header_per_field(header):
+    toReturn = np.zeros((32),dtype=np.uint8)
+    toReturn[0:6] = np.frombuffer(header.dst_callsign.encode()[0:6], dtype=np.uint8)
+    toReturn[6:12] = np.frombuffer(header.link_src_callsign.encode()[0:6], dtype=np.uint8)
+    toReturn[12:18] = np.frombuffer(header.src_callsign.encode()[0:6], dtype=np.uint8)
+    toReturn[18] |= np.uint8(0x80) if (header.request_double_ack) else np.uint8(0x00)
+    toReturn[18] |= np.uint8(0x40) if (header.request_ack) else np.uint8(0x00)
+    toReturn[18] |= np.uint8(0x20) if (header.acks[3]) else np.uint8(0x00)
+    toReturn[18] |= np.uint8(0x10) if (header.acks[2]) else np.uint8(0x00)
+    toReturn[18] |= np.uint8(0x08) if (header.acks[1]) else np.uint8(0x00)
+    toReturn[18] |= np.uint8(0x04) if (header.acks[0]) else np.uint8(0x00)
+    toReturn[18] |= np.uint8(0x02) if (header.is_waypoint) else np.uint8(0x00)
+    toReturn[19] |= np.uint8(0x40) if (header.high_rate) else np.uint8(0x00)
+    toReturn[19] |= np.uint8(0x20) if (header.hops >= 2) else np.uint8(0x00)
+    toReturn[19] |= np.uint8(0x10) if ((header.hops >= 1) and (header.hops != 2)) else np.uint8(0x00)
+    toReturn[19] |= np.uint8(0x08) if (header.is_beacon) else np.uint8(0x00)
+    toReturn[19] |= np.uint8(0x04) if (header.is_text_msg) else np.uint8(0x00)
+    toReturn[19] |= np.uint8(0x02) if (header.hops_remaining >= 2) else np.uint8(0x00)
+    toReturn[19] |= np.uint8(0x01) if ((header.hops_remaining >= 1) and (header.hops_remaining != 2)) else np.uint8(0x00)
+    for (i, word) in enumerate([header.payload_size, header.my_seq] + list(header.data[0:4])):
+        toReturn[20+2*i] = np.uint8(np.uint16(word) >> 8)
+        toReturn[21+2*i] = np.uint8(np.uint16(word) & np.uint8(0xFF))
+    return toReturn
+
+##@brief the per byte header unpacking IL2P_Frame_Header.unpack_header used before the struct layout, with data[1] read from bytes 26 and 27
+def unpack_header_per_byte(header_bytes):
+    word = lambda i: np.uint16( (np.uint16(header_bytes[i])<<8) | np.uint16(header_bytes[i+1]) )
+    return IL2P_Frame_Header(src_callsign = header_bytes[12:18].tobytes().decode(), \
+                             link_src_callsign = header_bytes[6:12].tobytes().decode(), \
+                             dst_callsign = header_bytes[0:6].tobytes().decode(), \
+                             hops_remaining=header_bytes[19] & np.uint8(0x03), hops=(header_bytes[19] >>4) & np.uint8(0x03), \
+                             is_text_msg=(header_bytes[19] & np.uint(0x04)) != 0, is_beacon=(header_bytes[19] & np.uint(0x08)) != 0, \
+                             is_waypoint=(header_bytes[18] & np.uint(0x02)) != 0, \
+                             acks=[(header_bytes[18] & np.uint(mask)) != 0 for mask in (0x04, 0x08, 0x10, 0x20)], my_seq = word(22), \
+                             request_ack=(header_bytes[18] & np.uint(0x40)) != 0, request_double_ack=(header_bytes[18] & np.uint(0x80)) != 0, \
+                             payload_size=word(20), data=np.array([word(24), word(26), word(28), word(30)], dtype=np.uint16), \
+                             high_rate=(header_bytes[19] & np.uint(0x40)) != 0)
+
+headers = [IL2P_Frame_Header(src_callsign='SRC%03d' % (i,), dst_callsign='DST', hops=np.random.randint(0, 4), hops_remaining=np.random.randint(0, 4), \
+                             is_text_msg=np.random.randint(0, 2) == 1, is_beacon=np.random.randint(0, 2) == 1, is_waypoint=np.random.randint(0, 2) == 1, \
+                             acks=[np.random.randint(0, 2) == 1 for j in range(0, 4)], my_seq=np.random.randint(0, 65536), \
+                             request_ack=np.random.randint(0, 2) == 1, request_double_ack=np.random.randint(0, 2) == 1, high_rate=np.random.randint(0, 2) == 1, \
+                             payload_size=np.random.randint(0, 1024), data=np.random.randint(0, 65536, size=4).astype(np.uint16)) for i in range(0, 1000)]
+
+#the struct layout must put every field on the wire exactly where the field by field packing did, and read them back from there
+for header in headers:
+    header_bytes = header.pack_header()
+    if not np.array_equal(header_bytes, pack_header_per_field(header)):
+        raise ValueError('struct packed header does not match the field by field packing')
+    if not (np.array_equal(IL2P_Frame_Header.unpack_header(header_bytes).pack_header(), header_bytes) and header.equals(IL2P_Frame_Header.unpack_header(header_bytes))):
+        raise ValueError('header does not match after packing/unpacking')
+    if not IL2P_Frame_Header.unpack_header(header_bytes).equals(unpack_header_per_byte(header_bytes)):
+        raise ValueError('struct unpacked header does not match the per byte unpacking')
+
+##@return the mean number of seconds f takes per item
+def timed(f, items):
+    start = time.time()
+    for item in items:
+        f(item)
+    return (time.time() - start) / len(items)
+
+header_bytes = [header.pack_header() for header in headers]
+print('pack per field:   %6.1f us' % (timed(pack_header_per_field, headers)*1e6,))
+print('pack struct:      %6.1f us' % (timed(IL2P_Frame_Header.pack_header, headers)*1e6,))
+print('unpack per byte:  %6.1f us' % (timed(unpack_header_per_byte, header_bytes)*1e6,))
+print('unpack struct:    %6.1f us' % (timed(IL2P_Frame_Header.unpack_header, header_bytes)*1e6,))
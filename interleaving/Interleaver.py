@@ -1,91 +1,175 @@
 import numpy as np
 
-import interleaving.lfsr
+#the LFSR states are kept as 9 bit integers, bit i holding register i of the LFSR with polynomial x^9 + x^4 + 1
+SCRAMBLER_INITSTATE = 0b111100000 #registers 5 to 8 set, the initial state of interleaving.lfsr.LFSR(fpoly=[9,4], initstate=[0,0,0,0,0,1,1,1,1])
+DESCRAMBLER_INITSTATE = 0b000011111 #registers 0 to 4 set
+LEAD_IN_BITS = 5 #the number of bits pushed into the scrambler before its output bits are stored
+
+##@brief advance a batch of scrambler LFSR states by one input bit
+##@param state numpy array of 9 bit scrambler states
+##@param input_bit numpy array of input bits, broadcast against state
+##@return a tuple of numpy arrays, the first holds the next states, the second the output bits
+def scrambler_step(state, input_bit):
+    feedback = (state>>8)&1 #the last register
+    outbit = feedback ^ ((state>>4)&1)
+    next_state = ((state<<1)&0b111011110) | (outbit<<5) | (feedback^input_bit)
+    return (next_state, outbit)
+
+##@brief advance a batch of descrambler states by one input bit
+##@param state numpy array of 9 bit descrambler states
+##@param input_bit numpy array of input bits, broadcast against state
+##@return a tuple of numpy arrays, the first holds the next states, the second the output bits
+def descrambler_step(state, input_bit):
+    outbit = ((state>>8)&1) ^ input_bit
+    next_state = ((state<<1)&0b111011110) | ((((state>>4)&1)^input_bit)<<5) | input_bit
+    return (next_state, outbit)
+
+##@brief advance a batch of descrambler states by the input bit that descrambles to a given output bit
+##@param state numpy array of 9 bit descrambler states
+##@param output_bit numpy array of the descrambled bits, broadcast against state
+##@return a tuple of numpy arrays, the first holds the next states, the second the scrambled input bits
+def descrambler_advance_step(state, output_bit):
+    input_bit = output_bit ^ ((state>>8)&1)
+    return (descrambler_step(state, input_bit)[0], input_bit)
+
+##@brief build the table for pushing a whole byte through an LFSR at once
+##@param step scrambler_step or descrambler_step
+##@param nbits the number of bits of each input byte to push, starting from the most significant
+##@return a list indexed by (state<<8)|input_byte holding (next_state<<8)|output_bits, the output bits are in the order they were produced, the first in bit nbits-1
+def build_table(step, nbits=8):
+    state = np.arange(512)[:,None].repeat(256, axis=1)
+    input_byte = np.arange(256)[None,:]
+    output = np.zeros(state.shape, dtype=int)
+    for i in range(7, 7-nbits, -1):
+        (state, outbit) = step(state, (input_byte>>i)&1)
+        output = (output<<1) | outbit
+    return ((state<<8) | output).flatten().tolist()
+
+SCRAMBLER_TABLE = build_table(scrambler_step)
+SCRAMBLER_LEAD_OUT_TABLE = build_table(scrambler_step, LEAD_IN_BITS) #the zero bits pushed after the last byte to flush the lead in out of the scrambler
+DESCRAMBLER_TABLE = build_table(descrambler_step)
+DESCRAMBLER_ADVANCE_TABLE = build_table(descrambler_advance_step) #moves the descrambler past bytes whose descrambled value is already known
+SCRAMBLER_ARRAY = np.array(SCRAMBLER_TABLE) #numpy copies of the tables to look up the states of many frames at once
+SCRAMBLER_LEAD_OUT_ARRAY = np.array(SCRAMBLER_LEAD_OUT_TABLE)
+DESCRAMBLER_ARRAY = np.array(DESCRAMBLER_TABLE)
+
+##@brief view a bytes-like object as a flat memoryview of bytes, numpy arrays of bytes are viewed without being copied
+##@param byte_arr a bytes-like object or a 1d numpy array, numpy arrays holding another type are converted to bytes first
+##@return a memoryview of byte_arr with format 'B'
+def byte_view(byte_arr):
+    if isinstance(byte_arr, np.ndarray):
+        byte_arr = np.ascontiguousarray(byte_arr, dtype=np.uint8)
+    return memoryview(byte_arr).cast('B')
+
+##@brief push bytes through an LFSR a byte at a time
+##@param table the table made by build_table for the LFSR
+##@param state the state of the LFSR before the first byte
+##@param byte_arr a bytes-like object or 1d numpy array of the bytes to push, starting from the most significant bit of the first byte
+##@param output a writable bytes-like object the output bits are written to, it may be byte_arr itself
+##@return the state of the LFSR after the last byte
+def push_bytes(table, state, byte_arr, output):
+    for (i, b) in enumerate(byte_view(byte_arr)): #each byte is read before the output byte is written over it
+        t = table[(state<<8) | b]
+        output[i] = t & 0xff
+        state = t>>8
+    return state
+
+##@brief make the numpy array a scrambler writes its output bytes to
+##@param n the number of output bytes
+##@param out a writable bytes-like object of at least n bytes, None allocates a new buffer
+##@return a 1d numpy array of n bytes viewing out
+def output_array(n, out):
+    return np.frombuffer(bytearray(n) if (out is None) else out, dtype=np.uint8, count=n)
+
+##@brief push the bytes of many frames through an LFSR, a byte of every frame at a time
+##@param table the numpy copy of the table made by build_table for the LFSR
+##@param states numpy array of the state of the LFSR before the first byte of each frame
+##@param frames a list of 1d numpy arrays of bytes
+##@return a tuple, the first element is a numpy array of the states after the last byte of each frame, the second a 2d numpy array holding the output bytes of each frame in a row padded to the longest frame, the third a numpy array of the frame lengths
+def push_frames(table, states, frames):
+    lengths = np.array([len(frame) for frame in frames], dtype=int)
+    padded = np.zeros((len(frames), max(lengths, default=0)), dtype=int)
+    for (f, frame) in enumerate(frames):
+        padded[f,0:lengths[f]] = frame
+    padded &= 0xff
+    output = np.zeros(padded.shape, dtype=np.uint8)
+    states = np.array(states, dtype=int)
+    for j in range(0, padded.shape[1]):
+        t = table[(states<<8) | padded[:,j]]
+        output[:,j] = t & 0xff
+        states = np.where(j < lengths, t>>8, states) #frames that have ended keep their last state
+    return (states, output, lengths)
+
+##@brief interleave the bits of many frames at once, each frame is scrambled as by a freshly reset Interleaver
+##@param frames a list of 1d numpy arrays of bytes
+##@return a list of 1d numpy arrays of the scrambled bytes of each frame
+def scramble_frames(frames):
+    (states, output, lengths) = push_frames(SCRAMBLER_ARRAY, np.full(len(frames), SCRAMBLER_INITSTATE), frames)
+    lead_out = SCRAMBLER_LEAD_OUT_ARRAY[states<<8] & 0x1f
+    output = np.concatenate( (output, np.zeros((len(frames), 1), dtype=np.uint8)), axis=1 )
+    output[np.arange(len(frames)), lengths] = lead_out<<3
+    output = ((output[:,:-1]<<LEAD_IN_BITS) | (output[:,1:]>>(8-LEAD_IN_BITS))).astype(np.uint8)
+    return [output[f,0:lengths[f]] for f in range(0, len(frames))]
+
+##@brief de-interleave the bits of many frames at once
+##@param frames a list of 1d numpy arrays of bytes
+##@param states numpy array of the descrambler state to start each frame from, None starts each frame from a freshly reset Deinterleaver
+##@return a tuple, the first element is a list of 1d numpy arrays of the descrambled bytes of each frame, the second a numpy array of the descrambler states after each frame, to continue descrambling the frames from
+def descramble_frames(frames, states=None):
+    if (states is None):
+        states = np.full(len(frames), DESCRAMBLER_INITSTATE)
+    (states, output, lengths) = push_frames(DESCRAMBLER_ARRAY, states, frames)
+    return ([output[f,0:lengths[f]] for f in range(0, len(frames))], states)
 
 #this class will interleave bits fed to it as per the IL2P protocol
 class Interleaver:
 
     def __init__(self):
-    
-        self.LFSR = interleaving.lfsr.LFSR(fpoly=[9,4], initstate=[0,0,0,0,0,1,1,1,1], outbit_ind=5) #LFSR with polynomial x^9 + x^4 + 1
+        self.state = SCRAMBLER_INITSTATE
 
     def reset(self):
-        #self.__init__()
-        self.LFSR.reset()
-    
+        self.state = SCRAMBLER_INITSTATE
+
     ##@brief interleave the bits in an array of bytes using an LFSR
-    ##@param byte_arr, the array of bytes to be interleaved, stored as a 1d numpy array of bytes
-    def scramble_bits(self, byte_arr):
-        scrambled_bytes = np.zeros((byte_arr.size), dtype=np.uint8)
-        
-        scrambled_bytes_ind = 0 #index for the current scrambled byte being filled
-        j = 7 #index for the current bit of the scrambled byte being filled
-        
-        #push the bits into the LFSR starting from the most significant bit of the first byte in byte_arr
-        for byte_ind in range(0,len(byte_arr)):
-            for i in range(7,-1,-1):
-                outbit = self.LFSR.next((byte_arr[byte_ind]>>i)&1)
-                
-                
-                if ((byte_ind != 0) or (i<3)): #wait for the first 5 bits to have filled the LFSR before storing the output bit
-                    if (outbit == 1): #only set the bit if it is 1
-                        scrambled_bytes[scrambled_bytes_ind] = np.uint8(scrambled_bytes[scrambled_bytes_ind] | (outbit<<j))
-                    
-                    #increment the bit and byte indices for scrambled_bytes if necessary
-                    if (j == 0):
-                        j = 7
-                        scrambled_bytes_ind += 1
-                    else:
-                        j = j - 1
+    ##@param byte_arr, the array of bytes to be interleaved, stored as a 1d numpy array of bytes or any other bytes-like object
+    ##@param out a writable bytes-like object to write the interleaved bytes to, it may be byte_arr itself, None allocates a new array
+    ##@return a 1d numpy array of the interleaved bytes, a view of out when it is given
+    def scramble_bits(self, byte_arr, out=None):
+        output = output_array(len(byte_arr), out)
+        self.state = push_bytes(SCRAMBLER_TABLE, self.state, byte_arr, memoryview(output))
 
         #push the last 5 bits through the LFSR
-        for i in range(0,5):
-            outbit = self.LFSR.next()
-            scrambled_bytes[scrambled_bytes_ind] = scrambled_bytes[scrambled_bytes_ind] | (outbit<<j)
-            j = j - 1
-        
-        #print(scrambled_bytes.tobytes().hex())
-        return scrambled_bytes
-        
+        t = SCRAMBLER_LEAD_OUT_TABLE[self.state<<8]
+        self.state = t>>8
+
+        #the first 5 output bits only fill the LFSR, drop them and append the 5 bits pushed out at the end
+        if (len(output) > 0):
+            last = ((int(output[-1])<<LEAD_IN_BITS) | (t & 0x1f)) & 0xff
+            carry = output[1:] >> (8-LEAD_IN_BITS)
+            np.left_shift(output[:-1], LEAD_IN_BITS, out=output[:-1])
+            np.bitwise_or(output[:-1], carry, out=output[:-1])
+            output[-1] = last
+        return output
+
 #this class will de-interleave bits fed to it as per the IL2P protocol
 class Deinterleaver:
 
     def __init__(self):
-        initstate = np.array([1,1,1,1,1,0,0,0,0])
-        self.initstate = initstate
-        self.state = initstate.astype(int)
-
-    def __next(self,input_bit=0):
-        prev_state = self.state
-        self.state = np.roll(self.state, 1)
-        
-        self.state[0] = input_bit
-        self.state[5] = np.logical_xor(prev_state[4], input_bit) * 1
-        return np.logical_xor(prev_state[8], input_bit) * 1
+        self.state = DESCRAMBLER_INITSTATE
 
     def reset(self):
         self.__init__()
 
-    def descramble_bits(self,byte_arr):
-        descrambled_bytes = np.zeros((len(byte_arr)), dtype=np.uint8)
-        
-        descrambled_ind = 0 #index for the current descrambled byte being filled
-        j = 7 #index for the current bit of the descrambled byte being filled
-        
-        #push the bits into the LFSR starting from the most significant bit of the first byte in byte_arr
-        for byte_ind in range(0,len(byte_arr)):
-            for i in range(7,-1,-1):
-                outbit = self.__next((byte_arr[byte_ind]>>i)&1)
-                
-                if (outbit == 1): #only set the bit if it is 1
-                    descrambled_bytes[descrambled_ind] = np.uint8(descrambled_bytes[descrambled_ind] | (outbit<<j))
-                
-                #increment the bit and byte indices for descrambled_bytes if necessary
-                if (j == 0):
-                    j = 7
-                    descrambled_ind += 1
-                else:
-                    j = j - 1   
-        
-        #print(descrambled_bytes.tobytes().hex())
-        return descrambled_bytes
\ No newline at end of file
+    ##@brief de-interleave the bits in an array of bytes, continuing from where the last call left the LFSR
+    ##@param byte_arr the array of bytes to be de-interleaved, stored as a 1d numpy array of bytes or any other bytes-like object
+    ##@param out a writable bytes-like object to write the de-interleaved bytes to, it may be byte_arr itself, None allocates a new array
+    ##@return a 1d numpy array of the de-interleaved bytes, a view of out when it is given
+    def descramble_bits(self,byte_arr,out=None):
+        output = output_array(len(byte_arr), out)
+        self.state = push_bytes(DESCRAMBLER_TABLE, self.state, byte_arr, memoryview(output))
+        return output
+    
+    ##@brief move the LFSR to the state descrambling the bytes that descramble to byte_arr would have left it in, without having those bytes
+    ##@param byte_arr 1d numpy array of the descrambled bytes or any other bytes-like object, for example a frame header that was already decoded
+    def advance(self,byte_arr):
+        self.state = push_bytes(DESCRAMBLER_ADVANCE_TABLE, self.state, byte_arr, bytearray(len(byte_arr)))
@@ -1,4 +1,5 @@
 from interleaving.Interleaver import Interleaver, Deinterleaver
+import interleaving.lfsr
 import numpy as np
 
 scram = Interleaver()
@@ -33,4 +34,38 @@ bytes3b = descram.descramble_bits(scram.scramble_bits(bytes3a))
 for i in range(0,len(bytes3a)):
 	if (bytes3a[i] != bytes3b[i]):
 		raise ValueError('values do not match after scrambling and descrambling the message')
-print('Test 3 complete')
\ No newline at end of file
+print('Test 3 complete')
+
+##@brief the bit at a time scrambler the table driven Interleaver replaced, kept here as the reference it must match
+def scramble_bits_reference(byte_arr):
+	lfsr = interleaving.lfsr.LFSR(fpoly=[9,4], initstate=[0,0,0,0,0,1,1,1,1], outbit_ind=5)
+	bits = [lfsr.next((b>>i)&1) for b in byte_arr for i in range(7,-1,-1)] + [lfsr.next() for i in range(0,5)]
+	return np.packbits(bits[5:])
+
+##@brief the bit at a time descrambler the table driven Deinterleaver replaced
+def descramble_bits_reference(byte_arr):
+	state = [1,1,1,1,1,0,0,0,0]
+	bits = []
+	for b in byte_arr:
+		for i in range(7,-1,-1):
+			input_bit = (b>>i)&1
+			bits.append(state[8]^input_bit)
+			state = [input_bit] + state[0:4] + [state[4]^input_bit] + state[5:8]
+	return np.packbits(bits)
+
+scram.reset()
+descram.reset()
+
+for size in [1,2,13,32,100,300]:
+	bytes4a = np.random.randint(0, 256, size=size).astype(np.uint8)
+	bytes4b = scram.scramble_bits(bytes4a)
+	scram.reset()
+	if not np.array_equal(bytes4b, scramble_bits_reference(bytes4a)):
+		raise ValueError('scrambled bytes do not match the bit at a time scrambler')
+
+	#the header and payload are descrambled by separate calls, the state carries over between them
+	bytes4c = np.concatenate( (descram.descramble_bits(bytes4b[0:size//2]), descram.descramble_bits(bytes4b[size//2:])) )
+	descram.reset()
+	if not np.array_equal(bytes4c, descramble_bits_reference(bytes4b)) or not np.array_equal(bytes4c, bytes4a):
+		raise ValueError('descrambled bytes do not match the bit at a time descrambler')
+print('Test 4 complete')
@@ -6,6 +6,8 @@ from datetime import datetime
 
 from kivy.logger import Logger as log
 
+DEFAULT_CARRIER_LEN = 750 #the default carrier length of a message in milliseconds
+
 class AckSequenceList():
     @staticmethod
     def unmarshal(str):
@@ -56,7 +58,7 @@ class MessageObject():
     def unmarshal(tup):
         return pickle.loads(tup)
     
-    def __init__(self, header=None, payload_str='', forwarded=False, attempt_index=0, carrier_len=750, time_str='', priority=100):
+    def __init__(self, header=None, payload_str='', forwarded=False, attempt_index=0, carrier_len=DEFAULT_CARRIER_LEN, time_str='', priority=100):
         self.header = header
         self.payload_str = payload_str
         self.attempt_index = int(attempt_index)
@@ -0,0 +1,230 @@
+import io
+import numpy as np
+
+import common
+import config
+import detect
+import dsp
+import exceptions
+import send as _send
+import recv as _recv
+from IL2P import IL2P_Frame_Header, IL2P_Frame_Engine
+
+conf = config.Configuration()
+
+##@brief stands in for transceiver.ReceiverPipe, collects the received bytes until the expected number have arrived
+class ByteCollector:
+    def __init__(self, expected, header=None):
+        self.expected = expected
+        self.received = []
+        self.header = None
+        self.header_to_set = header
+
+    def reset(self):
+        self.received = []
+
+    def addByte(self, b):
+        self.received.append(b)
+        if (len(self.received) == 64):
+            self.header = self.header_to_set
+        return (len(self.received), self.expected - len(self.received))
+
+##@brief a Detector that records whether its energy gate let each block through to the coherence test
+class GateRecorder(detect.Detector):
+    def __init__(self, config):
+        detect.Detector.__init__(self, config)
+        self.opened = []
+
+    def _gate(self, power):
+        self.opened.append(detect.Detector._gate(self, power))
+        return self.opened[-1]
+
+##@brief stands in for transceiver.StatusUpdater
+class StatusCollector:
+    def __init__(self):
+        self.statuses = []
+
+    def update_status(self, new_status):
+        self.statuses.append(new_status)
+
+##@brief run audio through the receiver front end and drop the filter delay, so baseband sample j lines up with audio sample j*rx_decimation
+def baseband(c, signal):
+    delay = c.rx_filter_taps // 2
+    pad = -delay % c.rx_decimation #round the delay up to a whole baseband sample
+    ring = common.BasebandRing([np.concatenate( (np.zeros(pad), signal, np.zeros(delay)) )], dsp.front_end(c))
+    ring.skip((delay+pad)//c.rx_decimation)
+    return ring
+
+##@brief the sample of the audio passed to baseband() that the next baseband sample of ring lines up with
+def audio_position(c, ring):
+    return ring.audio_index() - (-(c.rx_filter_taps // 2) % c.rx_decimation)
+
+##@brief modulate frame_bytes and demodulate them again, starting from the separator symbol sent right before a frame
+def loopback(frame_bytes, high_rate=False, noise=0.05, offset=0):
+    sender = _send.Sender(io.BytesIO(), conf)
+    if (high_rate):
+        signal = np.concatenate( (sender.frame_signal(bytearray(frame_bytes[0:64])), sender.data_signal(bytearray(frame_bytes[64:]))) )
+    else:
+        signal = sender.frame_signal(bytearray(frame_bytes))
+    signal = np.concatenate( (sender.symbol_templates[0], signal, np.zeros(4*conf.Nsym)) ) #the separator symbol is the phase reference
+    signal = np.concatenate( (np.zeros(offset), signal) ) + np.random.normal(0, noise, len(signal)+offset)
+
+    output = ByteCollector(len(frame_bytes), IL2P_Frame_Header(high_rate=True) if high_rate else None)
+    try:
+        _recv.Receiver(conf).run(baseband(conf, signal), 1.0, output) #the receiver starts offset samples early
+    except exceptions.EndOfFrameDetected:
+        pass
+    return bytes(output.received)
+
+frame = bytes(np.random.randint(0, 256, size=300).astype(np.uint8))
+
+if (loopback(frame) != frame):
+    raise ValueError('DBPSK frame does not match after modulating/demodulating')
+print('Test 1 complete')
+
+if (loopback(frame, high_rate=True) != frame):
+    raise ValueError('high rate frame does not match after modulating/demodulating')
+print('Test 2 complete')
+
+if (loopback(frame[0:100], high_rate=True, offset=3) != frame[0:100]):
+    raise ValueError('high rate frame does not match after modulating/demodulating with a timing offset')
+print('Test 3 complete')
+
+modem = dsp.MODEM(conf.data_mode().symbols)
+bits = np.random.randint(0, 2, size=modem.bits_per_symbol*100)
+symbols = modem.encode_array(bits)
+if not np.array_equal(symbols, list(modem.encode(bits.tolist()))):
+    raise ValueError('encode_array does not match encode')
+received = symbols + np.random.normal(0, 0.1, len(symbols)) + 1j*np.random.normal(0, 0.1, len(symbols))
+if not np.array_equal(modem.decode_array(received), np.concatenate(list(modem.decode(received)))):
+    raise ValueError('decode_array does not match decode')
+print('Test 4 complete')
+
+#a carrier that drifted off frequency is still detected and its offset measured
+freq_offset = 150
+tone = 0.5*np.cos(2*np.pi*(conf.Fc + freq_offset)*np.arange(4000)/conf.Fs) + np.random.normal(0, 0.05, 4000)
+detector = detect.Detector(conf)
+(amplitude, estimate) = detector.estimate(detector._wait(baseband(conf, tone)))
+if (abs(estimate - freq_offset) > 20):
+    raise ValueError('carrier frequency offset estimated as %.1f Hz instead of %d Hz' % (estimate, freq_offset))
+print('Test 5 complete')
+
+#the receiver corrects the phase drift of DBPSK symbols sent on a carrier that is off frequency
+bits = np.random.randint(0, 2, size=8*300)
+dif_encoded_bits = dsp.differential_encode(np.concatenate(([0], bits)))
+t = np.arange(len(dif_encoded_bits)*conf.Nsym)
+signal = np.repeat(2.0*dif_encoded_bits - 1, conf.Nsym) * np.cos(2*np.pi*(conf.Fc + freq_offset)*t/conf.Fs)
+output = ByteCollector(len(bits) // 8)
+try:
+    _recv.Receiver(conf).run(baseband(conf, signal), 1.0, output, freq_offset=estimate)
+except exceptions.EndOfFrameDetected:
+    pass
+if (bytes(output.received) != bytes(np.packbits(bits, bitorder='little'))):
+    raise ValueError('DBPSK frame on an offset carrier does not match after demodulating')
+print('Test 6 complete')
+
+#the barker correlator leaves the signal at the separator symbol to within a baseband sample
+for offset in range(conf.Nsym):
+    preamble = common.loads(_send.preamble(100, conf.Fs, conf.Fc, conf.Nsym, 0))
+    signal = baseband(conf, np.concatenate( (preamble[offset+50*conf.Nsym:], np.zeros(conf.Nsym)) ) + np.random.normal(0, 0.05, len(preamble)-offset-49*conf.Nsym))
+    detector = detect.Detector(conf)
+    if not detector._prefix(signal):
+        raise ValueError('barker code not detected')
+    if (abs(audio_position(conf, signal) - (len(preamble) - offset - 51*conf.Nsym)) > conf.rx_decimation) or (detector.barker_score < 0.9):
+        raise ValueError('barker code detected at audio sample %d with score %.2f' % (audio_position(conf, signal), detector.barker_score))
+print('Test 7 complete')
+
+#a frame whose symbol timing is off by almost half a symbol is still decoded, the header picks the timing offset it is demodulated at
+engine = IL2P_Frame_Engine()
+payload = np.frombuffer(b'waypoint data '*20, dtype=np.uint8)
+raw_frame = engine.encode_frame(IL2P_Frame_Header(payload_size=len(payload)), payload).tobytes()
+sender = _send.Sender(io.BytesIO(), conf)
+signal = np.concatenate( (np.zeros(3), sender.symbol_templates[0], sender.frame_signal(bytearray(raw_frame)), np.zeros(4*conf.Nsym)) )
+output = ByteCollector(len(raw_frame))
+receiver = _recv.Receiver(conf)
+try:
+    receiver.run(baseband(conf, signal + np.random.normal(0, 0.3, len(signal))), 1.0, output)
+except exceptions.EndOfFrameDetected:
+    pass
+(header, payload_decode_success, payload_received) = engine.decode_frame(np.array(output.received, dtype=np.uint8), alternates=output.alternates)
+if (not payload_decode_success) or (payload_received.tobytes() != payload.tobytes()):
+    raise ValueError('frame with a symbol timing offset does not match after demodulating')
+print('Test 8 complete')
+
+#the samples taken from a SampleRing are left as they were when the next peek moves the unread samples to make room for a chunk
+samples = np.random.normal(0, 1, 128*8) + 1j*np.random.normal(0, 1, 128*8)
+ring = common.SampleRing([samples[i:i+128] for i in range(0, len(samples), 128)], capacity=128, dtype=complex)
+for pos in range(0, len(samples), 64):
+    buf = ring.take(64)
+    ring.peek(100)
+    if not np.array_equal(buf, samples[pos:pos+64]):
+        raise ValueError('samples taken from a SampleRing changed when it was next read')
+ring = common.SampleRing([samples[i:i+128] for i in range(0, len(samples), 128)], capacity=128, dtype=complex)
+receiver = _recv.Receiver(conf)
+nominal = int(np.argmin(np.abs(receiver.timing_offsets)))
+for pos in range(0, len(samples), 64):
+    if not np.array_equal(receiver.take_offsets(ring, 64)[nominal], samples[pos:pos+64]):
+        raise ValueError('samples taken at the detected timing do not match the signal')
+print('Test 9 complete')
+
+#the energy gate stays closed on noise and opens on the carrier that follows it, and the frame after the carrier is received
+payload = np.frombuffer(b'carrier onset '*20, dtype=np.uint8)
+raw_frame = engine.encode_frame(IL2P_Frame_Header(payload_size=len(payload)), payload).tobytes()
+recording = io.BytesIO()
+sender = _send.Sender(recording, conf, carrier_length=200)
+sender.start()
+sender.modulate(raw_frame)
+sender.write(np.zeros(4*conf.Nsym))
+lead_in = int(1.5*conf.Fs)
+signal = np.concatenate( (np.zeros(lead_in), 0.5*common.loads(recording.getvalue())) )
+signal = baseband(conf, signal + np.random.normal(0, 0.1, len(signal)))
+detector = GateRecorder(conf)
+status = StatusCollector()
+gain = -1
+while (gain == -1) and (len(signal.peek(1)) > 0):
+    try:
+        gain = detector.run(signal, status)
+    except exceptions.NoCarrierDetectedError:
+        pass
+noise_blocks = lead_in // (conf.rx_decimation*detector.Nsym*detector.symbols_per_block)
+if (gain <= 0) or (common.CARRIER_DETECTED not in status.statuses) or not detector.opened[-1]:
+    raise ValueError('the carrier after %.1f seconds of noise was not detected' % (lead_in/conf.Fs,))
+settled = detector.opened[noise_blocks//2:noise_blocks] #the noise floor is seeded by the first block and takes a while to settle
+if (sum(settled) > len(settled) // 2):
+    raise ValueError('the energy gate let %d of %d blocks of noise through' % (sum(settled), len(settled)))
+output = ByteCollector(len(raw_frame))
+try:
+    _recv.Receiver(conf).run(signal, gain, output, freq_offset=detector.freq_offset)
+except exceptions.EndOfFrameDetected:
+    pass
+(header, payload_decode_success, payload_received) = engine.decode_frame(np.array(output.received, dtype=np.uint8))
+if (not payload_decode_success) or (payload_received.tobytes() != payload.tobytes()):
+    raise ValueError('frame after the energy gate opened does not match after demodulating')
+print('Test 10 complete')
+
+#the energy gate closes after ENERGY_HOLD_BLOCKS quiet blocks, and the noise floor follows a step in the noise level
+detector = detect.Detector(conf)
+detector._gate(1.0) #seeds the noise floor
+if not detector._gate(detector.ENERGY_OPEN_RATIO*2.0):
+    raise ValueError('the energy gate did not open')
+for block in range(detector.ENERGY_HOLD_BLOCKS - 1):
+    if not (detector._gate(1.0) and detector._gate(0.5*(detector.ENERGY_OPEN_RATIO + detector.ENERGY_CLOSE_RATIO))):
+        raise ValueError('the energy gate closed after %d quiet blocks' % (block + 1,))
+if detector._gate(1.0):
+    raise ValueError('the energy gate is still open after %d quiet blocks' % (detector.ENERGY_HOLD_BLOCKS,))
+
+detector = GateRecorder(conf)
+noise = np.concatenate( (np.random.normal(0, 0.05, int(conf.Fs)), np.random.normal(0, 0.2, 6*int(conf.Fs))) )
+signal = baseband(conf, noise)
+while (len(signal.peek(1)) > 0):
+    try:
+        detector._wait(signal) #noise very occasionally holds a run of coherent symbols long enough to pass for a carrier
+    except exceptions.NoCarrierDetectedError:
+        pass
+power = np.mean(np.abs(baseband(conf, noise[-int(conf.Fs):]).peek(int(conf.Fs_bb)))**2) #the power of the louder noise after the front end
+if not (power/1.3 < detector.noise_floor < 1.3*power):
+    raise ValueError('the noise floor is %.2g after a step to noise of power %.2g' % (detector.noise_floor, power))
+settled = detector.opened[-int(conf.Fs_bb) // (detector.Nsym*detector.symbols_per_block):] #the last second
+if (sum(settled) > len(settled) // 2):
+    raise ValueError('the energy gate let %d of %d blocks through once the noise floor followed the noise level' % (sum(settled), len(settled)))
+print('Test 11 complete')
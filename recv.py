@@ -10,58 +10,178 @@ from func_timeout import func_set_timeout
 import dsp
 import common
 import exceptions
+from IL2P import IL2P_Frame_Engine, IL2P_HDR_LEN_ENC
 
 from kivy.logger import Logger as log
 
+##@brief adapts a numpy array of samples to the sampler interface used by dsp.Demux
+class ArraySampler:
+    def __init__(self, samples):
+        self.samples = samples
+        self.offset = 0
+
+    def take(self, size):
+        buf = self.samples[self.offset:self.offset+size]
+        self.offset += size
+        return buf
+
 class Receiver:
 
     def __init__(self, config):
         self.modem = dsp.MODEM(config.symbols)
         self.frequencies = np.array(config.frequencies)
         self.omegas = 2 * np.pi * self.frequencies / config.Fs
-        self.omega = 2 * np.pi * config.Fc / config.Fs
-        self.Nsym = config.Nsym
+        self.freq = config.Fc
+        self.Nsym = config.Nsym_bb #the receiver works on the complex baseband signal from dsp.front_end
         self.Tsym = config.Tsym
         self.iters_per_update = 100  # [ms]
         self.modem_bitrate = config.modem_bps
         self.carrier_index = config.carrier_index
         self.bit_packer = common.BitPacker()
+        self.freq_offset = 0.0 #the carrier frequency offset (in Hz) of the frame being received
+        self.rotation = 0.0 #the phase a symbol advances by when the phase did not change
+        self.symbols_per_block = 64 #the number of symbols demodulated at once, must be a multiple of 8 that divides the 512 symbol frame header
+        self.timing_offsets = np.array(config.rx_timing_offsets) #the baseband sample offsets from the detected symbol timing that each frame is demodulated at
+        self.timing_margin = int(np.max(np.abs(self.timing_offsets))) #the number of samples needed either side of a block to demodulate it at every timing offset
+        self.history = np.zeros(self.timing_margin, dtype=complex) #the last timing_margin samples taken from the signal
+        self.frame_engine = IL2P_Frame_Engine() #decodes the candidate frame headers, separate from the link layer's engine so the two never share deinterleaver state
+
+        #high rate data mode
+        data_config = config.data_mode()
+        self.data_modem = dsp.MODEM(data_config.symbols)
+        self.data_Nsym = config.Nsym #the high rate payload is demodulated from the audio at the full sampling rate, not the decimated baseband
+        self.data_omegas = 2 * np.pi * np.array(data_config.frequencies) / config.Fs
+        self.data_bits_per_baud = data_config.bits_per_baud
+        self.training = dsp.training_symbols(data_config.symbols, (config.data_training_length, data_config.Nfreq))
+
+    ##@brief demodulate a block of DBPSK symbols in one vectorized step
+    ##@param buf numpy array of complex baseband samples, its last axis must be a multiple of Nsym long, each row is demodulated separately
+    ##@param z_prev the complex symbol immediately preceding buf, one per row of buf
+    ##@return a tuple, the first element is a numpy array of bits (one per symbol), the second is the complex symbol at the end of buf
+    def demodulate(self, buf, z_prev):
+        z = np.sum(buf.reshape(buf.shape[:-1] + (-1, self.Nsym)), axis=-1) #integrate every symbol in the block at once
+        return (dsp.differential_decode(z, z_prev, self.rotation), z[...,-1])
+
+    ##@brief take the next samples from the signal as they are seen at every timing offset
+    ##@param signal the common.SampleRing to take the samples from
+    ##@param n the number of samples to take
+    ##@return a 2d numpy array with a row of samples for each timing offset, fewer than n columns if the signal runs out
+    def take_offsets(self, signal, n):
+        buf = signal.take(n)
+        n = len(buf)
+        lookahead = signal.peek(self.timing_margin)
+        lookahead = np.concatenate( (lookahead, np.zeros(self.timing_margin - len(lookahead))) ) #the signal has run out
+        samples = np.concatenate( (self.history, buf, lookahead) )
+        self.history = samples[n:n+self.timing_margin]
+        return samples[(self.timing_margin + self.timing_offsets)[:,None] + np.arange(n)]
+
+    ##@brief pick the timing offset whose frame header needed the fewest corrections by the Reed Solomon decoder
+    ##@param candidates a list holding the bytes demodulated at each timing offset
+    ##@return the index of the chosen timing offset, the detected timing is chosen if no header could be decoded
+    def pick_timing(self, candidates):
+        nominal = int(np.argmin(np.abs(self.timing_offsets)))
+        if (len(candidates) == 1):
+            return nominal
+
+        corrections = []
+        for received in candidates:
+            try:
+                (header, cnt) = self.frame_engine.decode_header(np.array(received[0:IL2P_HDR_LEN_ENC], dtype=np.uint8), verbose=False, return_corrections=True)
+            except exceptions.IL2PHeaderDecodeError:
+                cnt = np.inf
+            corrections.append(cnt)
+
+        best = min(range(len(candidates)), key=lambda i : (corrections[i], abs(self.timing_offsets[i]))) #prefer the detected timing when candidates tie
+        if (corrections[best] == np.inf):
+            return nominal
+        log.debug('timing offset %d chosen, header corrections %s', self.timing_offsets[best], corrections)
+        return best
+
+    ##@brief demodulate a frame and send its bytes to output until the frame ends
+    ##@param signal a common.SampleRing positioned at the separator symbol sent right before the frame
+    ##@param gain the gain correction estimated by the Detector
+    ##@param output the ReceiverPipe to send the received bytes to
+    ##@param freq_offset the carrier frequency offset (in Hz) estimated by the Detector
+    def run(self, signal,  gain, output, freq_offset=0.0):
+        block_len = self.Nsym * self.symbols_per_block
+        self.freq_offset = freq_offset
+        self.rotation = 2 * np.pi * freq_offset * self.Tsym
 
-    def run(self, signal,  gain, output):
-        ##@brief private method to convert a DBPSK signal to bits
-        ##@param signal an iterable signal
-        ##@return yields a stream of bits
-        def to_bits(signal):
-            t = np.arange(self.Nsym)
-            p_prev = common.take(signal, self.Nsym)*np.cos(2*np.pi*t*self.omega) 
-            
-            #take one symbol worth of samples and run it through a bandpass filter set to the carrier frequency
-            for offset, buf in common.iterate(signal, self.Nsym, index=True):
-                #take one symbol worth of signal and run it through a bandpass filter set to the carrier frequency
-                p = buf*np.cos(2*np.pi*t*self.omega)
-                z = np.sum(p * p_prev) #numerically integrate the product of the current symbol and the previous symbol
-                phase_changed = (z < 0) #if the result is negative, the phase changed between these two symbols
-                p_prev = p
-                if (phase_changed): #this marks a '1'
-                    yield 1
-                else:
-                    yield 0
-        
-        ##@brief turn a bit stream into a byte stream
-        ##@param bits, an interable stream of bits
-        def to_bytes(bits):
-            for chunk in common.iterate(data=bits, size=8, func=tuple, truncate=True):
-                yield [self.bit_packer.to_byte[chunk]]
+        #the frame is demodulated at every timing offset at once, the header picks the timing whose bytes are sent to output and the others are kept for the payload decoder to fall back on
+        candidates = [[] for offset in self.timing_offsets] #the bytes demodulated at each timing offset
+        best = None #the index of the timing offset chosen once the header has been received
+        sent = 0 #the number of bytes sent to output
 
         #this is where the receiver sends its output to the IL2P layer
         output.reset()
-        for byte in itertools.chain.from_iterable(to_bytes(to_bits(signal))):
-            (received, remaining) = output.addByte(byte) 
-            #log.info('recv 0x%x' % (byte,))
-            
-            if ((received == -1) and (remaining == -1)): #an error occurred while decoding the frame
-                raise exceptions.IL2PHeaderDecodeError
-            elif (remaining == 0): #all bytes have been received
-                raise exceptions.EndOfFrameDetected
+        self.history = np.zeros(self.timing_margin, dtype=complex)
+        p_prev = np.sum(self.take_offsets(signal, self.Nsym), axis=-1)
+        while True:
+            buf = self.take_offsets(signal, block_len)
+            buf = buf[:,:buf.shape[1] - (buf.shape[1] % (8*self.Nsym))] #only demodulate whole bytes
+            if (buf.shape[1] == 0): #the signal has run out
+                return
+
+            (bits, p_prev) = self.demodulate(buf, p_prev)
+            for (received, block) in zip(candidates, np.packbits(bits, axis=-1, bitorder='little')):
+                received.extend(block.tolist())
+            if (best is None):
+                if (len(candidates[0]) < IL2P_HDR_LEN_ENC): #wait for the whole header
+                    continue
+                best = self.pick_timing(candidates)
+
+            for byte in candidates[best][sent:]:
+                sent += 1
+                (received, remaining) = output.addByte(byte)
+                #log.info('recv 0x%x' % (byte,))
+
+                if ((received == -1) and (remaining == -1)): #an error occurred while decoding the frame
+                    raise exceptions.IL2PHeaderDecodeError
+                elif (remaining == 0): #all bytes have been received
+                    output.alternates = [np.array(candidate[0:sent], dtype=np.uint8) for (i, candidate) in enumerate(candidates) if (i != best)]
+                    raise exceptions.EndOfFrameDetected
+
+            if ((output.header is not None) and output.header.high_rate): #the header was just received and the payload follows in the high rate data mode
+                self.run_high_rate(signal, remaining, output)
 
+    ##@brief find the symbol timing of a high rate payload by correlating against the known training symbols
+    ##@param samples 1d numpy array of audio samples starting at the guard symbol
+    ##@param filters the matrix of Demux filters, one row per carrier
+    ##@return the offset (in samples) of the first training symbol, between 0 and 2*data_Nsym
+    def find_training(self, samples, filters):
+        training_len = self.training.size // len(filters) * self.data_Nsym
+        derotate = np.exp(-2j*np.pi*self.freq_offset*self.Tsym*np.arange(len(self.training)))[:,None] #undo the phase drift caused by the carrier frequency offset
+        scores = []
+        for offset in range(0, 2*self.data_Nsym):
+            received = np.dot(samples[offset:offset+training_len].reshape(-1, self.data_Nsym), filters.T) * derotate
+            correlation = np.abs(np.sum(received * self.training.conj(), axis=0))
+            energy = np.sqrt(np.sum(np.abs(received)**2, axis=0)) + 1e-12
+            scores.append(np.sum(correlation / energy)) #symbols that straddle two training symbols correlate poorly
+        return int(np.argmax(scores))
 
+    ##@brief demodulate the rest of a frame sent in the multi-carrier QAM high rate data mode
+    ##@param signal a common.BasebandRing positioned right after the frame header, the payload is demodulated from the audio it keeps
+    ##@param remaining the number of bytes left in the frame
+    ##@param output the ReceiverPipe to send the received bytes to
+    def run_high_rate(self, signal, remaining, output):
+        bit_cnt = 8*remaining
+        symbol_cnt = -(-bit_cnt // self.data_bits_per_baud)
+
+        #take the guard symbol, training symbols and payload symbols plus one spare symbol so the timing can be off by up to a symbol either way
+        samples = signal.take_audio((2 + len(self.training) + symbol_cnt)*self.data_Nsym)
+        sampler = ArraySampler(samples)
+        demux = dsp.Demux(sampler, self.data_omegas, self.data_Nsym)
+        sampler.offset = self.find_training(samples, demux.filters)
+
+        received = np.array([next(demux) for i in range(len(self.training) + symbol_cnt)])
+        received *= np.exp(-2j*np.pi*self.freq_offset*self.Tsym*np.arange(len(received)))[:,None] #undo the phase drift caused by the carrier frequency offset
+        training = received[0:len(self.training)]
+        channel = np.sum(training * self.training.conj(), axis=0) / np.sum(np.abs(self.training)**2, axis=0) #the gain and phase of each carrier
+        symbols = received[len(self.training):] / channel
+
+        (bits, error) = self.data_modem.decode_array(symbols, return_error=True)
+        log.debug('high rate payload, mean symbol error %.3f', np.mean(error))
+        for byte in np.packbits(bits[0:bit_cnt], bitorder='little').tolist():
+            (received, remaining) = output.addByte(byte)
+            if (remaining == 0): #all bytes have been received
+                raise exceptions.EndOfFrameDetected
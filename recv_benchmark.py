@@ -0,0 +1,48 @@
+import time
+import numpy as np
+
+import common
+import config
+import dsp
+import recv as _recv
+
+##@brief the per-symbol demodulator Receiver.run used before block demodulation, kept here as the baseline
+def to_bits_per_symbol(signal, Nsym, omega):
+    t = np.arange(Nsym)
+    p_prev = common.take(signal, Nsym)*np.cos(2*np.pi*t*omega)
+    for offset, buf in common.iterate(signal, Nsym, index=True):
+        p = buf*np.cos(2*np.pi*t*omega)
+        z = np.sum(p * p_prev)
+        p_prev = p
+        yield 1 if (z < 0) else 0
+
+conf = config.Configuration()
+receiver = _recv.Receiver(conf)
+
+symbol_cnt = 64*500
+bits = np.random.randint(0, 2, size=symbol_cnt)
+dif_encoded_bits = np.concatenate(([0], np.cumsum(bits) % 2)) #differentially encode the bits, the first symbol is the phase reference
+carrier = np.cos(2*np.pi*conf.Fc*np.arange(conf.Nsym)/conf.Fs)
+signal = ((2*dif_encoded_bits[:,None] - 1) * carrier).flatten() + np.random.normal(0, 0.1, (symbol_cnt+1)*conf.Nsym)
+
+start = time.time()
+bits_before = np.array(list(to_bits_per_symbol(iter(signal), conf.Nsym, conf.Fc / conf.Fs)))
+before = time.time() - start
+
+start = time.time()
+delay = conf.rx_filter_taps // 2 + (-(conf.rx_filter_taps // 2) % conf.rx_decimation) #the filter delay rounded up to a whole baseband sample
+baseband = dsp.front_end(conf)(np.concatenate( (np.zeros(delay - conf.rx_filter_taps // 2), signal, np.zeros(delay)) )) #pad the signal so the filter delay can be dropped
+baseband = baseband[delay // conf.rx_decimation:][0:(symbol_cnt+1)*conf.Nsym_bb]
+front_end = time.time() - start
+
+start = time.time()
+(bits_after, _) = receiver.demodulate(baseband[conf.Nsym_bb:], np.sum(baseband[0:conf.Nsym_bb]))
+after = time.time() - start
+
+if (np.sum(bits_after != bits) > np.sum(bits_before != bits)):
+    raise ValueError('the block demodulator makes more bit errors than the per-symbol demodulator')
+
+print('per-symbol demodulator: %10.0f symbols/sec' % (symbol_cnt/before,))
+print('block demodulator:      %10.0f symbols/sec' % (symbol_cnt/after,))
+print('front end:              %10.0f symbols/sec' % (symbol_cnt/front_end,))
+print('speedup: %.1fx' % (before/after,))
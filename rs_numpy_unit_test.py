@@ -0,0 +1,60 @@
+import numpy as np
+import time
+
+from fec.reedsolo import RSCodec, ReedSolomonError
+from fec.rs_numpy import rs_decode_blocks, rs_encode_blocks
+from fec.fec import get_codec
+
+#the batch decoder must give exactly the same results as the pure python decoder, including when there are too many errors to correct
+for nsym in (10, 32, 50):
+    rsc = RSCodec(nsym)
+    for trial in range(0, 100):
+        msg = np.random.randint(0, 256, size=np.random.randint(1, 255-nsym)).astype(np.uint8)
+        codeword = np.frombuffer(rsc.encode(msg.tobytes()), dtype=np.uint8).copy()
+        error_pos = np.random.choice(codeword.size, np.random.randint(0, nsym), replace=False)
+        codeword[error_pos] ^= np.random.randint(1, 256, size=error_pos.size).astype(np.uint8)
+
+        try:
+            decoded, _ , error_ind = rsc.decode(bytearray(codeword.tobytes()))
+            expected = (bytes(decoded), len(error_ind))
+        except ReedSolomonError:
+            expected = (None, -1)
+
+        (decoded, error_cnt) = rs_decode_blocks(codeword[None,:], nsym)[0]
+        if ((None if decoded is None else decoded.tobytes(), error_cnt) != expected):
+            raise ValueError('batch decoder result does not match RSCodec.decode with %d ecc symbols and %d errors' % (nsym, error_pos.size))
+print('The batch decoder matches RSCodec.decode')
+
+#the shared codecs encode exactly like RSCodec and are only created once per number of error correction symbols
+for nsym in range(10, 52):
+    msg = np.random.randint(0, 256, size=255-nsym).astype(np.uint8).tobytes()
+    if (get_codec(nsym).encode(msg) != RSCodec(nsym).encode(msg)):
+        raise ValueError('shared codec encoding does not match RSCodec.encode with %d ecc symbols' % (nsym,))
+    msgs = np.random.randint(0, 256, size=(5, np.random.randint(1, 256-nsym))).astype(np.uint8)
+    if not all(bytes(codeword) == RSCodec(nsym).encode(msg.tobytes()) for (codeword, msg) in zip(get_codec(nsym).encode_blocks(msgs), msgs)):
+        raise ValueError('batch encoding does not match RSCodec.encode with %d ecc symbols' % (nsym,))
+    if not all(bytes(codeword) == RSCodec(nsym).encode(msg.tobytes()) for (codeword, msg) in zip(rs_encode_blocks(msgs, get_codec(nsym).gen), msgs)):
+        raise ValueError('numpy batch encoding does not match RSCodec.encode with %d ecc symbols' % (nsym,))
+    codeword = np.zeros(len(msg) + nsym + 4, dtype=np.uint8)
+    codeword[2:2+len(msg)] = np.frombuffer(msg, dtype=np.uint8) #the message is already in place, it is encoded into the view around it
+    get_codec(nsym).encode(codeword[2:2+len(msg)], out=codeword[2:-2])
+    if (codeword[2:-2].tobytes() != RSCodec(nsym).encode(msg)) or codeword[0:2].any() or codeword[-2:].any():
+        raise ValueError('encoding into a buffer does not match RSCodec.encode with %d ecc symbols' % (nsym,))
+if (get_codec(32) is not get_codec(32)):
+    raise ValueError('get_codec created a second codec for the same number of ecc symbols')
+print('The shared, batch and in place encoders match RSCodec.encode')
+
+#decode the blocks of a large frame payload, most of which arrive without errors
+rsc = RSCodec(50)
+blocks = np.array([np.frombuffer(rsc.encode(np.random.randint(0, 256, size=200).astype(np.uint8).tobytes()), dtype=np.uint8) for i in range(0, 8)])
+blocks[0,0:10] ^= 0x55
+
+start = time.time()
+for block in blocks:
+    rsc.decode(bytearray(block.tobytes()))
+before = time.time() - start
+
+start = time.time()
+rs_decode_blocks(blocks, 50)
+after = time.time() - start
+print('RSCodec.decode: %.1f ms, rs_decode_blocks: %.1f ms' % (before*1e3, after*1e3))
@@ -1,4 +1,5 @@
 import itertools
+import functools
 import numpy as np
 
 import common
@@ -6,6 +7,36 @@ import dsp
 
 from kivy.logger import Logger as log
 
+BARKER_BITS = [1, 1, 1, 1, 1, 0, 0, 1, 1, 0, 1, 0, 1] #the synchronization signal sent after the pilot tone
+
+##@brief build the audio sent ahead of every frame: the leading silence, the pilot tone, the barker code and the separator symbol
+##@param carrier_length the length of the pilot tone in milliseconds (symbols)
+##@param Fs the sampling frequency
+##@param Fc the carrier frequency
+##@param Nsym the number of samples in one symbol
+##@param silence_start the length of the leading silence in seconds
+##@return the preamble as a bytes object of int16 pcm samples
+@functools.lru_cache(maxsize=8) #the preamble is the same for every frame sent with the same settings
+def preamble(carrier_length, Fs, Fc, Nsym, silence_start):
+    silence = np.zeros(int(Fs * silence_start)) # pre-padding audio with silence (priming the audio sending queue)
+
+    (baseband_signal,t,prev_bit) = dsp.bits2baseband([0], Nsym, 0)
+    pilot_signal = baseband_signal * np.cos( (2*np.pi*Fc*t) / Fs)# DBPSK with carrier
+
+    (baseband_signal,t,prev_bit) = dsp.bits2baseband(BARKER_BITS, Nsym, prev_bit)
+    sync_signal = baseband_signal * np.cos( (2*np.pi*Fc*t) / Fs)# DBPSK with carrier
+
+    #the pilot signal, then the synchronization signal, then a zero right after the synchronization signal to separate it from the data signal
+    signal = np.concatenate( (silence, np.tile(pilot_signal, carrier_length), sync_signal, pilot_signal) )
+    return common.dumps(signal)
+
+##@brief build the preambles that will be needed ahead of time so that the first frames sent do not pay for it
+##@param config Configuration object
+##@param carrier_lengths an iterable of the carrier lengths (in milliseconds) to build preambles for
+def warm_preamble_cache(config, carrier_lengths):
+    for carrier_length in set(carrier_lengths):
+        preamble(carrier_length, config.Fs, config.Fc, config.Nsym, config.silence_start)
+
 class Sender:
     def __init__(self, fd, config, carrier_length=750):
         self.gain = 1.0
@@ -19,49 +50,69 @@ class Sender:
         self.Nsym = config.Nsym
         self.Fs = config.Fs
         self.Fc = config.Fc
+        self.silence_start = config.silence_start
         
-        self.barker_bits = [1, 1, 1, 1, 1, 0, 0, 1, 1, 0, 1, 0, 1]
+        self.barker_bits = BARKER_BITS
         self.carrier_length = carrier_length
         self.bit_packer = common.BitPacker()
         
         self.prev_bit = 0
 
+        carrier = np.cos( (2*np.pi*self.Fc*np.arange(self.Nsym)) / self.Fs)
+        self.symbol_templates = np.array([-carrier, carrier]) #the waveforms of a differentially encoded 0 and 1
+
+        #high rate data mode
+        data_config = config.data_mode()
+        self.data_modem = dsp.MODEM(data_config.symbols)
+        self.data_carriers = data_config.carriers / data_config.Nfreq
+        self.data_bits_per_baud = data_config.bits_per_baud
+        self.training = dsp.training_symbols(data_config.symbols, (config.data_training_length, data_config.Nfreq)) #known symbols the receiver uses to find the symbol timing and estimate the gain and phase of each carrier
+
     def write(self, signal):
         signal = np.array(signal) * self.gain
         data = common.dumps(signal)
         self.fd.write(data)
         self.offset += len(signal)
 
+    ##@brief send the silence, pilot tone and synchronization signal that precede every frame
     def start(self):
-        self.prev_bit = 0
-        (baseband_signal,t,self.prev_bit) = dsp.bits2baseband([0], self.Nsym, self.prev_bit)
-        pilot_signal = baseband_signal * np.cos( (2*np.pi*self.Fc*t) / self.Fs)# DBPSK with carrier
-        for i in range(0,self.carrier_length): #transmit the pilot signal
-            self.write(pilot_signal)
-        
-        (baseband_signal,t,self.prev_bit) = dsp.bits2baseband(self.barker_bits, self.Nsym, self.prev_bit)
-        s = baseband_signal * np.cos( (2*np.pi*self.Fc*t) / self.Fs)# DBPSK with carrier
-        self.write(s) #transmit the synchronization signal
-        
+        data = preamble(self.carrier_length, self.Fs, self.Fc, self.Nsym, self.silence_start)
+        if (self.gain == 1.0):
+            self.fd.write(data) #the cached preamble is sent as one buffer
+            self.offset += len(data) // 2 #2 bytes per int16 sample
+        else:
+            self.write(common.loads(data))
         self.prev_bit = 0 #set the previous bit to 0 since we place an in-phase bit time between the sync signal and frame
-        self.write(pilot_signal) #transmit a zero right after the syncrhonization signal to separate it from the data signal
     
+    ##@brief convert a whole frame of bytes into a DBPSK waveform using the precomputed symbol templates
+    ##@param data a bytes-like object holding the frame
+    ##@return a 1d numpy array holding the modulated frame
+    def frame_signal(self, data):
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder='little') #least significant bit is sent first
+        if (len(bits) == 0):
+            return np.zeros(0)
+        dif_encoded_bits = dsp.differential_encode(bits, self.prev_bit)
+        self.prev_bit = dif_encoded_bits[-1]
+        return self.symbol_templates[dif_encoded_bits].flatten()
+
     ##@brief modulates and sends a stream of bytes to self.fd
-    ##@param data an iterable stream of bytes
+    ##@param data a bytes-like object or an iterable stream of bytes
     def modulate(self, data):
-        ##@brief private method to convert a stream of bytes to bits
-        ##@param data an iterable stream of bytes
-        ##@return yields a stream of bits
-        def to_bits(data):
-            for byte_arr in common.iterate(data=data, size=1, func=bytearray, truncate=False):
-                #log.info('sent 0x%x' % (byte_arr[0],))
-                yield self.bit_packer.to_bits[byte_arr[0]]
-        
-        bits = itertools.chain.from_iterable( to_bits(data) )
-        
-        for bit in bits:
-            (baseband_signal,t,self.prev_bit) = dsp.bits2baseband([bit], self.Nsym, self.prev_bit)
-            s = baseband_signal * np.cos( (2*np.pi*self.Fc*t) / self.Fs)# DBPSK with carrier
-            self.write(s) #transmit the synchronization signal
-    
+        self.write(self.frame_signal(bytearray(data))) #transmit the whole frame in a single write
+
+    ##@brief convert bytes into a multi-carrier QAM waveform for the high rate data mode
+    ##@param data a bytes-like object holding the bytes to be modulated
+    ##@return a 1d numpy array holding a guard symbol, the training symbols and then the modulated bytes
+    def data_signal(self, data):
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder='little') #least significant bit is sent first
+        bits = np.concatenate( (bits, np.zeros(-len(bits) % self.data_bits_per_baud, dtype=np.uint8)) ) #pad the bits out to a whole number of symbols
+
+        Nfreq = len(self.data_carriers)
+        symbols = self.data_modem.encode_array(bits).reshape(-1, Nfreq) #one row of symbols per symbol time, one column per carrier
+        guard = np.zeros((1, Nfreq), dtype=complex) #a silent symbol that gives the receiver room to search for the symbol timing
+        return np.dot(np.concatenate( (guard, self.training, symbols) ), self.data_carriers).real.flatten()
 
+    ##@brief modulates and sends bytes to self.fd using the high rate data mode
+    ##@param data a bytes-like object or an iterable stream of bytes
+    def modulate_high_rate(self, data):
+        self.write(self.data_signal(bytearray(data)))
@@ -10,11 +10,26 @@ class Reader:
     ##@brief constructor for the Reader class
     ##@param fd the file pointer object to create read out of
     ##@param data_type a function pointer that will convert memory read from fd into a given data type
-    def __init__(self, fd, data_type=None, eof=False):
+    ##@param blocking if True, fd must provide readinto(b, timeout) that blocks until b is full (like async_reader.AsyncReader), blocks are then returned as soon as they are captured instead of polling fd
+    ##@param idle_bufsize the block size in bytes used while listening for a carrier, defaults to bufsize
+    ##@param active_bufsize the block size in bytes used while demodulating a frame, defaults to bufsize
+    def __init__(self, fd, data_type=None, eof=False, blocking=False, idle_bufsize=None, active_bufsize=None):
         self.fd = fd
         self.data_type = data_type if (data_type is not None) else lambda x: x
         self.eof = eof
+        self.blocking = blocking
         self.total = 0
+        self.idle_bufsize = idle_bufsize if (idle_bufsize is not None) else self.bufsize
+        self.active_bufsize = active_bufsize if (active_bufsize is not None) else self.bufsize
+        self.idle()
+
+    ##@brief read large blocks, used while listening for a carrier so the reader wakes up less often
+    def idle(self):
+        self.bufsize = self.idle_bufsize
+
+    ##@brief read small blocks, used while demodulating a frame so samples reach the receiver sooner
+    def active(self):
+        self.bufsize = self.active_bufsize
 
     def __iter__(self):
         return self
@@ -29,6 +44,12 @@ class Reader:
                 return block
             raise StopIteration()
 
+        if self.blocking: #wait on the capture thread instead of polling, raises IOError on timeout
+            block = bytearray(self.bufsize)
+            self.fd.readinto(block, timeout=self.timeout)
+            self.total += len(block)
+            return self.data_type(block)
+
         finish_time = time.time() + self.timeout
         while time.time() <= finish_time:
             left = self.bufsize - len(block)
@@ -23,6 +23,7 @@ import pkg_resources
 import async_reader
 import audio
 import common
+import dsp
 import send as _send
 import recv as _recv
 import stream
@@ -32,6 +33,8 @@ import exceptions
 import config
 
 import IL2P_API
+import messages
+from fec.fec import PartialPayload
 
 from kivy.logger import Logger as log
 
@@ -52,11 +55,58 @@ class StatusUpdater():
     def __init__(self, service_controller):
         self.current_status = None
         self.service_controller = service_controller
+        self.lock = threading.Lock() #the status is updated by both the transceiver and frame decoder threads
         
     def update_status(self, new_status):
-        if (new_status != self.current_status):
-                self.service_controller.send_status(new_status)
-                self.current_status = new_status
+        with self.lock:
+            if (new_status != self.current_status):
+                    self.service_controller.send_status(new_status)
+                    self.current_status = new_status
+
+##@brief decodes received frames and passes them to the link layer on a thread of its own, so the
+## transceiver thread can go back to listening for a carrier as soon as a frame has been demodulated
+class FrameDecoder():
+    
+    ##@param il2p the IL2P_API object that decodes and processes the frames
+    ##@param on_decoded a function called on the decoder thread after each frame with True if it was decoded and processed, False otherwise
+    ##@param capacity the number of received frames that can wait to be decoded, frames arriving while the queue is full are dropped
+    def __init__(self, il2p, on_decoded, capacity=8):
+        self.il2p = il2p
+        self.on_decoded = on_decoded
+        self.frames = queue.Queue(maxsize=capacity)
+        self.thread = common.StoppableThread(target=self._thread, name='FrameDecoder', daemon=True)
+        self.thread.start()
+    
+    ##@brief queue a raw frame to be decoded
+    ##@param raw_frame numpy 1d array of the raw frame bytes
+    ##@param alternates a list of other demodulations of the raw frame bytes
+    ##@param partial the PartialPayload decoded while the frame was received
+    ##@param header the IL2P_Frame_Header decoded while the frame was received
+    ##@return returns True when the frame was queued, False when the queue was full and the frame was dropped
+    def put(self, raw_frame, alternates=(), partial=None, header=None):
+        try:
+            self.frames.put_nowait((raw_frame, alternates, partial, header))
+            return True
+        except queue.Full:
+            log.warning('WARNING: frame decode queue is full, a received frame was dropped')
+            return False
+    
+    def _thread(self):
+        while not self.thread.stopped():
+            try:
+                (raw_frame, alternates, partial, header) = self.frames.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                success = self.il2p.decodeFrame(raw_frame, alternates, partial, header)
+            except BaseException:
+                log.exception('Decoding failed')
+                success = False
+            self.on_decoded(success)
+    
+    def close(self):
+        self.thread.stop()
+        self.thread.join()
 
 ##@brief a Carrier Sense Multiple Access Controller
 class CSMA_Controller():
@@ -77,37 +127,36 @@ class CSMA_Controller():
 ##@brief method to write link layer frames into audio data
 ##@config Configuration object
 ##@src a stream of bytes to be sent
-##@dst a stream to send bytes to
+##@dst an audio.Sink (or any object with a write method) to send the modulated audio to
 ##@param carrier_length specifies the carrier length (in milliseconds) to use
+##@param high_rate when true the frame payload is sent in the multi-carrier QAM high rate data mode, the header is always sent with DBPSK
 ##@return returns true when src is sent successfully, returns false when an exception occurs
 #@func_set_timeout(master_timeout)
-def send(config, src, dst, carrier_length):    
+def send(config, src, dst, carrier_length, high_rate=False):    
     sender = _send.Sender(dst, config=config, carrier_length=carrier_length)
     Fs = config.Fs
 
-    sender.write(np.zeros(int(Fs * (config.silence_start)))) # pre-padding audio with silence (priming the audio sending queue)
-
-    sender.start()
+    sender.start() #the preamble includes the pre-padding silence
 
-    reader = stream.Reader(src, eof=True)
-    data = itertools.chain.from_iterable(reader)
-    sender.modulate(data)
+    frame = src.read()
+    if (high_rate):
+        sender.modulate(frame[0:IL2P_API.RAW_HEADER_LEN])
+        sender.modulate_high_rate(frame[IL2P_API.RAW_HEADER_LEN:])
+    else:
+        sender.modulate(frame) #the whole frame is modulated and written at once
 
-    log.debug('Sent %.3f kB @ %.3f seconds', reader.total / 1e3, sender.offset / Fs)
+    log.debug('Sent %.3f kB @ %.3f seconds', len(frame) / 1e3, sender.offset / Fs)
 
     sender.write(np.zeros(int(Fs * config.silence_stop))) # post-padding audio with silence
     return True 
 
-##@brief method that uses android.media.MediaPlayer to play a .pcm audio file
+##@brief method that uses android.media.MediaPlayer to play a .wav file, the player of the audio.WavSink frames are sent to on Android
 ##@param player an Android Media Player instance
-##@param pcmFileName the name of the file to be played, example 'temp.pcm'
-def playAudioData(player, pcmFileName):
-    wavFileName = pcmFileName.split('.')[0] + '.wav'
-    with open(pcmFileName, 'rb') as pcmfile:
-        pcmdata = pcmfile.read()
-    with wave.open(wavFileName, 'wb') as wavfile:
-        wavfile.setparams((1, 2, 8000, 0, 'NONE', 'NONE'))
-        wavfile.writeframes(pcmdata)        
+##@param wav the bytes of a wav file
+##@param wavFileName the name of the file the audio is played from, example 'temp.wav'
+def playWavData(player, wav, wavFileName='temp.wav'):
+    with open(wavFileName, 'wb') as wavfile:
+        wavfile.write(wav)
     
     player.setDataSource(wavFileName)
     player.prepare()
@@ -115,15 +164,16 @@ def playAudioData(player, pcmFileName):
     time.sleep(player.getDuration()*1.0/1000)#mPlayer.getDuration is in milliseconds
     player.reset()
 
-    
 ##@brief program loop to receive frames
 ##@config Configuration object
-##@signal input stream containing raw audio data
+##@signal common.SampleRing containing the received signal at complex baseband
 ##@dst a ReceiverPipe object to place outgoing bytes after they have been decoded
 ##@stat_update a pointer to the StatusUpdater obejct
-##@return returns 0 when no frame is received, returns -1 when an error occurs while receiving, returns 1 when frame was received successfully
+##@reader the stream.Reader feeding signal, switched to its small active block size while a frame is demodulated
+##@decoder a FrameDecoder to hand received frames to, when None frames are decoded before recv returns
+##@return returns 0 when no frame is received, returns -1 when an error occurs while receiving, returns 1 when frame was received successfully (or queued to be decoded)
 #@func_set_timeout(master_timeout)
-def recv(detector, receiver, signal, dst, stat_update):
+def recv(detector, receiver, signal, dst, stat_update, reader=None, decoder=None):
     try:
         log.debug('Waiting for carrier tone')
         
@@ -136,10 +186,14 @@ def recv(detector, receiver, signal, dst, stat_update):
         
         log.debug('Gain correction: %.3f', gain)
 
-        receiver.run(signal, gain=gain, output=dst) #this method will keep running until an exception occurs
+        if (reader is not None):
+            reader.active()
+        receiver.run(signal, gain=gain, output=dst, freq_offset=detector.freq_offset) #this method will keep running until an exception occurs
 
     except exceptions.EndOfFrameDetected: #the full frame was received
-        if (dst.il2p.readFrame()):
+        if (decoder is not None):
+            return 1 if decoder.put(*dst.il2p.reader.readRawFrame()) else -1
+        elif (dst.il2p.readFrame()):
             stat_update.update_status(common.MESSAGE_RECEIVED)
             return 1
         else:
@@ -160,35 +214,143 @@ def recv(detector, receiver, signal, dst, stat_update):
     return 0
 
 
+##@brief stands in for the StatusUpdater and FrameDecoder inside the receiver process, everything is sent back to the main process over a pipe
+class ReceiverChannel():
+    ##@param conn the sending end of a multiprocessing Pipe
+    ##@param receiving a multiprocessing Event set from when a carrier is detected until the receiver is done with the frame, the main process does not transmit while it is set
+    def __init__(self, conn, receiving):
+        self.conn = conn
+        self.receiving = receiving
+
+    def update_status(self, new_status):
+        if (new_status in (common.CARRIER_DETECTED, common.SQUELCH_OPEN)):
+            self.receiving.set()
+        self.conn.send(('status', new_status))
+
+    def put(self, raw_frame, alternates=(), partial=None, header=None):
+        self.conn.send(('frame', raw_frame, alternates, partial, header))
+        return True
+
+##@brief entry point of the receiver process, captured audio is read from shared memory and the demodulated frames are sent back to the main process
+##@config Configuration object
+##@src an async_reader.SharedRingReader for the audio captured by the main process
+##@conn the sending end of a multiprocessing Pipe
+##@stop a multiprocessing Event set when the process should exit
+##@receiving a multiprocessing Event the process sets while it is receiving a frame
+def receiver_process(config, src, conn, stop, receiving):
+    block_bytes = lambda duration : int(duration * config.Fs) * (config.bits_per_sample // 8)
+    reader = stream.Reader(src, data_type=common.loads, blocking=True, idle_bufsize=block_bytes(config.rx_idle_block), active_bufsize=block_bytes(config.rx_active_block))
+    signal = common.BasebandRing(reader, dsp.front_end(config))
+
+    il2p = IL2P_API.IL2P_API(config) #only used to decode frame headers and take the raw frames out of dst
+    dst = ReceiverPipe(il2p)
+    il2p.reader.setSource(dst)
+    detector = detect.Detector(config=config)
+    receiver = _recv.Receiver(config=config)
+    channel = ReceiverChannel(conn, receiving)
+
+    try:
+        while not stop.is_set():
+            ret_val = recv(detector, receiver, signal, dst, channel, reader, channel)
+            receiving.clear() #the frame, if there was one, has been sent to the main process
+            reader.idle()
+            if (ret_val == -1):
+                conn.send(('failure',))
+    finally:
+        src.close()
+        conn.close()
+
+##@brief runs the detector and receiver in a process of their own so they do not share the GIL with audio capture, frame decoding and the link layer
+class ReceiverProcess():
+
+    ##@param config Configuration object
+    ##@param src the AsyncReader capturing audio, created with shared=True
+    def __init__(self, config, src):
+        self.config = config
+        self.src = src
+        self.start()
+
+    def start(self):
+        ctx = async_reader.process_context
+        (self.conn, child_conn) = ctx.Pipe(duplex=False)
+        self.stop = ctx.Event()
+        self.receiving = ctx.Event()
+        self.process = ctx.Process(target=receiver_process, args=(self.config, self.src.remote(), child_conn, self.stop, self.receiving), name='ReceiverProcess', daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    ##@brief handle what the receiver process has sent since the last call
+    ##@param stat_update the StatusUpdater to pass status updates to
+    ##@param decoder the FrameDecoder to queue received frames on
+    ##@return returns 0 when no frame was received, returns -1 when an error occurred while receiving, returns 1 when a frame was received and queued to be decoded
+    def poll(self, stat_update, decoder):
+        ret_val = 0
+        try:
+            while self.conn.poll():
+                msg = self.conn.recv()
+                if (msg[0] == 'status'):
+                    stat_update.update_status(msg[1])
+                elif (msg[0] == 'frame'):
+                    ret_val = 1 if decoder.put(*msg[1:]) else -1
+                elif (msg[0] == 'failure'):
+                    ret_val = -1
+        except EOFError: #the receiver process exited
+            log.error('ERROR: the receiver process stopped, restarting it')
+            self.close()
+            self.start()
+        return ret_val
+
+    ##@brief carrier sense for the main process, the receiver process is in the middle of a frame the same way recv blocks for a whole frame when it runs in this process
+    ##@return returns True from when the receiver process detects a carrier until it is done with the frame
+    def busy(self):
+        return self.receiving.is_set()
+
+    def close(self):
+        self.stop.set()
+        self.process.join(timeout=self.config.timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
 ##@brief class used to pipe data to the link layer and tell it when the full packet has been received        
 class ReceiverPipe():
     def __init__(self, il2p=None):
-        self.recv_queue = queue.Queue(maxsize=IL2P_API.RAW_FRAME_MAXLEN) #queue containing received bytes in the order they were received
+        self.raw_frame = np.zeros(IL2P_API.RAW_FRAME_MAXLEN, dtype=np.uint8) #the received bytes in the order they were received, reused for every frame
+        self.frame_len = 0 #the number of bytes in the last frame fully received
         #self._full_frame_received = False
         #self._squelchOpen = False
         
         self.il2p = il2p ##IL2P_API object
-        self.raw_header = np.zeros(IL2P_API.RAW_HEADER_LEN, dtype=np.uint8) ##a header plus the preamble byte
+        self.raw_header = self.raw_frame[0:IL2P_API.RAW_HEADER_LEN] ##a view of the header bytes of raw_frame
         self.header = None ##will hold an IL2P_Frame_Header object
         self.recv_cnt = 0
         self.raw_payload_size = 0
+        self.alternates = [] ##the frame as demodulated at the symbol timings the receiver did not choose, the payload decoder falls back on them
+        self.raw_payload = None ##a view of the payload bytes of raw_frame
+        self.partial = None ##a PartialPayload, each payload block is Reed Solomon decoded as soon as its last byte is received
+        self.frame_header = None ##the header of the frame being received, kept after the frame ends so it is not decoded again
         
-    ##@brief add a new byte to the receive queue. When the header is received, it will be decoded so that the number of bytes in the payload can be known
-    ##@param b the new byte to be added to the queue
+    ##@brief add a new byte to the received frame. When the header is received, it will be decoded so that the number of bytes in the payload can be known
+    ##@param b the new byte to be added to the frame
     ##@return returns a tuple of 2 values of the form (int, int)
-    ##  The first integer value gives the number of bytes that have been added to the queue
+    ##  The first integer value gives the number of bytes that have been added to the frame
     ##  The second integer gives the number of remaining bytes to be received until the frame ends, note this value won't be known until the header is received and decoded, until then this value will be -1
     ##@throws IL2P_Header_Decode_Error
     def addByte(self, b):
+        self.raw_frame[self.recv_cnt] = b
         self.recv_cnt += 1
-        self.recv_queue.put(b)
-        if (self.recv_cnt <= len(self.raw_header)):
-            self.raw_header[self.recv_cnt-1] = b
+        if (self.recv_cnt > len(self.raw_header)) and (self.header is not None):
+            received = self.recv_cnt - len(self.raw_header) #the number of payload bytes received
+            self.partial.update(self.il2p.engine.payload_decoder, self.raw_payload, received)
         
         if (self.recv_cnt == len(self.raw_header)): #if the full header has been received
             try:
+                self.frame_header = None
                 self.header = self.il2p.engine.decode_header(self.raw_header, verbose=False)
+                self.frame_header = self.header
                 self.raw_payload_size = self.header.getRawPayloadSize()
+                self.raw_payload = self.raw_frame[IL2P_API.RAW_HEADER_LEN:IL2P_API.RAW_HEADER_LEN+self.raw_payload_size]
+                self.partial = PartialPayload(self.header.getPayloadSize())
                 toReturn = (self.recv_cnt, self.raw_payload_size) #return bytes received and bytes remaining to be received
             except BaseException:
                 #an error occurred while pre-emptively decoding the frame
@@ -197,10 +359,9 @@ class ReceiverPipe():
         elif (self.header is not None):
             if (self.recv_cnt == self.raw_payload_size + IL2P_API.RAW_HEADER_LEN): #if the full frame has been received
                 self.header = None
-                temp = self.recv_cnt
+                self.frame_len = self.recv_cnt
                 self.recv_cnt = 0
-                self.raw_header.fill(0)
-                toReturn = (temp, 0)
+                toReturn = (self.frame_len, 0)
             elif (self.recv_cnt > len(self.raw_header)): #if the header has been received but payload has not been completely received
                 remaining = self.raw_payload_size - self.recv_cnt + IL2P_API.RAW_HEADER_LEN
                 toReturn = (self.recv_cnt, remaining)
@@ -211,7 +372,10 @@ class ReceiverPipe():
     def reset(self):
         self.recv_cnt = 0
         self.header = None
-        self.recv_queue.queue.clear()
+        self.alternates = []
+        self.partial = None
+        self.frame_header = None
+        self.frame_len = 0
 '''
 def setAudioOutputRadio(manager, AudioManager):
     manager.setMode(AudioManager.MODE_NORMAL)
@@ -249,6 +413,8 @@ def transceiver_func(args, service_controller, stats, il2p, config):
     log.info('Did audio things')
     '''
 
+    _send.warm_preamble_cache(config, (config.carrier_length, messages.DEFAULT_CARRIER_LEN))
+
     args.recv_dst = ReceiverPipe(il2p)
     il2p.reader.setSource(args.recv_dst)
     
@@ -260,6 +426,16 @@ def transceiver_func(args, service_controller, stats, il2p, config):
     
     stat_update = StatusUpdater(service_controller)
     
+    def on_decoded(success):
+        if (success):
+            stat_update.update_status(common.MESSAGE_RECEIVED)
+            stats.rxs += 1
+            service_controller.send_statistic('rx_success',stats.rxs)
+        else:
+            stats.rxf += 1
+            service_controller.send_statistic('rx_failure',stats.rxf)
+    decoder = FrameDecoder(il2p, on_decoded, capacity=config.rx_decode_queue) #frames are decoded while the receiver listens for the next one
+    
     while (service_controller.stopped() == False):
 
         with args.interface:
@@ -267,54 +443,60 @@ def transceiver_func(args, service_controller, stats, il2p, config):
             detector = detect.Detector(config=config)
             receiver = _recv.Receiver(config=config)
             
-            args.recv_src = async_reader.AsyncReader(stream=args.interface.recorder(), mean_abs_callback=csma.feedNewValue)
-            reader = stream.Reader(args.recv_src, data_type=common.loads)
-            signal = itertools.chain.from_iterable(reader)
+            args.recv_src = async_reader.AsyncReader(stream=args.interface.recorder(), mean_abs_callback=csma.feedNewValue, shared=config.rx_multiprocess)
+            if (config.rx_multiprocess):
+                receiver_proc = ReceiverProcess(config, args.recv_src) #the detector and receiver run in their own process
+            else:
+                block_bytes = lambda duration : int(duration * config.Fs) * (config.bits_per_sample // 8)
+                reader = stream.Reader(args.recv_src, data_type=common.loads, blocking=True, idle_bufsize=block_bytes(config.rx_idle_block), active_bufsize=block_bytes(config.rx_active_block))
+                signal = common.BasebandRing(reader, dsp.front_end(config)) #the received audio mixed down to complex baseband around the carrier, the detector and receiver read it out of this buffer as numpy arrays
+            
+            if (config.tx_stream_output):
+                args.sender_dst = audio.StreamSink(args.interface) #frames are streamed straight to the audio output
+            else:
+                args.sender_dst = audio.WavSink(config, player=functools.partial(playWavData, mplayer)) #frames are played from a wav file by android.media.MediaPlayer
 
             #####################################################################
 
             while (service_controller.stopped() == False): #main transceiver loop, keep going so long as the service controller thread is running
                 try:
 
-                    ret_val = recv(detector, receiver, signal, args.recv_dst, stat_update)
+                    if (config.rx_multiprocess):
+                        ret_val = receiver_proc.poll(stat_update, decoder)
+                    else:
+                        ret_val = recv(detector, receiver, signal, args.recv_dst, stat_update, reader, decoder)
+                        reader.idle()
 
-                    if (ret_val == 1):
-                        stats.rxs += 1
-                        service_controller.send_statistic('rx_success',stats.rxs)
+                    if (ret_val == 1): #the frame is counted by the decoder once it has been decoded
                         most_recent_rx = time.time()
                     elif (ret_val == -1):
                         stats.rxf += 1
                         service_controller.send_statistic('rx_failure',stats.rxf)
                         most_recent_rx = time.time()
                     else:
-                        if ((il2p.isTransmissionPending() == True) and has_ellapsed(most_recent_tx,tx_cooldown) and has_ellapsed(most_recent_rx,rx_cooldown)): #get the next frame from the send queue
+                        receiver_busy = config.rx_multiprocess and receiver_proc.busy() #never transmit over a frame the receiver process is receiving
+                        if ((il2p.isTransmissionPending() == True) and has_ellapsed(most_recent_tx,tx_cooldown) and has_ellapsed(most_recent_rx,rx_cooldown) and not receiver_busy): #get the next frame from the send queue
                             rx_cooldown = rx_cooldown_randomizer.get()
-                            frame_to_send, carrier_length = il2p.getNextFrameToTransmit()
+                            frame_to_send, carrier_length, high_rate = il2p.getNextFrameToTransmit()
                             if (frame_to_send == None):
                                 continue
                             stat_update.update_status(common.TRANSMITTING)
                             args.sender_src = io.BytesIO(frame_to_send) #pipe the input string into the sender
 
-                            #save to an intermediate file if this is android
-                            if (AndroidMediaPlayer is not None):
-                                args.sender_dst = open('temp.pcm','wb')
-
                             #push the data to args.sender_dst
-                            if (send(config, src=args.sender_src, dst=args.sender_dst, carrier_length=carrier_length)):
+                            if (send(config, src=args.sender_src, dst=args.sender_dst, carrier_length=carrier_length, high_rate=high_rate)):
 
                                 stats.txs += 1
                                 service_controller.send_statistic('tx_success',stats.txs)
 
-                                #convert the intermediate pcm file to a wav file and play it with a java class
-                                args.sender_dst.close()   
-                                playAudioData(mplayer,'temp.pcm')
+                                args.sender_dst.play() #wait for the frame to finish playing
                                 
                             else:
                                 stats.txf += 1
                                 service_controller.send_statistic('tx_failure',stats.txf)  
                             most_recent_tx = time.time()
                         else:
-                            time.sleep(0)
+                            time.sleep(0.01 if config.rx_multiprocess else 0) #the receiver process does the waiting for a carrier
                 except FunctionTimedOut:
                     log.error('\nERROR!:  recv or send timed out\n')
                 except BaseException as ex:
@@ -331,6 +513,8 @@ def transceiver_func(args, service_controller, stats, il2p, config):
                         args.sender_dst.close()
 
             #end of main while loop
+            if (config.rx_multiprocess):
+                receiver_proc.close()
             if args.recv_src is not None:
                 args.recv_src.close()
             if args.sender_src is not None:
@@ -339,4 +523,5 @@ def transceiver_func(args, service_controller, stats, il2p, config):
                 args.sender_dst.close()
                 
     #end of recovery loop
+    decoder.close()
     log.info('Transceiver Thread shutting down')  
@@ -0,0 +1,157 @@
+import io
+import os
+import tempfile
+import time
+import wave
+import numpy as np
+
+import async_reader
+import audio
+import common
+import config
+import detect
+import dsp
+import IL2P_API
+import recv as _recv
+import send as _send
+import transceiver
+from IL2P import IL2P_Frame_Header, IL2P_Frame_Engine
+from messages import MessageObject
+
+conf = config.Configuration(rx_multiprocess=True)
+
+##@brief plays back recorded audio in real time, stands in for the audio interface's recorder
+class PlaybackStream:
+    def __init__(self, pcm):
+        self.pcm = pcm
+        self.bufsize = 2*int(conf.Fs*conf.latency)
+        self.pos = 0 #the number of bytes captured so far
+
+    def read(self, n):
+        time.sleep(n/2/conf.Fs)
+        buf = self.pcm[self.pos:self.pos+n]
+        self.pos += n
+        return buf + bytes(n - len(buf))
+
+    def close(self):
+        pass
+
+##@brief collects what ReceiverProcess.poll passes to the StatusUpdater and FrameDecoder
+class Collector:
+    def __init__(self):
+        self.statuses = []
+        self.frames = []
+
+    def update_status(self, new_status):
+        self.statuses.append(new_status)
+
+    def put(self, raw_frame, alternates=(), partial=None, header=None):
+        self.frames.append(raw_frame)
+        return True
+
+    def send_retry_message(self, key, retries_left):
+        pass
+
+if __name__ == '__main__':
+    #a frame sent through the file sinks holds the same audio as send.Sender writes
+    frame = bytes(np.random.randint(0, 256, size=200).astype(np.uint8))
+    reference = io.BytesIO()
+    sender = _send.Sender(reference, config=conf, carrier_length=200)
+    sender.start()
+    sender.modulate(frame)
+    sender.write(np.zeros(int(conf.Fs * conf.silence_stop)))
+    (fd, filename) = tempfile.mkstemp(suffix='.pcm')
+    os.close(fd)
+    try:
+        sink = audio.FileSink(filename)
+        transceiver.send(conf, io.BytesIO(frame), sink, 200)
+        sink.close()
+        with open(filename, 'rb') as pcmfile:
+            if (pcmfile.read() != reference.getvalue()):
+                raise ValueError('the audio written to a FileSink does not match send.Sender')
+    finally:
+        os.remove(filename)
+    played = []
+    sink = audio.WavSink(conf, player=played.append)
+    transceiver.send(conf, io.BytesIO(frame), sink, 200)
+    sink.play()
+    with wave.open(io.BytesIO(played[0]), 'rb') as wavfile:
+        if (wavfile.getframerate() != conf.Fs) or (wavfile.getsampwidth() != conf.sample_size) or (wavfile.readframes(wavfile.getnframes()) != reference.getvalue()):
+            raise ValueError('the wav file played by a WavSink does not match send.Sender')
+    print('A frame sent through a FileSink or WavSink matches the audio from send.Sender')
+
+    #a long message is sent in the high rate data mode without the queued message being changed, and is received and decoded
+    il2p = IL2P_API.IL2P_API(conf)
+    il2p.service_controller = Collector()
+    text = 'waypoint set ' * 30
+    if (il2p.high_rate_min_payload != 0):
+        raise ValueError('the high rate data mode is enabled by default')
+    il2p.high_rate_min_payload = 256 #the mode is only used once a threshold is set
+    msg = MessageObject(header=IL2P_Frame_Header(src_callsign='BAYWAX', dst_callsign='WAYWAX', my_seq=7, payload_size=len(text)), payload_str=text)
+    il2p.msg_send_queue.put(msg)
+    (frame, carrier_len, high_rate) = il2p.getNextFrameToTransmit()
+    if not high_rate or msg.header.high_rate:
+        raise ValueError('a %d byte message was not sent in the high rate data mode, or the queued message was changed' % (len(text),))
+    recording = io.BytesIO()
+    transceiver.send(conf, io.BytesIO(frame), recording, 200, high_rate=high_rate)
+    audio = np.concatenate( (np.zeros(1000), 0.5*common.loads(recording.getvalue()), np.zeros(2000)) )
+    audio += np.random.normal(0, 0.02, len(audio))
+    dst = transceiver.ReceiverPipe(il2p)
+    il2p.reader.setSource(dst)
+    collector = Collector()
+    signal = common.BasebandRing([audio[i:i+800] for i in range(0, len(audio), 800)], dsp.front_end(conf))
+    (detector, receiver) = (detect.Detector(conf), _recv.Receiver(conf))
+    for attempt in range(0, 10):
+        if (transceiver.recv(detector, receiver, signal, dst, collector, decoder=collector) != 0):
+            break
+    if (len(collector.frames) != 1):
+        raise ValueError('the high rate frame was not received')
+    (header, payload_decode_success, payload) = IL2P_Frame_Engine().decode_frame(collector.frames[0])
+    if not (header.high_rate and payload_decode_success and (payload.tobytes() == text.encode())):
+        raise ValueError('the high rate frame does not match after sending and receiving')
+    
+    #a retry follows the current setting
+    il2p.high_rate_min_payload = 0
+    for retry in il2p.pending_acks.values():
+        retry.time_since_last_retry = 0
+    (frame, carrier_len, high_rate) = il2p.getNextFrameToTransmit()
+    if high_rate or IL2P_Frame_Engine().decode_header(np.frombuffer(frame, dtype=np.uint8), verbose=False).high_rate:
+        raise ValueError('a retry was sent in the high rate data mode after the mode was disabled')
+    print('A long message is sent and received in the high rate data mode')
+
+    #silence long enough for the receiver process to start, a frame with a one second carrier, then silence
+    payload = np.frombuffer(b'carrier sense '*20, dtype=np.uint8)
+    frame = IL2P_Frame_Engine().encode_frame(IL2P_Frame_Header(payload_size=len(payload)), payload).tobytes()
+    recording = io.BytesIO()
+    transceiver.send(conf, io.BytesIO(frame), recording, 1000)
+    silence = 2*int(4*conf.Fs)
+    pcm = bytes(silence) + recording.getvalue() + bytes(2*int(2*conf.Fs))
+    frame_start = silence/2/conf.Fs #the seconds of audio before the carrier starts
+    frame_end = (len(pcm) - 2*int(2*conf.Fs))/2/conf.Fs
+
+    stream = PlaybackStream(pcm)
+    src = async_reader.AsyncReader(stream, lambda mean_abs : None, shared=True)
+    receiver_proc = transceiver.ReceiverProcess(conf, src)
+    collector = Collector()
+    clear_to_send = [] #the seconds of audio captured each time the transceiver loop would have been free to transmit
+    try:
+        while (stream.pos < len(pcm)):
+            ret_val = receiver_proc.poll(collector, collector)
+            if (ret_val == 0) and not receiver_proc.busy(): #the same carrier sense as the transceiver loop
+                clear_to_send.append(stream.pos/2/conf.Fs)
+            time.sleep(0.01)
+    finally:
+        receiver_proc.close()
+        src.close()
+
+    if (len(collector.frames) != 1) or (collector.frames[0].tobytes() != frame):
+        raise ValueError('the receiver process did not receive the frame')
+    if (common.CARRIER_DETECTED not in collector.statuses):
+        raise ValueError('the receiver process did not report the carrier')
+    #the carrier takes a few symbols to detect and the receiver process may lag the capture a little
+    blocked = [t for t in clear_to_send if (frame_start + 0.5 < t < frame_end)]
+    if (len(blocked) > 0):
+        raise ValueError('transmitting was allowed %.2f seconds into a frame being received' % (blocked[0] - frame_start,))
+    if not any(t > frame_end for t in clear_to_send):
+        raise ValueError('transmitting was not allowed again after the frame was received')
+    print('Transmitting is held off while the receiver process receives a frame')